@@ -31,12 +31,24 @@ from models.bicycle import Bicycle #
 from models.discount import Discount #
 from models.location import Location #
 from models.rental import Rental #
-from models.user import User #
+from models.user import User, USER_SEARCH_TABLE #
+from models.rental_archive import RentalArchivePartition, RentalArchiveBicycle, ARCHIVE_TABLE_PREFIX #
 
 # Це об'єкт MetaData, який містить інформацію про всі твої таблиці
 # Він пов'язаний з об'єктом Base.
 target_metadata = Base.metadata # <--- ВИПРАВЛЕНО НА Base.metadata
 
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    # Місячні архівні таблиці прокатів створює воркер архівації, а не міграції
+    if type_ == "table" and name.startswith(ARCHIVE_TABLE_PREFIX):
+        return False
+    # FTS5-таблиця пошуку користувачів і її службові таблиці створюються окремою міграцією
+    if type_ == "table" and name.startswith(USER_SEARCH_TABLE):
+        return False
+    return True
+
 # ***** КІНЕЦЬ ЗМІН *****
 
 # other values from the config, defined by the needs of env.py,
@@ -61,6 +73,7 @@ def run_migrations_offline() -> None:
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_object=include_object,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -83,8 +96,11 @@ def run_migrations_online() -> None:
     )
 
     with connectable.connect() as connection:
+        # Кожна міграція фіксується окремо: довгий ланцюжок не тримає блокувань усіх таблиць до кінця,
+        # а переписування даних великих таблиць виконується поза міграціями (python -m core.backfill)
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection, target_metadata=target_metadata, include_object=include_object,
+            transaction_per_migration=True,
         )
 
         with context.begin_transaction():
@@ -0,0 +1,39 @@
+"""add bicycle holds
+
+Revision ID: 5b9e2f4c8d13
+Revises: c4d17e2b9f06
+Create Date: 2026-10-20 00:12:44.301957
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b9e2f4c8d13'
+down_revision: Union[str, None] = 'c4d17e2b9f06'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'bicycle_holds',
+        sa.Column('bicycle_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('location_id', sa.Integer(), nullable=True),
+        sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(['bicycle_id'], ['bicycles.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('bicycle_id'),
+    )
+    op.create_index(op.f('ix_bicycle_holds_expires_at'), 'bicycle_holds', ['expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_bicycle_holds_expires_at'), table_name='bicycle_holds')
+    op.drop_table('bicycle_holds')
@@ -0,0 +1,53 @@
+"""add discount schedule and active index
+
+Revision ID: 8c41d2e6a915
+Revises: 3f2a9c1d7b40
+Create Date: 2026-10-19 16:42:37.091544
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c41d2e6a915'
+down_revision: Union[str, None] = '3f2a9c1d7b40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('discounts', sa.Column('is_scheduled', sa.Boolean(), server_default=sa.false(), nullable=False))
+    # Активні знижки, що ще не почались, переводимо в заплановані, а прострочені — вимикаємо
+    op.execute(
+        "UPDATE discounts SET is_active = false, is_scheduled = true "
+        "WHERE is_active AND valid_from > CURRENT_TIMESTAMP"
+    )
+    op.execute("UPDATE discounts SET is_active = false WHERE is_active AND valid_to < CURRENT_TIMESTAMP")
+    op.create_index(
+        'ix_discounts_active_valid_to',
+        'discounts',
+        ['valid_to', 'valid_from'],
+        unique=False,
+        postgresql_where=sa.column('is_active') == sa.true(),
+        sqlite_where=sa.column('is_active') == sa.true(),
+    )
+    op.create_index(
+        'ix_discounts_scheduled_valid_from',
+        'discounts',
+        ['valid_from'],
+        unique=False,
+        postgresql_where=sa.column('is_scheduled') == sa.true(),
+        sqlite_where=sa.column('is_scheduled') == sa.true(),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_discounts_scheduled_valid_from', table_name='discounts')
+    op.drop_index('ix_discounts_active_valid_to', table_name='discounts')
+    op.execute("UPDATE discounts SET is_active = true WHERE is_scheduled")
+    op.drop_column('discounts', 'is_scheduled')
@@ -0,0 +1,31 @@
+"""add location city
+
+Revision ID: a93e5d0c7b21
+Revises: f1c7d39a4e62
+Create Date: 2026-10-19 23:02:18.540316
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a93e5d0c7b21'
+down_revision: Union[str, None] = 'f1c7d39a4e62'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('locations', sa.Column('city', sa.String(), nullable=True))
+    op.create_index(op.f('ix_locations_city'), 'locations', ['city'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_locations_city'), table_name='locations')
+    with op.batch_alter_table('locations') as batch_op:
+        batch_op.drop_column('city')
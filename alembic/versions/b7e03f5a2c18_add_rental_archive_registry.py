@@ -0,0 +1,50 @@
+"""add rental archive registry
+
+Revision ID: b7e03f5a2c18
+Revises: 8c41d2e6a915
+Create Date: 2026-10-19 18:11:54.726310
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e03f5a2c18'
+down_revision: Union[str, None] = '8c41d2e6a915'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'rental_archive_partitions',
+        sa.Column('table_name', sa.String(), nullable=False),
+        sa.Column('month_start', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('month_end', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('min_rental_id', sa.Integer(), nullable=False),
+        sa.Column('max_rental_id', sa.Integer(), nullable=False),
+        sa.Column('row_count', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('table_name')
+    )
+    op.create_index(op.f('ix_rental_archive_partitions_month_start'), 'rental_archive_partitions', ['month_start'], unique=False)
+    op.create_table(
+        'rental_archive_bicycles',
+        sa.Column('bicycle_id', sa.Integer(), nullable=False),
+        sa.Column('table_name', sa.String(), nullable=False),
+        sa.PrimaryKeyConstraint('bicycle_id', 'table_name')
+    )
+    op.create_index(op.f('ix_rentals_actual_return_time'), 'rentals', ['actual_return_time'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Архівні таблиці rentals_archive_* не видаляються: у них історичні дані
+    op.drop_index(op.f('ix_rentals_actual_return_time'), table_name='rentals')
+    op.drop_table('rental_archive_bicycles')
+    op.drop_index(op.f('ix_rental_archive_partitions_month_start'), table_name='rental_archive_partitions')
+    op.drop_table('rental_archive_partitions')
@@ -0,0 +1,39 @@
+"""add backfill checkpoints
+
+Revision ID: c4d17e2b9f06
+Revises: a93e5d0c7b21
+Create Date: 2026-10-19 23:41:07.815204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4d17e2b9f06'
+down_revision: Union[str, None] = 'a93e5d0c7b21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'backfill_checkpoints',
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('last_key', sa.Integer(), nullable=False),
+        sa.Column('rows_scanned', sa.Integer(), nullable=False),
+        sa.Column('rows_changed', sa.Integer(), nullable=False),
+        sa.Column('started_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('name'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('backfill_checkpoints')
@@ -0,0 +1,81 @@
+"""bicycle status enum and location status counts
+
+Revision ID: d4a8c6e19f27
+Revises: b7e03f5a2c18
+Create Date: 2026-10-19 19:37:08.512946
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from models.location_status_count import SQLITE_STATUS_COUNT_TRIGGERS, POSTGRES_STATUS_COUNT_TRIGGERS
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4a8c6e19f27'
+down_revision: Union[str, None] = 'b7e03f5a2c18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Рядки статусів -> коди BICYCLE_STATUS_CODES; невідомі значення вважаються "доступний"
+    op.execute(
+        "UPDATE bicycles SET status = CASE status "
+        "WHEN 'в прокаті' THEN '2' WHEN 'на ремонті' THEN '3' ELSE '1' END"
+    )
+    with op.batch_alter_table('bicycles') as batch_op:
+        batch_op.alter_column(
+            'status',
+            existing_type=sa.String(),
+            type_=sa.SmallInteger(),
+            existing_nullable=False,
+            postgresql_using='status::smallint',
+        )
+
+    op.create_table(
+        'location_status_counts',
+        sa.Column('location_id', sa.Integer(), nullable=False),
+        sa.Column('status', sa.SmallInteger(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['location_id'], ['locations.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('location_id', 'status')
+    )
+    op.execute(
+        "INSERT INTO location_status_counts (location_id, status, count) "
+        "SELECT current_location_id, status, COUNT(*) FROM bicycles "
+        "WHERE current_location_id IS NOT NULL GROUP BY current_location_id, status"
+    )
+
+    dialect = op.get_bind().dialect.name
+    triggers = POSTGRES_STATUS_COUNT_TRIGGERS if dialect == 'postgresql' else SQLITE_STATUS_COUNT_TRIGGERS
+    for statement in triggers:
+        op.execute(statement)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("DROP TRIGGER IF EXISTS bicycles_status_counts_update ON bicycles")
+        op.execute("DROP TRIGGER IF EXISTS bicycles_status_counts_insert_delete ON bicycles")
+        op.execute("DROP FUNCTION IF EXISTS bicycles_status_counts()")
+    else:
+        for name in ('bicycles_status_counts_insert', 'bicycles_status_counts_delete', 'bicycles_status_counts_update'):
+            op.execute(f"DROP TRIGGER IF EXISTS {name}")
+    op.drop_table('location_status_counts')
+
+    with op.batch_alter_table('bicycles') as batch_op:
+        batch_op.alter_column(
+            'status',
+            existing_type=sa.SmallInteger(),
+            type_=sa.String(),
+            existing_nullable=False,
+            postgresql_using='status::varchar',
+        )
+    op.execute(
+        "UPDATE bicycles SET status = CASE status "
+        "WHEN '2' THEN 'в прокаті' WHEN '3' THEN 'на ремонті' ELSE 'доступний' END"
+    )
@@ -0,0 +1,31 @@
+"""add location coordinates
+
+Revision ID: e52b917c0a3d
+Revises: d4a8c6e19f27
+Create Date: 2026-10-19 21:04:45.380127
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e52b917c0a3d'
+down_revision: Union[str, None] = 'd4a8c6e19f27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('locations', sa.Column('latitude', sa.Float(), nullable=True))
+    op.add_column('locations', sa.Column('longitude', sa.Float(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('locations') as batch_op:
+        batch_op.drop_column('longitude')
+        batch_op.drop_column('latitude')
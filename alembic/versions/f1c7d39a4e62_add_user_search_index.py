@@ -0,0 +1,42 @@
+"""add user search index
+
+Revision ID: f1c7d39a4e62
+Revises: e52b917c0a3d
+Create Date: 2026-10-19 22:16:41.207583
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from models.user import SQLITE_USER_SEARCH_DDL, POSTGRES_USER_SEARCH_DDL
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1c7d39a4e62'
+down_revision: Union[str, None] = 'e52b917c0a3d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name == 'postgresql':
+        for statement in POSTGRES_USER_SEARCH_DDL:
+            op.execute(statement)
+    else:
+        for statement in SQLITE_USER_SEARCH_DDL:
+            op.execute(statement)
+        # Наповнюємо індекс наявними користувачами
+        op.execute("INSERT INTO users_search (users_search) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_users_search_trgm")
+    else:
+        for name in ('users_search_insert', 'users_search_delete', 'users_search_update'):
+            op.execute(f"DROP TRIGGER IF EXISTS {name}")
+        op.execute("DROP TABLE IF EXISTS users_search")
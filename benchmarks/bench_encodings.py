@@ -0,0 +1,59 @@
+"""Байти на дроті та CPU на відповідь для JSON/MessagePack × identity/gzip/brotli.
+
+Дані — серіалізовані DTO велосипедів у тому вигляді, в якому FastAPI передає їх
+у NegotiatedResponse, тож вимірюється саме кодування і стиснення відповіді.
+
+    python -m benchmarks.bench_encodings [кількість велосипедів] [повторів]
+"""
+import os
+import sys
+import time
+
+# Глобальний engine застосунку не використовується
+os.environ.setdefault("DATABASE_URL", "sqlite:///benchmark.db")
+
+from middleware import compression
+from middleware.negotiation import NegotiatedResponse, MSGPACK_MEDIA_TYPES, JSON_MEDIA_TYPE, msgpack
+from schemas.bicycle import Bicycle as BicycleDto
+
+
+def _payload(count: int) -> list:
+    statuses = ["доступний", "в прокаті", "на ремонті"]
+    return [
+        BicycleDto(
+            id=i, brand="Trek", model=f"FX {i % 7}", type="міський", price_per_hour=40.0 + i % 25,
+            current_location_id=i % 40 + 1, status=statuses[i % 3],
+        ).model_dump(mode="json")
+        for i in range(1, count + 1)
+    ]
+
+
+def _cpu_per_call(func, repeat: int) -> float:
+    started = time.process_time()
+    for _ in range(repeat):
+        func()
+    return (time.process_time() - started) / repeat * 1e6
+
+
+def main(count: int = 1000, repeat: int = 200) -> None:
+    content = _payload(count)
+    media_types = [JSON_MEDIA_TYPE] + ([MSGPACK_MEDIA_TYPES[0]] if msgpack is not None else [])
+    encoders = [None, compression._GzipEncoder] + ([compression._BrotliEncoder] if compression.brotli is not None else [])
+
+    print(f"{count} велосипедів, {repeat} повторів")
+    print(f"{'формат':<22}{'стиснення':<11}{'байт':>10}{'CPU мкс':>12}")
+    for media_type in media_types:
+        render = lambda: NegotiatedResponse(content, media_type=media_type).body
+        body = render()
+        for encoder_class in encoders:
+            if encoder_class is None:
+                name, size, cpu = "identity", len(body), _cpu_per_call(render, repeat)
+            else:
+                name = encoder_class.name
+                size = len(encoder_class().finish(body))
+                cpu = _cpu_per_call(lambda: encoder_class().finish(render()), repeat)
+            print(f"{media_type:<22}{name:<11}{size:>10}{cpu:>12.1f}")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:3]))
@@ -0,0 +1,69 @@
+"""Мікробенчмарк Python-накладних витрат get_bicycle / get_rental / get_user.
+
+Порівнює старий стиль ``db.query(Model).filter(...).first()`` з кешованими
+``select()`` репозиторіїв на SQLite у пам'яті, щоб вимірювати саме ORM/компіляцію.
+
+    python -m benchmarks.bench_repository_lookups [ітерацій]
+"""
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta, timezone
+
+# Глобальний engine застосунку не використовується — бенчмарк створює власний
+os.environ.setdefault("DATABASE_URL", "sqlite:///benchmark.db")
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from db.database import Base
+from models import Bicycle, Location, Rental, User
+from crud.bicycle import BicycleRepository
+from crud.rental import RentalRepository
+from crud.user import UserRepository
+
+
+def _seed(db: Session) -> None:
+    location = Location(name="Центр", address="вул. Хрещатик, 1")
+    bicycle = Bicycle(brand="Trek", model="FX 2", type="міський", price_per_hour=50.0, current_location=location)
+    user = User(first_name="Іван", last_name="Петренко", phone="+380000000000", email="ivan@example.com")
+    start = datetime.now(timezone.utc)
+    rental = Rental(user=user, bicycle=bicycle, rental_start_time=start, rental_end_time=start + timedelta(hours=2), total_price=100.0)
+    db.add_all([location, bicycle, user, rental])
+    db.commit()
+
+
+def main(iterations: int = 20000) -> None:
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    db = Session(engine)
+    _seed(db)
+
+    bicycles, rentals, users = BicycleRepository(db), RentalRepository(db), UserRepository(db)
+    cases = {
+        "get_bicycle": (
+            lambda: db.query(Bicycle).filter(Bicycle.id == 1).first(),
+            lambda: bicycles.get_bicycle(bicycle_id=1),
+        ),
+        "get_rental": (
+            lambda: db.query(Rental).filter(Rental.id == 1).first(),
+            lambda: rentals.get_rental(rental_id=1),
+        ),
+        "get_user": (
+            lambda: db.query(User).filter(User.id == 1).first(),
+            lambda: users.get_user(user_id=1),
+        ),
+    }
+
+    print(f"{'метод':<14}{'query() мкс':>14}{'select() мкс':>14}{'прискорення':>14}")
+    for name, (legacy, cached) in cases.items():
+        legacy_us = min(timeit.repeat(legacy, number=iterations, repeat=3)) / iterations * 1e6
+        cached_us = min(timeit.repeat(cached, number=iterations, repeat=3)) / iterations * 1e6
+        print(f"{name:<14}{legacy_us:>14.2f}{cached_us:>14.2f}{legacy_us / cached_us:>13.2f}x")
+
+    db.close()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
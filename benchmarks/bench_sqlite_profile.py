@@ -0,0 +1,113 @@
+"""Пропускна здатність SQLite під паралельними читаннями й записами: звичайний пул SQLAlchemy
+проти профілю ``SQLITE_PROFILE=performance`` (WAL, PRAGMA, один записувач і пул читачів).
+
+Кожна конфігурація отримує власний файл БД; потоки-читачі вибирають велосипед за ID,
+потоки-записувачі змінюють ціну велосипеда і фіксують транзакцію.
+
+    python -m benchmarks.bench_sqlite_profile [секунд] [читачів] [записувачів]
+"""
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+# Глобальний engine застосунку не використовується — бенчмарк створює власні
+os.environ.setdefault("DATABASE_URL", "sqlite:///benchmark.db")
+
+from sqlalchemy import create_engine, event, exc, insert, select, update
+from sqlalchemy.engine import Engine
+
+from db.database import Base, DB_POOL_SIZE, DB_MAX_OVERFLOW, create_sqlite_engine, _enable_sqlite_foreign_keys
+from models import Bicycle, Location
+
+BICYCLES = 10_000
+
+
+def _default_engines(url: str) -> tuple[Engine, Engine]:
+    # Так застосунок працював з SQLite до профілю: один пул і для читання, і для запису
+    engine = create_engine(url, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW)
+    event.listen(engine, "connect", _enable_sqlite_foreign_keys)
+    return engine, engine
+
+
+def _profile_engines(url: str) -> tuple[Engine, Engine]:
+    return create_sqlite_engine(url, writer=True), create_sqlite_engine(url, writer=False)
+
+
+def _seed(writer: Engine) -> None:
+    Base.metadata.create_all(writer)
+    with writer.begin() as connection:
+        connection.execute(insert(Location), [{"name": "Центр"}])
+        connection.execute(insert(Bicycle), [
+            {"brand": "Trek", "model": str(i), "type": "міський", "price_per_hour": 50.0, "current_location_id": 1}
+            for i in range(BICYCLES)
+        ])
+
+
+def _run(writer: Engine, reader: Engine, seconds: float, readers: int, writers: int) -> dict:
+    bicycles = Bicycle.__table__
+    stop = threading.Event()
+    counts = {"reads": 0, "writes": 0, "errors": 0}
+    lock = threading.Lock()
+
+    def read_loop():
+        done = 0
+        while not stop.is_set():
+            with reader.connect() as connection:
+                connection.execute(select(bicycles).where(bicycles.c.id == random.randint(1, BICYCLES))).first()
+            done += 1
+        with lock:
+            counts["reads"] += done
+
+    def write_loop():
+        done = errors = 0
+        while not stop.is_set():
+            bicycle_id = random.randint(1, BICYCLES)
+            try:
+                with writer.begin() as connection:
+                    connection.execute(
+                        update(bicycles)
+                        .where(bicycles.c.id == bicycle_id)
+                        .values(price_per_hour=random.uniform(30, 90))
+                    )
+                done += 1
+            except exc.OperationalError:
+                # "database is locked": запис не дочекався блокування файлу
+                errors += 1
+        with lock:
+            counts["writes"] += done
+            counts["errors"] += errors
+
+    threads = [threading.Thread(target=read_loop) for _ in range(readers)]
+    threads += [threading.Thread(target=write_loop) for _ in range(writers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return {name: value / seconds if name != "errors" else value for name, value in counts.items()}
+
+
+def main(seconds: float = 5.0, readers: int = 8, writers: int = 4) -> None:
+    print(f"{'конфігурація':<14}{'читань/с':>12}{'записів/с':>12}{'помилок':>10}")
+    for name, make_engines in (("default", _default_engines), ("performance", _profile_engines)):
+        with tempfile.TemporaryDirectory() as directory:
+            url = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+            writer, reader = make_engines(url)
+            _seed(writer)
+            result = _run(writer, reader, seconds, readers, writers)
+            print(f"{name:<14}{result['reads']:>12.0f}{result['writes']:>12.0f}{result['errors']:>10}")
+            writer.dispose()
+            reader.dispose()
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(
+        float(args[0]) if len(args) > 0 else 5.0,
+        int(args[1]) if len(args) > 1 else 8,
+        int(args[2]) if len(args) > 2 else 4,
+    )
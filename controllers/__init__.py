@@ -5,6 +5,9 @@ from .location import router as locations_router
 from .user import router as users_router
 from .rental import router as rentals_router
 from .discount import router as discounts_router
+from .availability import router as availability_router
+from .system import router as system_router
+from .analytics import router as analytics_router
 
 
 api_router = APIRouter()
@@ -14,3 +17,6 @@ api_router.include_router(locations_router)
 api_router.include_router(users_router)
 api_router.include_router(rentals_router)
 api_router.include_router(discounts_router)
+api_router.include_router(availability_router)
+api_router.include_router(system_router)
+api_router.include_router(analytics_router)
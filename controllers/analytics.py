@@ -0,0 +1,20 @@
+from fastapi import APIRouter, Depends, Query
+
+from core.analytics import AnalyticsService
+from schemas.analytics import RebalancingPlan
+from middleware.negotiation import NegotiatingRoute
+
+
+router = APIRouter(
+    prefix="/analytics",
+    tags=["Analytics"],
+    route_class=NegotiatingRoute,
+)
+
+
+@router.get("/rebalancing", response_model=RebalancingPlan)
+def get_rebalancing_plan_route(
+    analytics_service: AnalyticsService = Depends(AnalyticsService),
+    horizon_hours: int = Query(3, ge=1, le=24, description="Горизонт прогнозу попиту в годинах"),
+) -> RebalancingPlan:
+    return analytics_service.get_rebalancing_plan(horizon_hours=horizon_hours)
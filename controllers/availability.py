@@ -0,0 +1,86 @@
+import asyncio
+import json
+
+from fastapi import APIRouter, HTTPException, Request, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+from core.availability import availability_hub, RESYNC
+from core.bicycle import BicycleService
+from crud.bicycle import BicycleRepository
+from crud.location import LocationRepository
+from db.database import SessionLocal
+from middleware.negotiation import NegotiatingRoute
+
+
+router = APIRouter(tags=["Availability"], route_class=NegotiatingRoute)
+
+SSE_KEEPALIVE_SECONDS = 15
+WS_CLOSE_NOT_FOUND = 4404
+
+
+def _load_snapshot(location_id: int) -> str:
+    # Коротка сесія лише на час знімка — з'єднання з БД не тримається весь час підписки
+    db = SessionLocal(info={"read_only": True})
+    try:
+        location_repository = LocationRepository(db)
+        if location_repository.get_location(location_id=location_id) is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Локацію з ID {location_id} не знайдено")
+        service = BicycleService(bicycle_repository=BicycleRepository(db), location_repository=location_repository)
+        bicycles = service.get_available_bicycles_in_location(location_id=location_id)
+    finally:
+        db.close()
+    return json.dumps({
+        "type": "snapshot",
+        "location_id": location_id,
+        "bicycles": [b.model_dump(mode="json") for b in bicycles],
+    }, ensure_ascii=False)
+
+
+@router.websocket("/ws/locations/{location_id}")
+async def location_availability_ws(websocket: WebSocket, location_id: int):
+    await websocket.accept()
+    # Підписуємось до знімка, щоб не пропустити зміни, що відбудуться під час його читання
+    queue = availability_hub.subscribe(location_id)
+    try:
+        try:
+            await websocket.send_text(await run_in_threadpool(_load_snapshot, location_id))
+        except HTTPException as e:
+            await websocket.close(code=WS_CLOSE_NOT_FOUND, reason=e.detail)
+            return
+        while True:
+            message = await queue.get()
+            if message is RESYNC:
+                message = await run_in_threadpool(_load_snapshot, location_id)
+            await websocket.send_text(message)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        availability_hub.unsubscribe(location_id, queue)
+
+
+@router.get("/sse/locations/{location_id}")
+async def location_availability_sse(request: Request, location_id: int):
+    queue = availability_hub.subscribe(location_id)
+    try:
+        snapshot = await run_in_threadpool(_load_snapshot, location_id)
+    except HTTPException:
+        availability_hub.unsubscribe(location_id, queue)
+        raise
+
+    async def events():
+        try:
+            yield f"data: {snapshot}\n\n"
+            while not await request.is_disconnected():
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if message is RESYNC:
+                    message = await run_in_threadpool(_load_snapshot, location_id)
+                yield f"data: {message}\n\n"
+        finally:
+            availability_hub.unsubscribe(location_id, queue)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
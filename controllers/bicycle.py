@@ -2,15 +2,22 @@ from fastapi import APIRouter, Depends, HTTPException, status, Query
 from typing import List, Optional
 
 from core.bicycle import BicycleService
+from controllers.params import parse_ids, parse_fields, sparse_response, FIELDS_DESCRIPTION
 
 
-from schemas.bicycle import BicycleCreate, BicycleUpdate, Bicycle as BicycleDto
+from schemas.bicycle import (
+    BicycleCreate, BicycleUpdate, Bicycle as BicycleDto, BicycleMove, BicycleRepairRequest, BicycleBulkResult,
+    BicycleHoldCreate, BicycleHold as BicycleHoldDto,
+)
+from models.bicycle import BicycleStatus
+from middleware.negotiation import NegotiatingRoute
 
 
 router = APIRouter(
     prefix="/bicycles",
     tags=["Bicycles"],
     responses={404: {"description": "Велосипед не знайдено"}},
+    route_class=NegotiatingRoute,
 )
 
 @router.post("/", response_model=BicycleDto, status_code=status.HTTP_201_CREATED)
@@ -23,27 +30,69 @@ def create_bicycle_route(
 @router.get("/", response_model=List[BicycleDto])
 def read_bicycles_route(
     bicycle_service: BicycleService = Depends(BicycleService), # Виправлено
+    ids: Optional[str] = Query(None, description="ID велосипедів через кому (1,2,3) — один запит замість кількох"),
     location_id: Optional[int] = Query(None, description="Фільтрувати за ID локації"),
-    status: Optional[str] = Query(None, description="Фільтрувати за статусом (доступний, в прокаті, на ремонті)"),
+    status: Optional[BicycleStatus] = Query(None, description="Фільтрувати за статусом (доступний, в прокаті, на ремонті)"),
     sort_by_price: Optional[bool] = Query(None, description="Сортувати за ціною за годину"),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
 ) -> List[BicycleDto]:
-    if location_id is not None:
-        bicycles = bicycle_service.get_available_bicycles_in_location(location_id=location_id)
+    selected_fields = parse_fields(fields, BicycleDto)
+    query_fields = selected_fields
+    if selected_fields and sort_by_price and "price_per_hour" not in selected_fields:
+        query_fields = selected_fields + ["price_per_hour"]
+
+    if ids is not None:
+        bicycles = bicycle_service.get_by_ids(ids=parse_ids(ids), fields=query_fields)
+    elif location_id is not None:
+        bicycles = bicycle_service.get_available_bicycles_in_location(location_id=location_id, fields=query_fields)
     elif status is not None:
-        bicycles = bicycle_service.get_bicycles_by_status(status=status)
+        bicycles = bicycle_service.get_bicycles_by_status(status=status, fields=query_fields)
     else:
-        bicycles = bicycle_service.get_all()
+        bicycles = bicycle_service.get_all(fields=query_fields)
+
+    if selected_fields:
+        if sort_by_price:
+            bicycles.sort(key=lambda b: b["price_per_hour"])
+        return sparse_response([{field: b[field] for field in selected_fields} for b in bicycles])
     if sort_by_price:
         bicycles.sort(key=lambda b: b.price_per_hour, reverse=False)
     return bicycles
 
 
+@router.post("/move", response_model=BicycleBulkResult)
+def move_bicycles_route(
+    move_data: BicycleMove,
+    bicycle_service: BicycleService = Depends(BicycleService)
+) -> BicycleBulkResult:
+    return bicycle_service.move(move_data=move_data)
+
+
+@router.post("/repair", response_model=BicycleBulkResult)
+def mark_bicycles_for_repair_route(
+    repair_data: BicycleRepairRequest,
+    bicycle_service: BicycleService = Depends(BicycleService)
+) -> BicycleBulkResult:
+    return bicycle_service.mark_for_repair(ids=repair_data.ids)
+
+
+@router.delete("/", response_model=BicycleBulkResult)
+def delete_bicycles_route(
+    bicycle_service: BicycleService = Depends(BicycleService),
+    location_id: Optional[int] = Query(None, description="Видалити велосипеди цієї локації"),
+    status: Optional[BicycleStatus] = Query(None, description="Видалити велосипеди з цим статусом"),
+) -> BicycleBulkResult:
+    # Велосипеди з історією прокатів не видаляються
+    return bicycle_service.delete_many(location_id=location_id, bicycle_status=status)
+
 @router.get("/{bicycle_id}", response_model=BicycleDto)
 def read_bicycle_route(
     bicycle_id: int,
-    bicycle_service: BicycleService = Depends(BicycleService)
+    bicycle_service: BicycleService = Depends(BicycleService),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
 ) -> BicycleDto:
-    return bicycle_service.get_by_id(bicycle_id=bicycle_id)
+    selected_fields = parse_fields(fields, BicycleDto)
+    bicycle = bicycle_service.get_by_id(bicycle_id=bicycle_id, fields=selected_fields)
+    return sparse_response(bicycle) if selected_fields else bicycle
 
 
 @router.put("/{bicycle_id}", response_model=BicycleDto)
@@ -64,6 +113,26 @@ def delete_bicycle_route(
     return None
 
 
+@router.post("/{bicycle_id}/hold", response_model=BicycleHoldDto, status_code=status.HTTP_201_CREATED)
+def hold_bicycle_route(
+    bicycle_id: int,
+    hold_data: BicycleHoldCreate,
+    bicycle_service: BicycleService = Depends(BicycleService)
+) -> BicycleHoldDto:
+    # Повторний запит того самого користувача продовжує резервування
+    return bicycle_service.hold(bicycle_id=bicycle_id, hold_data=hold_data)
+
+
+@router.delete("/{bicycle_id}/hold", status_code=status.HTTP_204_NO_CONTENT)
+def release_bicycle_hold_route(
+    bicycle_id: int,
+    user_id: int = Query(..., description="Користувач, чиє резервування знімається"),
+    bicycle_service: BicycleService = Depends(BicycleService)
+):
+    bicycle_service.release_hold(bicycle_id=bicycle_id, user_id=user_id)
+    return None
+
+
 @router.get("/most_rented/", response_model=BicycleDto)
 def get_most_rented_bicycle_route(
     bicycle_service: BicycleService = Depends(BicycleService)
@@ -4,12 +4,15 @@ from datetime import datetime
 
 from core.discount import DiscountService
 from schemas.discount import DiscountCreate, DiscountUpdate, Discount as DiscountDto
+from controllers.params import parse_fields, sparse_response, FIELDS_DESCRIPTION
+from middleware.negotiation import NegotiatingRoute
 
 
 router = APIRouter(
     prefix="/discounts",
     tags=["Discounts"],
     responses={404: {"description": "Знижку не знайдено"}},
+    route_class=NegotiatingRoute,
 )
 
 
@@ -25,18 +28,25 @@ def create_discount_route(
 def read_discounts_route(
     discount_service: DiscountService = Depends(DiscountService),
     active_only: Optional[bool] = Query(None, description="Повернути лише активні знижки на поточний час"),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
 ) -> List[DiscountDto]:
+    selected_fields = parse_fields(fields, DiscountDto)
     if active_only:
-        return discount_service.get_active_discounts(current_time=datetime.utcnow())
-    return discount_service.get_all() # Цей виклик має бути правильним, оскільки DiscountService має метод get_all()
+        discounts = discount_service.get_active_discounts(current_time=datetime.utcnow(), fields=selected_fields)
+    else:
+        discounts = discount_service.get_all(fields=selected_fields) # Цей виклик має бути правильним, оскільки DiscountService має метод get_all()
+    return sparse_response(discounts) if selected_fields else discounts
 
 
 @router.get("/{discount_id}", response_model=DiscountDto)
 def read_discount_route(
     discount_id: int,
-    discount_service: DiscountService = Depends(DiscountService)
+    discount_service: DiscountService = Depends(DiscountService),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
 ) -> DiscountDto:
-    return discount_service.get_by_id(discount_id=discount_id)
+    selected_fields = parse_fields(fields, DiscountDto)
+    discount = discount_service.get_by_id(discount_id=discount_id, fields=selected_fields)
+    return sparse_response(discount) if selected_fields else discount
 
 
 @router.put("/{discount_id}", response_model=DiscountDto)
@@ -2,14 +2,17 @@ from fastapi import APIRouter, Depends, HTTPException, status, Query
 from typing import List, Optional, Annotated
 from datetime import datetime
 from core.location import LocationService
+from controllers.params import parse_ids, parse_fields, sparse_response, FIELDS_DESCRIPTION
 
-from schemas.location import LocationCreate, LocationUpdate, Location as LocationDto
+from schemas.location import LocationCreate, LocationUpdate, Location as LocationDto, LocationStatusCounts, FleetStatusCounts, NearbyLocation
+from middleware.negotiation import NegotiatingRoute
 
 
 router = APIRouter(
     prefix="/locations",
     tags=["locations"],
     responses={404: {"description": "Локацію не знайдено"}},
+    route_class=NegotiatingRoute,
 )
 
 
@@ -23,17 +26,40 @@ def create_location_route(
 
 @router.get("/", response_model=List[LocationDto])
 def read_locations_route(
-    location_service: LocationService = Depends(LocationService)
+    location_service: LocationService = Depends(LocationService),
+    ids: Optional[str] = Query(None, description="ID локацій через кому (1,2,3) — один запит замість кількох"),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
 ) -> List[LocationDto]:
-    return location_service.get_all()
+    selected_fields = parse_fields(fields, LocationDto)
+    if ids is not None:
+        locations = location_service.get_by_ids(ids=parse_ids(ids), fields=selected_fields)
+    else:
+        locations = location_service.get_all(fields=selected_fields)
+    return sparse_response(locations) if selected_fields else locations
+
+
+# Оголошено до /{location_id}, інакше "nearby" розбиралось би як ID
+@router.get("/nearby", response_model=List[NearbyLocation])
+def get_nearby_locations_route(
+    location_service: LocationService = Depends(LocationService),
+    lat: float = Query(..., ge=-90, le=90, description="Широта точки пошуку"),
+    lon: float = Query(..., ge=-180, le=180, description="Довгота точки пошуку"),
+    radius: float = Query(2000, gt=0, le=50000, description="Радіус пошуку в метрах"),
+    min_available: int = Query(1, ge=0, description="Мінімальна кількість доступних велосипедів на локації"),
+    limit: int = Query(10, ge=1, le=100, description="Скільки найближчих локацій повернути"),
+) -> List[NearbyLocation]:
+    return location_service.get_nearby(latitude=lat, longitude=lon, radius_m=radius, min_available=min_available, limit=limit)
 
 
 @router.get("/{location_id}", response_model=LocationDto)
 def read_location_route(
     location_id: int,
-    location_service: LocationService = Depends(LocationService)
+    location_service: LocationService = Depends(LocationService),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
 ) -> LocationDto:
-    return location_service.get_by_id(location_id=location_id)
+    selected_fields = parse_fields(fields, LocationDto)
+    location = location_service.get_by_id(location_id=location_id, fields=selected_fields)
+    return sparse_response(location) if selected_fields else location
 
 
 @router.put("/{location_id}", response_model=LocationDto)
@@ -59,6 +85,24 @@ def get_top_locations_by_rentals_route(
     location_service: LocationService = Depends(LocationService),
     start_date: Optional[datetime] = Query(None),
     end_date: Optional[datetime] = Query(None),
-    limit: int = Query(5)
+    limit: int = Query(5),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
 ) -> List[LocationDto]:
-    return location_service.get_top_locations_by_rentals(start_date=start_date, end_date=end_date, limit=limit)
\ No newline at end of file
+    selected_fields = parse_fields(fields, LocationDto)
+    locations = location_service.get_top_locations_by_rentals(start_date=start_date, end_date=end_date, limit=limit, fields=selected_fields)
+    return sparse_response(locations) if selected_fields else locations
+
+
+@router.get("/status-counts/", response_model=FleetStatusCounts)
+def get_fleet_status_counts_route(
+    location_service: LocationService = Depends(LocationService),
+) -> FleetStatusCounts:
+    return location_service.get_fleet_status_counts()
+
+
+@router.get("/{location_id}/status-counts", response_model=LocationStatusCounts)
+def get_location_status_counts_route(
+    location_id: int,
+    location_service: LocationService = Depends(LocationService),
+) -> LocationStatusCounts:
+    return location_service.get_status_counts(location_id=location_id)
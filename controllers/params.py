@@ -0,0 +1,45 @@
+from typing import Any, List, Optional, Type
+
+from fastapi import HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+
+from middleware.negotiation import NegotiatedResponse
+
+
+MAX_IDS_PER_REQUEST = 500
+
+
+def parse_ids(ids: Optional[str]) -> Optional[List[int]]:
+    # "1,2,3" -> [1, 2, 3] без дублікатів, зі збереженням порядку
+    if ids is None:
+        return None
+    try:
+        parsed = list(dict.fromkeys(int(part) for part in ids.split(",") if part.strip()))
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Параметр ids має містити цілі числа через кому")
+    if len(parsed) > MAX_IDS_PER_REQUEST:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Не більше {MAX_IDS_PER_REQUEST} ідентифікаторів за один запит")
+    return parsed
+
+
+FIELDS_DESCRIPTION = "Поля відповіді через кому, наприклад id,status. Вибираються з БД лише ці колонки"
+
+
+def parse_fields(fields: Optional[str], dto: Type[BaseModel]) -> Optional[List[str]]:
+    # "id,status" -> ["id", "status"]; перевіряється за полями DTO, щоб не вибрати зайвих колонок
+    if fields is None:
+        return None
+    parsed = list(dict.fromkeys(part.strip() for part in fields.split(",") if part.strip()))
+    unknown = [field for field in parsed if field not in dto.model_fields]
+    if unknown or not parsed:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Невідомі поля: {', '.join(unknown) or '-'}. Доступні поля: {', '.join(dto.model_fields)}"
+        )
+    return parsed
+
+
+def sparse_response(content: Any) -> NegotiatedResponse:
+    # Часткові об'єкти не пройдуть перевірку response_model, тож повертаємо відповідь напряму
+    return NegotiatedResponse(content=jsonable_encoder(content))
@@ -4,13 +4,16 @@ from datetime import datetime
 
 from core.rental import RentalService
 from core.bicycle import BicycleService
-from schemas.rental import RentalCreate, RentalUpdate, Rental as RentalDto
+from schemas.rental import RentalCreate, RentalUpdate, RentalReturn, Rental as RentalDto
+from controllers.params import parse_fields, sparse_response, FIELDS_DESCRIPTION
+from middleware.negotiation import NegotiatingRoute
 
 
 router = APIRouter(
     prefix="/rentals",
     tags=["Rentals"],
     responses={404: {"description": "Запис про прокат не знайдено"}},
+    route_class=NegotiatingRoute,
 )
 
 
@@ -27,20 +30,25 @@ def read_rentals_route(
     rental_service: RentalService = Depends(RentalService),
     start_date: Optional[datetime] = Query(None, description="Початкова дата фільтрації (YYYY-MM-DD)"),
     end_date: Optional[datetime] = Query(None, description="Кінцева дата фільтрації (YYYY-MM-DD)"),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
 ) -> List[RentalDto]:
+    selected_fields = parse_fields(fields, RentalDto)
     if start_date and end_date:
-        rentals = rental_service.get_rentals_in_time_range(start_date=start_date, end_date=end_date)
+        rentals = rental_service.get_rentals_in_time_range(start_date=start_date, end_date=end_date, fields=selected_fields)
     else:
-        rentals = rental_service.get_all()
-    return rentals
+        rentals = rental_service.get_all(fields=selected_fields)
+    return sparse_response(rentals) if selected_fields else rentals
 
 
 @router.get("/{rental_id}", response_model=RentalDto)
 def read_rental_route(
     rental_id: int,
-    rental_service: RentalService = Depends(RentalService)
+    rental_service: RentalService = Depends(RentalService),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
 ) -> RentalDto:
-    return rental_service.get_by_id(rental_id=rental_id)
+    selected_fields = parse_fields(fields, RentalDto)
+    rental = rental_service.get_by_id(rental_id=rental_id, fields=selected_fields)
+    return sparse_response(rental) if selected_fields else rental
 
 
 @router.put("/{rental_id}", response_model=RentalDto)
@@ -52,6 +60,15 @@ def update_rental_route(
     return rental_service.update(rental_id=rental_id, rental_update_data=rental_update_data)
 
 
+@router.post("/{rental_id}/return", response_model=RentalDto)
+def return_rental_route(
+    rental_id: int,
+    return_data: RentalReturn,
+    rental_service: RentalService = Depends(RentalService)
+) -> RentalDto:
+    return rental_service.return_bicycle(rental_id=rental_id, return_data=return_data)
+
+
 @router.delete("/{rental_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_rental_route(
     rental_id: int,
@@ -65,11 +82,13 @@ def delete_rental_route(
 def get_bicycle_rental_history_route(
     bicycle_id: int,
     rental_service: RentalService = Depends(RentalService),
-    bicycle_service: BicycleService = Depends(BicycleService)
+    bicycle_service: BicycleService = Depends(BicycleService),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
 ):
+    selected_fields = parse_fields(fields, RentalDto)
     bicycle = bicycle_service.get_by_id(bicycle_id=bicycle_id)
-    history = rental_service.get_rental_history_for_bicycle(bicycle_id=bicycle_id)
-    return history
+    history = rental_service.get_rental_history_for_bicycle(bicycle_id=bicycle_id, fields=selected_fields)
+    return sparse_response(history) if selected_fields else history
 
 
 @router.get("/revenue/", response_model=float)
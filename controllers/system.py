@@ -0,0 +1,56 @@
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query, Request, status
+
+from core.slow_queries import slow_query_log
+from core.tracing import trace_exporter
+from db.statement_cache import get_statement_cache_stats, reset_statement_cache_stats
+from middleware.admission import admission_stats
+from middleware.negotiation import NegotiatingRoute
+
+
+router = APIRouter(
+    prefix="/system",
+    tags=["System"],
+    route_class=NegotiatingRoute,
+)
+
+
+@router.get("/startup")
+def get_startup_report_route(request: Request) -> dict:
+    report = getattr(request.app.state, "startup_report", None)
+    if report is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Прогрів під час старту не виконувався")
+    return report.as_dict()
+
+
+@router.get("/statement-cache")
+def get_statement_cache_stats_route() -> dict:
+    return get_statement_cache_stats()
+
+
+@router.delete("/statement-cache", status_code=status.HTTP_204_NO_CONTENT)
+def reset_statement_cache_stats_route():
+    reset_statement_cache_stats()
+    return None
+
+
+@router.get("/admission")
+async def get_admission_stats_route() -> dict:
+    return admission_stats()
+
+
+@router.get("/tracing")
+def get_tracing_stats_route() -> dict:
+    return trace_exporter.stats()
+
+
+@router.get("/slow-queries")
+def get_slow_queries_route(limit: Optional[int] = Query(50, ge=1, le=1000)) -> dict:
+    return {**slow_query_log.stats(), "entries": slow_query_log.entries(limit=limit)}
+
+
+@router.delete("/slow-queries", status_code=status.HTTP_204_NO_CONTENT)
+def clear_slow_queries_route():
+    slow_query_log.clear()
+    return None
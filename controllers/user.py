@@ -1,15 +1,18 @@
 from typing import List, Optional, Annotated
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query
 
 from core.user import UserService
+from controllers.params import parse_ids, parse_fields, sparse_response, FIELDS_DESCRIPTION
 from schemas.user import UserCreate, UserUpdate, User as UserDto
+from middleware.negotiation import NegotiatingRoute
 
 
 router = APIRouter(
     prefix="/users",
     tags=["users"],
     responses={404: {"description": "Користувача не знайдено"}},
+    route_class=NegotiatingRoute,
 )
 
 @router.post("/", response_model=UserDto, status_code=status.HTTP_201_CREATED)
@@ -21,16 +24,35 @@ def create_user_route(
 
 @router.get("/", response_model=List[UserDto])
 def read_users_route(
-    user_service: UserService = Depends(UserService) # Змінено тут
+    user_service: UserService = Depends(UserService), # Змінено тут
+    ids: Optional[str] = Query(None, description="ID користувачів через кому (1,2,3) — один запит замість кількох"),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+) -> List[UserDto]:
+    selected_fields = parse_fields(fields, UserDto)
+    if ids is not None:
+        users = user_service.get_by_ids(ids=parse_ids(ids), fields=selected_fields)
+    else:
+        users = user_service.get_all(fields=selected_fields)
+    return sparse_response(users) if selected_fields else users
+
+@router.get("/search", response_model=List[UserDto])
+def search_users_route(
+    q: str = Query(..., min_length=3, max_length=100, description="Частина імені, прізвища, телефону чи email; кілька слів — усі мають знайтися"),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, description="Скільки найкращих збігів пропустити (наступна сторінка)"),
+    user_service: UserService = Depends(UserService),
 ) -> List[UserDto]:
-    return user_service.get_all()
+    return user_service.search(query=q, limit=limit, offset=offset)
 
 @router.get("/{user_id}", response_model=UserDto)
 def read_user_route(
     user_id: int,
-    user_service: UserService = Depends(UserService) # Змінено тут
+    user_service: UserService = Depends(UserService), # Змінено тут
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
 ) -> UserDto:
-    return user_service.get_by_id(user_id=user_id)
+    selected_fields = parse_fields(fields, UserDto)
+    user = user_service.get_by_id(user_id=user_id, fields=selected_fields)
+    return sparse_response(user) if selected_fields else user
 
 @router.put("/{user_id}", response_model=UserDto)
 def update_user_route(
@@ -0,0 +1,64 @@
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Annotated
+
+from fastapi import Depends
+
+from crud.location import LocationRepository
+from crud.rental import RentalRepository
+from core.demand import ensure_matrix, plan_transfers
+from core.geo import ensure_index
+from models.bicycle import BicycleStatus
+from schemas.analytics import RebalancingPlan, LocationForecast, BicycleTransfer
+from core.tracing import traced
+
+
+# Скільки днів історії прокатів читається при побудові матриці попиту
+DEMAND_HISTORY_DAYS = int(os.getenv("DEMAND_HISTORY_DAYS", "56"))
+
+
+@traced("service")
+class AnalyticsService:
+    def __init__(
+        self,
+        location_repository: LocationRepository = Depends(LocationRepository),
+        rental_repository: RentalRepository = Depends(RentalRepository),
+    ):
+        self.location_repository = location_repository
+        self.rental_repository = rental_repository
+
+    def _load_pickups(self):
+        since = datetime.now(timezone.utc) - timedelta(days=DEMAND_HISTORY_DAYS)
+        return self.rental_repository.get_pickups_since(since=since)
+
+    def get_rebalancing_plan(self, horizon_hours: int) -> RebalancingPlan:
+        # Матриця попиту і геоіндекс живуть у пам'яті; з БД читаються лише лічильники доступних велосипедів
+        started = time.perf_counter()
+        now = datetime.now(timezone.utc)
+        expected = ensure_matrix(self._load_pickups).forecast(now, horizon_hours)
+        available = {
+            location_id: count
+            for location_id, bicycle_status, count in self.location_repository.get_all_status_counts()
+            if bicycle_status == BicycleStatus.AVAILABLE
+        }
+        coordinates = ensure_index(self.location_repository.get_coordinates).coordinates()
+        targets, transfers = plan_transfers(available, expected, coordinates)
+
+        return RebalancingPlan(
+            generated_at=now,
+            horizon_hours=horizon_hours,
+            forecasts=[
+                LocationForecast(
+                    location_id=location_id,
+                    expected_pickups=round(expected.get(location_id, 0.0), 3),
+                    available=available.get(location_id, 0),
+                    target=target,
+                )
+                for location_id, target in targets.items()
+            ],
+            transfers=[BicycleTransfer(**transfer) for transfer in transfers],
+            computed_ms=round((time.perf_counter() - started) * 1000, 3),
+        )
+
+AnalyticsServiceDependency = Annotated[AnalyticsService, Depends]
@@ -0,0 +1,70 @@
+import asyncio
+import json
+import os
+from collections import defaultdict
+from typing import Dict, Optional, Set
+
+from schemas.bicycle import Bicycle as BicycleDto
+
+
+SUBSCRIBER_QUEUE_SIZE = int(os.getenv("AVAILABILITY_QUEUE_SIZE", "64"))
+
+# Маркер у черзі підписника: він відстав і має отримати свіжий знімок замість пропущених змін
+RESYNC = object()
+
+
+class AvailabilityHub:
+    # Підписники живуть у циклі подій сервера, а сервіси публікують зміни з потоків threadpool.
+    # Кожна зміна кодується в JSON один раз і розсилається всім підписникам локації
+    def __init__(self, queue_size: int = SUBSCRIBER_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers: Dict[int, Set[asyncio.Queue]] = defaultdict(set)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def subscribe(self, location_id: int) -> asyncio.Queue:
+        self._loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers[location_id].add(queue)
+        return queue
+
+    def unsubscribe(self, location_id: int, queue: asyncio.Queue) -> None:
+        subscribers = self._subscribers.get(location_id)
+        if subscribers is not None:
+            subscribers.discard(queue)
+            if not subscribers:
+                del self._subscribers[location_id]
+
+    def subscriber_count(self, location_id: Optional[int] = None) -> int:
+        if location_id is not None:
+            return len(self._subscribers.get(location_id, ()))
+        return sum(len(s) for s in self._subscribers.values())
+
+    def _fan_out(self, location_id: int, payload: str) -> None:
+        for queue in self._subscribers.get(location_id, ()):
+            try:
+                queue.put_nowait(payload)
+            except asyncio.QueueFull:
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(RESYNC)
+
+    def _publish(self, location_id: Optional[int], message: dict) -> None:
+        if location_id is None or location_id not in self._subscribers or self._loop is None or self._loop.is_closed():
+            return
+        payload = json.dumps(message, ensure_ascii=False)
+        self._loop.call_soon_threadsafe(self._fan_out, location_id, payload)
+
+    def publish_bicycle(self, bicycle: BicycleDto, previous_location_id: Optional[int] = None) -> None:
+        if previous_location_id is not None and previous_location_id != bicycle.current_location_id:
+            self.publish_removed(previous_location_id, bicycle.id)
+        self._publish(bicycle.current_location_id, {
+            "type": "upsert",
+            "location_id": bicycle.current_location_id,
+            "bicycle": bicycle.model_dump(mode="json"),
+        })
+
+    def publish_removed(self, location_id: Optional[int], bicycle_id: int) -> None:
+        self._publish(location_id, {"type": "remove", "location_id": location_id, "bicycle_id": bicycle_id})
+
+
+availability_hub = AvailabilityHub()
@@ -0,0 +1,323 @@
+import argparse
+import logging
+import os
+import sys
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import Table, bindparam, func, or_, select, text, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from db.database import SessionLocal
+from db.sharding import database_infos
+from crud.backfill import BackfillRepository
+from core.pricing import rental_price
+from models.backfill import BACKFILL_DONE
+from models.bicycle import Bicycle
+from models.discount import Discount
+from models.rental import Rental
+
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_BATCH_SIZE = int(os.getenv("BACKFILL_BATCH_SIZE", "1000"))
+# Пауза між порціями, щоб backfill не забирав БД у запитів користувачів і не розганяв відставання реплік
+BACKFILL_PAUSE = float(os.getenv("BACKFILL_PAUSE", "0.05"))
+# PostgreSQL: скільки порція чекає на блокування рядка, перш ніж відступити й повторити, замість ставати
+# в чергу перед запитами застосунку
+BACKFILL_LOCK_TIMEOUT_MS = int(os.getenv("BACKFILL_LOCK_TIMEOUT_MS", "2000"))
+BACKFILL_MAX_RETRIES = int(os.getenv("BACKFILL_MAX_RETRIES", "5"))
+# Як часто (у секундах) писати в лог прогрес
+BACKFILL_PROGRESS_INTERVAL = float(os.getenv("BACKFILL_PROGRESS_INTERVAL", "10"))
+
+
+@dataclass(frozen=True)
+class Backfill:
+    name: str
+    table: Table
+    # Змінює рядки з ключем у (lower, upper] і повертає кількість змінених
+    apply: Callable[[Session, int, int], int]
+    description: str = ""
+
+    @property
+    def key(self):
+        return self.table.c.id
+
+
+_backfills: Dict[str, Backfill] = {}
+
+
+def register_backfill(name: str, table: Table, description: str = ""):
+    def decorator(apply: Callable[[Session, int, int], int]):
+        if name in _backfills:
+            raise ValueError(f"Backfill {name} вже зареєстровано")
+        _backfills[name] = Backfill(name=name, table=table, apply=apply, description=description)
+        return apply
+    return decorator
+
+
+def get_backfill(name: str) -> Backfill:
+    backfill = _backfills.get(name)
+    if backfill is None:
+        raise KeyError(f"Невідомий backfill: {name}")
+    return backfill
+
+
+def _chunk_bounds(db: Session, backfill: Backfill, lower: int, batch_size: int):
+    # Верхня межа наступної порції і кількість рядків у ній: keyset за індексом первинного ключа,
+    # без OFFSET і без читання самих рядків
+    keys = (
+        select(backfill.key.label("key"))
+        .where(backfill.key > lower)
+        .order_by(backfill.key)
+        .limit(batch_size)
+        .subquery()
+    )
+    return db.execute(select(func.max(keys.c.key), func.count())).one()
+
+
+class BackfillRunner:
+    def __init__(
+        self,
+        backfill: Backfill,
+        batch_size: int = BACKFILL_BATCH_SIZE,
+        pause: float = BACKFILL_PAUSE,
+        lock_timeout_ms: int = BACKFILL_LOCK_TIMEOUT_MS,
+        max_retries: int = BACKFILL_MAX_RETRIES,
+    ):
+        self.backfill = backfill
+        self.batch_size = batch_size
+        self.pause = pause
+        self.lock_timeout_ms = lock_timeout_ms
+        self.max_retries = max_retries
+
+    def restart(self, info: dict) -> None:
+        db = SessionLocal(info=info)
+        try:
+            BackfillRepository(db).reset(self.backfill.name)
+            db.commit()
+        finally:
+            db.close()
+
+    def run(self, info: dict) -> None:
+        # Обробляє всі порції в одній БД (основній або шарді), доки контрольна точка не стане "done"
+        first_key, last_key = self._key_range(info)
+        started = time.monotonic()
+        logged = started
+        scanned_total = changed_total = 0
+        while True:
+            progress = self._run_chunk_with_retries(info)
+            if progress is None:
+                break
+            position, scanned, changed = progress
+            scanned_total += scanned
+            changed_total += changed
+            now = time.monotonic()
+            if now - logged >= BACKFILL_PROGRESS_INTERVAL:
+                self._log_progress(info, position, first_key, last_key, scanned_total, changed_total, now - started)
+                logged = now
+            if self.pause:
+                time.sleep(self.pause)
+        logger.info(
+            "Backfill %s%s: done, scanned %d, changed %d in %.1fs",
+            self.backfill.name, _label(info), scanned_total, changed_total, time.monotonic() - started,
+        )
+
+    def _key_range(self, info: dict):
+        db = SessionLocal(info={**info, "read_only": True})
+        try:
+            return db.execute(select(func.min(self.backfill.key), func.max(self.backfill.key))).one()
+        finally:
+            db.close()
+
+    def _run_chunk_with_retries(self, info: dict):
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self._run_chunk(info)
+            except OperationalError as e:
+                # Таймаут блокування (PostgreSQL) або зайнята БД (SQLite): порцію відкочено, контрольна
+                # точка не зсунулась — повторюємо ту саму порцію з наростаючою паузою
+                if attempt == self.max_retries:
+                    raise
+                delay = min(30.0, self.pause + 0.5 * 2 ** attempt)
+                logger.warning("Backfill %s%s: chunk failed (%s), retry in %.1fs", self.backfill.name, _label(info), e.orig, delay)
+                time.sleep(delay)
+
+    def _run_chunk(self, info: dict):
+        # Одна транзакція: блокування контрольної точки, зміна порції, зсув контрольної точки
+        db = SessionLocal(info=info)
+        try:
+            if db.get_bind().dialect.name == "postgresql":
+                db.execute(text(f"SET LOCAL lock_timeout = {int(self.lock_timeout_ms)}"))
+            repository = BackfillRepository(db)
+            checkpoint = repository.lock_checkpoint(self.backfill.name)
+            if checkpoint.status == BACKFILL_DONE:
+                db.commit()
+                return None
+            lower = checkpoint.last_key
+            upper, scanned = _chunk_bounds(db, self.backfill, lower, self.batch_size)
+            if upper is None:
+                repository.finish(checkpoint)
+                db.commit()
+                return None
+            changed = self.backfill.apply(db, lower, upper)
+            repository.advance(checkpoint, upper, scanned, changed)
+            db.commit()
+            return upper, scanned, changed
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _log_progress(self, info, position, first_key, last_key, scanned, changed, elapsed):
+        span = (last_key or 0) - (first_key or 0)
+        done = min(1.0, (position - first_key) / span) if span > 0 else 1.0
+        rate = scanned / elapsed if elapsed > 0 else 0.0
+        eta = elapsed * (1 - done) / done if done > 0 else float("inf")
+        logger.info(
+            "Backfill %s%s: %.1f%% (key %d of %d), scanned %d, changed %d, %.0f rows/s, eta %.0fs",
+            self.backfill.name, _label(info), done * 100, position, last_key or 0, scanned, changed, rate, eta,
+        )
+
+
+def _label(info: dict) -> str:
+    shard = info.get("shard")
+    return f" [{shard.name}]" if shard is not None else ""
+
+
+def run_backfill(name: str, batch_size: int = BACKFILL_BATCH_SIZE, pause: float = BACKFILL_PAUSE, restart: bool = False) -> None:
+    runner = BackfillRunner(get_backfill(name), batch_size=batch_size, pause=pause)
+    for info in database_infos():
+        if restart:
+            runner.restart(info)
+        runner.run(info)
+
+
+def run_pending(batch_size: int = BACKFILL_BATCH_SIZE, pause: float = BACKFILL_PAUSE) -> None:
+    # Незавершені backfill-и кожної БД: заплановані міграціями ("pending") і перервані ("running")
+    for info in database_infos():
+        db = SessionLocal(info=info)
+        try:
+            names = BackfillRepository(db).get_unfinished_names()
+        finally:
+            db.close()
+        for name in names:
+            if name not in _backfills:
+                logger.warning("Backfill %s%s is scheduled but not registered, skipped", name, _label(info))
+                continue
+            BackfillRunner(_backfills[name], batch_size=batch_size, pause=pause).run(info)
+
+
+def checkpoint_rows() -> List[dict]:
+    rows = []
+    for info in database_infos():
+        db = SessionLocal(info={**info, "read_only": True})
+        try:
+            for checkpoint in BackfillRepository(db).get_checkpoints():
+                rows.append({
+                    "database": _label(info).strip(" []") or "primary",
+                    "name": checkpoint.name,
+                    "status": checkpoint.status,
+                    "last_key": checkpoint.last_key,
+                    "rows_scanned": checkpoint.rows_scanned,
+                    "rows_changed": checkpoint.rows_changed,
+                    "updated_at": checkpoint.updated_at,
+                })
+        finally:
+            db.close()
+    return rows
+
+
+# Зареєстровані backfill-и
+
+_rentals = Rental.__table__
+_select_returned_rentals_for_pricing = (
+    select(
+        _rentals.c.id,
+        _rentals.c.rental_start_time,
+        _rentals.c.actual_return_time,
+        _rentals.c.total_price,
+        Bicycle.price_per_hour,
+        Discount.percentage_amount,
+    )
+    .join(Bicycle, Bicycle.id == _rentals.c.bicycle_id)
+    .outerjoin(Discount, Discount.id == _rentals.c.discount_id)
+    .where(
+        _rentals.c.id > bindparam("lower"),
+        _rentals.c.id <= bindparam("upper"),
+        _rentals.c.actual_return_time.is_not(None),
+        # Лише прокати без ціни: ціни, вже пораховані за тодішньою ціною велосипеда, не переписуються поточною
+        or_(_rentals.c.total_price.is_(None), _rentals.c.total_price == 0),
+    )
+)
+_update_rental_price = (
+    update(_rentals)
+    .where(_rentals.c.id == bindparam("rental_id"))
+    .values(total_price=bindparam("price"))
+)
+
+
+@register_backfill("rentals_total_price", _rentals, "Заповнення порожнього (NULL чи 0) total_price повернених прокатів за фактичною тривалістю, ціною велосипеда і знижкою")
+def _recompute_rental_prices(db: Session, lower: int, upper: int) -> int:
+    # UPDATE лише для рядків, ціна яких справді змінилась: повторний прохід нічого не переписує
+    changes = []
+    for rental_id, start, returned, current, price_per_hour, percentage in db.execute(
+        _select_returned_rentals_for_pricing, {"lower": lower, "upper": upper}
+    ):
+        price = rental_price(start, returned, price_per_hour, percentage)
+        if price != current:
+            changes.append({"rental_id": rental_id, "price": price})
+    if changes:
+        db.execute(_update_rental_price, changes)
+    return len(changes)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m core.backfill",
+        description=(
+            "Порційні відновлювані backfill-и великих таблиць поза транзакцією Alembic. Рядки обходяться за первинним "
+            "ключем порціями, кожна порція — окрема коротка транзакція разом зі зсувом контрольної точки, "
+            "тож після збою запуск продовжується з останньої зафіксованої порції."
+        ),
+        epilog=(
+            "приклади: python -m core.backfill list | status | run rentals_total_price [--batch-size N] [--pause S] [--restart] "
+            "| run --pending"
+        ),
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="зареєстровані backfill-и")
+    commands.add_parser("status", help="контрольні точки в кожній БД")
+    run = commands.add_parser("run", help="запустити або продовжити backfill")
+    target = run.add_mutually_exclusive_group(required=True)
+    target.add_argument("name", nargs="?", help="назва backfill-у")
+    target.add_argument("--pending", action="store_true", help="усі заплановані й перервані backfill-и")
+    run.add_argument("--batch-size", type=int, default=BACKFILL_BATCH_SIZE)
+    run.add_argument("--pause", type=float, default=BACKFILL_PAUSE)
+    run.add_argument("--restart", action="store_true", help="почати з початку таблиці, а не з контрольної точки")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    if args.command == "list":
+        for backfill in _backfills.values():
+            print(f"{backfill.name:<28}{backfill.table.name:<14}{backfill.description}")
+    elif args.command == "status":
+        for row in checkpoint_rows():
+            print(
+                f"{row['database']:<10}{row['name']:<28}{row['status']:<9}key {row['last_key']:<12}"
+                f"scanned {row['rows_scanned']:<10}changed {row['rows_changed']:<10}{row['updated_at']:%Y-%m-%d %H:%M:%S}"
+            )
+    elif args.pending:
+        run_pending(batch_size=args.batch_size, pause=args.pause)
+    else:
+        try:
+            run_backfill(args.name, batch_size=args.batch_size, pause=args.pause, restart=args.restart)
+        except KeyError as e:
+            sys.exit(e.args[0])
+
+
+if __name__ == "__main__":
+    main()
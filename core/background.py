@@ -0,0 +1,43 @@
+import logging
+import threading
+from typing import Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicWorker:
+    # Фоновий потік, що викликає run_once() кожні interval секунд, поки застосунок працює.
+    # run_once() повертає True, якщо є ще робота — тоді наступний цикл стартує без паузи
+    name = "periodic-worker"
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def run_once(self) -> bool:
+        raise NotImplementedError
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            has_more = False
+            try:
+                has_more = self.run_once()
+            except Exception:
+                logger.exception("Background worker '%s' iteration failed", self.name)
+            if not has_more:
+                self._stop.wait(self.interval)
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout if timeout is not None else self.interval + 5)
+            self._thread = None
@@ -1,72 +1,275 @@
-from typing import List, Optional, Annotated
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Annotated, Union, Set
 
 from fastapi import Depends, HTTPException, status
+from sqlalchemy.exc import IntegrityError
 
 from crud.bicycle import BicycleRepository
+from crud.bicycle_hold import BicycleHoldRepository
 from crud.location import LocationRepository
-from schemas.bicycle import BicycleCreate, BicycleUpdate, Bicycle as BicycleDto
+from crud.user import UserRepository
+from crud.writes import is_foreign_key_violation
+from core.availability import availability_hub
+from core.holds import HOLD_TTL, HOLD_MAX_TTL, HoldRegistry, ensure_holds, hold_registry, to_hold
+from core.loader import DataLoader
+from models.bicycle import BicycleStatus
+from schemas.bicycle import (
+    BicycleCreate, BicycleUpdate, Bicycle as BicycleDto, BicycleMove, BicycleBulkResult, BicycleHoldCreate, BicycleHold as BicycleHoldDto,
+)
+from core.tracing import traced
 
 
+# Дозволені переходи статусу; "в прокаті" виставляє створення прокату
+STATUS_TRANSITIONS = {
+    BicycleStatus.AVAILABLE: {BicycleStatus.RENTED, BicycleStatus.REPAIR},
+    BicycleStatus.RENTED: {BicycleStatus.AVAILABLE, BicycleStatus.REPAIR},
+    BicycleStatus.REPAIR: {BicycleStatus.AVAILABLE},
+}
+
+
+def check_status_transition(current: BicycleStatus, new: BicycleStatus) -> None:
+    if new != current and new not in STATUS_TRANSITIONS[current]:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Неможливо змінити статус велосипеда з '{current.value}' на '{new.value}'"
+        )
+
+
+def statuses_allowed_before(new: BicycleStatus) -> Set[BicycleStatus]:
+    # Статуси, з яких дозволено перейти в new; використовується в умові WHERE, тож перевірка
+    # переходу і запис виконуються одним запитом
+    return {current for current, targets in STATUS_TRANSITIONS.items() if new in targets} | {new}
+
+
+# Велосипеди в прокаті фізично не на локації, тож масове переміщення їх не зачіпає
+MOVABLE_STATUSES = (BicycleStatus.AVAILABLE, BicycleStatus.REPAIR)
+
+
+def _with_id(fields: List[str]) -> List[str]:
+    # Фільтр резервувань працює за ID; контролер однаково віддає лише вибрані поля
+    return fields if "id" in fields else fields + ["id"]
+
+
+def _without_held(bicycles: list, registry: HoldRegistry) -> list:
+    # Зарезервовані велосипеди не показуються як доступні, доки резервування не спливе
+    held = registry.held_ids()
+    if not held:
+        return bicycles
+    return [b for b in bicycles if (b["id"] if isinstance(b, dict) else b.id) not in held]
+
+
+def _held_conflict(expires_at: Optional[datetime]) -> HTTPException:
+    until = f" до {expires_at.isoformat()}" if expires_at is not None else ""
+    return HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Велосипед зарезервовано іншим користувачем{until}")
+
+
+@traced("service")
 class BicycleService:
     def __init__(
             self,
             bicycle_repository: BicycleRepository = Depends(BicycleRepository),
-            location_repository: LocationRepository = Depends(LocationRepository)
+            location_repository: LocationRepository = Depends(LocationRepository),
+            hold_repository: BicycleHoldRepository = Depends(BicycleHoldRepository),
+            user_repository: UserRepository = Depends(UserRepository)
     ):
         self.bicycle_repository = bicycle_repository
         self.location_repository = location_repository
+        self.hold_repository = hold_repository
+        self.user_repository = user_repository
+        self.loader = DataLoader(self._load_bicycles)
+
+    def _load_bicycles(self, ids: List[int]) -> List[BicycleDto]:
+        return [BicycleDto.model_validate(b) for b in self.bicycle_repository.get_bicycles_by_ids(ids=ids)]
 
-    def get_all(self) -> List[BicycleDto]:
+    def _holds(self) -> HoldRegistry:
+        return ensure_holds(self.hold_repository.get_active_holds)
+
+    # Методи читання з fields повертають словники лише з вибраними полями (без DTO-валідації)
+
+    def get_all(self, fields: Optional[List[str]] = None) -> List[Union[BicycleDto, dict]]:
+        if fields:
+            return self.bicycle_repository.get_bicycles(fields=fields)
         bicycles = self.bicycle_repository.get_bicycles()
         return [BicycleDto.model_validate(b) for b in bicycles]
 
-    def get_by_id(self, bicycle_id: int) -> BicycleDto:
-        bicycle = self.bicycle_repository.get_bicycle(bicycle_id=bicycle_id)
+    def get_by_id(self, bicycle_id: int, fields: Optional[List[str]] = None) -> Union[BicycleDto, dict]:
+        if fields:
+            bicycle = self.bicycle_repository.get_bicycle(bicycle_id=bicycle_id, fields=fields)
+        else:
+            bicycle = self.loader.load(bicycle_id)
         if bicycle is None:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Велосипед з ID {bicycle_id} не знайдено")
-        return BicycleDto.model_validate(bicycle)
+        return bicycle
 
-    def create(self, bicycle_data: BicycleCreate) -> BicycleDto:
-        if bicycle_data.current_location_id is not None:
-            location = self.location_repository.get_location(location_id=bicycle_data.current_location_id)
-            if not location:
-                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Локацію не знайдено")
+    def get_by_ids(self, ids: List[int], fields: Optional[List[str]] = None) -> List[Union[BicycleDto, dict]]:
+        if fields:
+            return self.bicycle_repository.get_bicycles_by_ids(ids=ids, fields=fields)
+        return [b for b in self.loader.load_many(ids) if b is not None]
 
+    def get_bicycles_by_status(self, status: BicycleStatus, fields: Optional[List[str]] = None) -> List[Union[BicycleDto, dict]]:
+        if fields:
+            if status != BicycleStatus.AVAILABLE:
+                return self.bicycle_repository.get_bicycles_by_status(status=status, fields=fields)
+            return _without_held(self.bicycle_repository.get_bicycles_by_status(status=status, fields=_with_id(fields)), self._holds())
+        bicycles = self.bicycle_repository.get_bicycles_by_status(status=status)
+        if status == BicycleStatus.AVAILABLE:
+            bicycles = _without_held(bicycles, self._holds())
+        return [BicycleDto.model_validate(b) for b in bicycles]
+
+    def create(self, bicycle_data: BicycleCreate) -> BicycleDto:
         try:
-            created_bicycle = self.bicycle_repository.create_bicycle(bicycle=bicycle_data)
-            return BicycleDto.model_validate(created_bicycle)
-        except ValueError as e:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+            created_bicycle = BicycleDto.model_validate(self.bicycle_repository.create_bicycle(bicycle=bicycle_data))
+        except IntegrityError as e:
+            # Єдиний зовнішній ключ велосипеда — локація
+            if is_foreign_key_violation(e):
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Локацію не знайдено")
+            raise
+        availability_hub.publish_bicycle(created_bicycle)
+        return created_bicycle
 
 
     def update(self, bicycle_id: int, bicycle_update_data: BicycleUpdate) -> BicycleDto:
-        db_bicycle = self.bicycle_repository.get_bicycle(bicycle_id=bicycle_id)
-        if not db_bicycle:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Велосипед з ID {bicycle_id} не знайдено")
+        new_status = bicycle_update_data.status
+        from_statuses = statuses_allowed_before(new_status) if new_status is not None else None
 
-        if bicycle_update_data.current_location_id is not None and \
-                bicycle_update_data.current_location_id != db_bicycle.current_location_id:
-            location = self.location_repository.get_location(location_id=bicycle_update_data.current_location_id)
-            if not location:
-                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Локацію не знайдено для оновлення")
+        # RETURNING віддає лише нові значення; попередню локацію читаємо, тільки коли є кому повідомити про переміщення
+        previous_location_id = None
+        if bicycle_update_data.current_location_id is not None and availability_hub.subscriber_count():
+            previous = self.bicycle_repository.get_bicycle(bicycle_id=bicycle_id, fields=["current_location_id"])
+            previous_location_id = previous["current_location_id"] if previous else None
 
         try:
-            updated_bicycle = self.bicycle_repository.update_bicycle(bicycle_id=bicycle_id, bicycle_update=bicycle_update_data)
-            if updated_bicycle is None:
-                raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Помилка при оновленні велосипеда")
-            return BicycleDto.model_validate(updated_bicycle)
-        except ValueError as e:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+            updated_bicycle = self.bicycle_repository.update_bicycle(
+                bicycle_id=bicycle_id, bicycle_update=bicycle_update_data, from_statuses=from_statuses,
+            )
+        except IntegrityError as e:
+            if is_foreign_key_violation(e):
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Локацію не знайдено для оновлення")
+            raise
+        if updated_bicycle is None:
+            # Жоден рядок не змінився: або велосипеда немає, або перехід статусу заборонений
+            current = self.bicycle_repository.get_bicycle(bicycle_id=bicycle_id)
+            if current is None:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Велосипед з ID {bicycle_id} не знайдено")
+            check_status_transition(current.status, new_status)
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Статус велосипеда щойно змінився, повторіть запит")
+
+        updated_bicycle = BicycleDto.model_validate(updated_bicycle)
+        self.loader.prime(updated_bicycle)
+        availability_hub.publish_bicycle(updated_bicycle, previous_location_id=previous_location_id)
+        return updated_bicycle
 
     def delete(self, bicycle_id: int) -> dict:
-        if not self.bicycle_repository.delete_bicycle(bicycle_id=bicycle_id):
+        try:
+            deleted_bicycle = self.bicycle_repository.delete_bicycle(bicycle_id=bicycle_id)
+        except IntegrityError as e:
+            if is_foreign_key_violation(e):
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Не вдалося видалити велосипед з ID {bicycle_id}, оскільки існують пов'язані записи про прокат."
+                )
+            raise
+        if deleted_bicycle is None:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Велосипед з ID {bicycle_id} не знайдено")
+        self.loader.clear(bicycle_id)
+        availability_hub.publish_removed(deleted_bicycle.current_location_id, bicycle_id)
         return {"message": f"Велосипед з ID {bicycle_id} видалено"}
 
-    def get_available_bicycles_in_location(self, location_id: int) -> List[BicycleDto]:
-        bicycles = self.bicycle_repository.get_bicycles_by_location(location_id=location_id)
+    # Масові операції
+
+    def move(self, move_data: BicycleMove) -> BicycleBulkResult:
+        if move_data.status == BicycleStatus.RENTED:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Велосипеди в прокаті не можна перемістити")
+        statuses = (move_data.status,) if move_data.status is not None else MOVABLE_STATUSES
+        try:
+            moved = self.bicycle_repository.move_bicycles(
+                from_location_id=move_data.from_location_id, to_location_id=move_data.to_location_id, statuses=statuses,
+            )
+        except IntegrityError as e:
+            if is_foreign_key_violation(e):
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Локацію не знайдено")
+            raise
+        moved = [BicycleDto.model_validate(b) for b in moved]
+        if availability_hub.subscriber_count(move_data.from_location_id) or availability_hub.subscriber_count(move_data.to_location_id):
+            for bicycle in moved:
+                availability_hub.publish_bicycle(bicycle, previous_location_id=move_data.from_location_id)
+        return BicycleBulkResult(count=len(moved), ids=[b.id for b in moved])
+
+    def mark_for_repair(self, ids: List[int]) -> BicycleBulkResult:
+        # Велосипеди, яких немає або для яких перехід заборонений (вже на ремонті), пропускаються
+        from_statuses = statuses_allowed_before(BicycleStatus.REPAIR) - {BicycleStatus.REPAIR}
+        updated = self.bicycle_repository.set_bicycles_status(ids=ids, new_status=BicycleStatus.REPAIR, from_statuses=from_statuses)
+        updated = [BicycleDto.model_validate(b) for b in updated]
+        for bicycle in updated:
+            if availability_hub.subscriber_count(bicycle.current_location_id):
+                availability_hub.publish_bicycle(bicycle)
+        updated_ids = {b.id for b in updated}
+        return BicycleBulkResult(
+            count=len(updated), ids=sorted(updated_ids), skipped_ids=sorted(set(ids) - updated_ids),
+        )
+
+    def delete_many(self, location_id: Optional[int] = None, bicycle_status: Optional[BicycleStatus] = None) -> BicycleBulkResult:
+        if location_id is None and bicycle_status is None:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Потрібен хоча б один фільтр: location_id або status")
+        deleted = self.bicycle_repository.delete_bicycles(location_id=location_id, status=bicycle_status)
+        for bicycle in deleted:
+            self.loader.clear(bicycle.id)
+            availability_hub.publish_removed(bicycle.current_location_id, bicycle.id)
+        return BicycleBulkResult(count=len(deleted), ids=[b.id for b in deleted])
+
+    def get_available_bicycles_in_location(self, location_id: int, fields: Optional[List[str]] = None) -> List[Union[BicycleDto, dict]]:
+        if fields:
+            return _without_held(self.bicycle_repository.get_bicycles_by_location(location_id=location_id, fields=_with_id(fields)), self._holds())
+        bicycles = _without_held(self.bicycle_repository.get_bicycles_by_location(location_id=location_id), self._holds())
         return [BicycleDto.model_validate(b) for b in bicycles] # Виправлено: bicycle -> bicycles
 
+    # Резервування
+
+    def hold(self, bicycle_id: int, hold_data: BicycleHoldCreate) -> BicycleHoldDto:
+        ttl = hold_data.ttl_seconds or HOLD_TTL
+        if ttl > HOLD_MAX_TTL:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Резервування не може тривати довше {HOLD_MAX_TTL} с")
+        # bicycle_holds.user_id без зовнішнього ключа (користувачі живуть в основній БД, резервування — у шарді
+        # велосипеда), тож існування користувача перевіряється тут, як і під час створення прокату
+        if self.user_repository.get_user(user_id=hold_data.user_id, fields=["id"]) is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Користувача не знайдено")
+        # Резервування іншого користувача, відоме цьому воркеру, відхиляється без звернення до БД
+        existing = self._holds().held_by_others(bicycle_id, hold_data.user_id)
+        if existing is not None:
+            raise _held_conflict(existing.expires_at)
+
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=ttl)
+        row = self.hold_repository.place_hold(
+            bicycle_id=bicycle_id, user_id=hold_data.user_id, expires_at=expires_at, purge_expired=hold_registry.take_expired(),
+        )
+        if row is None:
+            # Нічого не вставлено й не оновлено: пояснюємо чому
+            bicycle = self.bicycle_repository.get_bicycle(bicycle_id=bicycle_id)
+            if bicycle is None:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Велосипед з ID {bicycle_id} не знайдено")
+            if bicycle.status != BicycleStatus.AVAILABLE:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Велосипед недоступний. Поточний статус: {bicycle.status.value}")
+            current = self.hold_repository.get_hold(bicycle_id=bicycle_id)
+            if current is not None:
+                hold_registry.put(to_hold(current))
+            raise _held_conflict(current.expires_at if current is not None else None)
+
+        hold = to_hold(row)
+        hold_registry.put(hold)
+        if availability_hub.subscriber_count(hold.location_id):
+            availability_hub.publish_removed(hold.location_id, bicycle_id)
+        return BicycleHoldDto(bicycle_id=hold.bicycle_id, user_id=hold.user_id, expires_at=hold.expires_at)
+
+    def release_hold(self, bicycle_id: int, user_id: int) -> None:
+        if not self.hold_repository.release_hold(bicycle_id=bicycle_id, user_id=user_id):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Резервування цього користувача для велосипеда не знайдено")
+        hold = hold_registry.get(bicycle_id)
+        hold_registry.remove(bicycle_id)
+        if hold is not None and availability_hub.subscriber_count(hold.location_id):
+            bicycle = self.bicycle_repository.get_bicycle(bicycle_id=bicycle_id)
+            if bicycle is not None:
+                availability_hub.publish_bicycle(BicycleDto.model_validate(bicycle))
+
     def get_most_rented_bicycle(self) -> Optional[BicycleDto]:
         bicycle = self.bicycle_repository.get_most_rented_bicycle()
         if bicycle:
@@ -0,0 +1,167 @@
+import math
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from core.geo import EARTH_RADIUS_M
+
+
+HOURS_PER_WEEK = 168
+# Через скільки секунд матриця перебудовується з БД, щоб підхопити прокати, створені іншими воркерами
+DEMAND_REFRESH_INTERVAL = float(os.getenv("DEMAND_REFRESH_INTERVAL", "3600"))
+# Запас понад прогноз: скільки доступних велосипедів тримати на локації відносно очікуваного попиту
+DEMAND_SAFETY_FACTOR = float(os.getenv("DEMAND_SAFETY_FACTOR", "1.2"))
+TRANSFER_CANDIDATES = int(os.getenv("DEMAND_TRANSFER_CANDIDATES", "8"))
+
+
+def hour_of_week(moment: datetime) -> int:
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    moment = moment.astimezone(timezone.utc)
+    return moment.weekday() * 24 + moment.hour
+
+
+class DemandMatrix:
+    # Матриця локація × година тижня з кількістю видач велосипедів. Новий прокат додає одиницю
+    # в одну клітинку; рядки для нових локацій додаються подвоєнням розміру масиву
+    def __init__(self, capacity: int = 64, refresh_interval: float = DEMAND_REFRESH_INTERVAL):
+        self.refresh_interval = refresh_interval
+        self._counts = np.zeros((capacity, HOURS_PER_WEEK), dtype=np.float64)
+        self._rows: Dict[int, int] = {}
+        self._since: Optional[datetime] = None
+        self._loaded_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _row(self, location_id: int) -> int:
+        row = self._rows.get(location_id)
+        if row is None:
+            row = len(self._rows)
+            if row >= self._counts.shape[0]:
+                grown = np.zeros((self._counts.shape[0] * 2, HOURS_PER_WEEK), dtype=np.float64)
+                grown[:row] = self._counts
+                self._counts = grown
+            self._rows[location_id] = row
+        return row
+
+    def is_stale(self) -> bool:
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > self.refresh_interval
+
+    def rebuild(self, pickups: Iterable[Tuple[int, datetime]]) -> None:
+        rows_by_location: Dict[int, int] = {}
+        rows, slots, since = [], [], None
+        for location_id, started_at in pickups:
+            rows.append(rows_by_location.setdefault(location_id, len(rows_by_location)))
+            slots.append(hour_of_week(started_at))
+            started_at = started_at if started_at.tzinfo else started_at.replace(tzinfo=timezone.utc)
+            since = started_at if since is None or started_at < since else since
+        counts = np.zeros((max(64, len(rows_by_location) * 2), HOURS_PER_WEEK), dtype=np.float64)
+        np.add.at(counts, (np.asarray(rows, dtype=np.int64), np.asarray(slots, dtype=np.int64)), 1.0)
+        with self._lock:
+            self._counts, self._rows, self._since = counts, rows_by_location, since
+            self._loaded_at = time.monotonic()
+
+    def record_pickup(self, location_id: Optional[int], started_at: datetime) -> None:
+        if location_id is None:
+            return
+        with self._lock:
+            self._counts[self._row(location_id), hour_of_week(started_at)] += 1.0
+            if self._since is None:
+                self._since = started_at if started_at.tzinfo else started_at.replace(tzinfo=timezone.utc)
+
+    def forecast(self, now: datetime, horizon_hours: int) -> Dict[int, float]:
+        # Очікувані видачі на наступні horizon_hours годин: середнє за тиждень для тих самих годин тижня
+        start = hour_of_week(now)
+        slots = [(start + h) % HOURS_PER_WEEK for h in range(horizon_hours)]
+        with self._lock:
+            if not self._rows:
+                return {}
+            observed = max(1.0, (now - self._since).total_seconds() / (7 * 24 * 3600)) if self._since else 1.0
+            expected = self._counts[:len(self._rows), slots].sum(axis=1) / observed
+            return {location_id: float(expected[row]) for location_id, row in self._rows.items()}
+
+
+def _distance_matrix(sources: List[int], sinks: List[int], coordinates: Dict[int, Tuple[float, float]]) -> np.ndarray:
+    # Векторизована гаверсинусна відстань; для локацій без координат — inf
+    def coords(ids):
+        points = np.array([coordinates.get(l, (np.nan, np.nan)) for l in ids], dtype=np.float64)
+        return np.radians(points[:, 0]), np.radians(points[:, 1])
+
+    lat1, lon1 = coords(sources)
+    lat2, lon2 = coords(sinks)
+    d_phi = lat2[None, :] - lat1[:, None]
+    d_lambda = lon2[None, :] - lon1[:, None]
+    a = np.sin(d_phi / 2) ** 2 + np.cos(lat1)[:, None] * np.cos(lat2)[None, :] * np.sin(d_lambda / 2) ** 2
+    distances = 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+    return np.where(np.isnan(distances), np.inf, distances)
+
+
+def plan_transfers(
+    available: Dict[int, int],
+    expected: Dict[int, float],
+    coordinates: Dict[int, Tuple[float, float]],
+    safety_factor: float = DEMAND_SAFETY_FACTOR,
+) -> Tuple[Dict[int, int], List[dict]]:
+    # Ціль для локації — прогноз із запасом. Надлишки везуться в дефіцитні локації жадібно:
+    # пари перебираються від найближчої; локації без координат — наприкінці, від найбільших обсягів
+    location_ids = sorted(set(available) | set(expected))
+    targets = {l: int(math.ceil(expected.get(l, 0.0) * safety_factor)) for l in location_ids}
+    surplus = {l: available.get(l, 0) - targets[l] for l in location_ids if available.get(l, 0) > targets[l]}
+    deficit = {l: targets[l] - available.get(l, 0) for l in location_ids if available.get(l, 0) < targets[l]}
+
+    transfers: List[dict] = []
+    if not surplus or not deficit:
+        return targets, transfers
+
+    sources = sorted(surplus, key=surplus.get, reverse=True)
+    sinks = sorted(deficit, key=deficit.get, reverse=True)
+    distances = _distance_matrix(sources, sinks, coordinates)
+    left = [surplus[s] for s in sources]
+    need = [deficit[d] for d in sinks]
+    to_move = min(sum(left), sum(need))
+
+    # Кожен прохід бере для кожної відкритої дефіцитної локації лише TRANSFER_CANDIDATES найближчих відкритих
+    # джерел і закриває пари від найближчої. Найближча відкрита пара завжди серед кандидатів,
+    # тож кожен прохід щось перевозить, а наступний працює лише з тим, що лишилось
+    while to_move:
+        open_i = np.flatnonzero(np.asarray(left) > 0)
+        open_j = np.flatnonzero(np.asarray(need) > 0)
+        sub = distances[np.ix_(open_i, open_j)]
+        candidates = min(len(open_i), TRANSFER_CANDIDATES)
+        if candidates < len(open_i):
+            nearest = np.argpartition(sub, candidates - 1, axis=0)[:candidates]
+        else:
+            nearest = np.tile(np.arange(len(open_i))[:, None], (1, len(open_j)))
+        pair_i = open_i[nearest.ravel()]
+        pair_j = open_j[np.tile(np.arange(len(open_j)), candidates)]
+        # За однакової (нескінченної) відстані першими йдуть більші обсяги — джерела і стоки вже так впорядковані
+        for k in np.lexsort((pair_j, pair_i, distances[pair_i, pair_j])):
+            i, j = int(pair_i[k]), int(pair_j[k])
+            if not left[i] or not need[j]:
+                continue
+            moved = min(left[i], need[j])
+            left[i] -= moved
+            need[j] -= moved
+            to_move -= moved
+            distance = distances[i, j]
+            transfers.append({
+                "from_location_id": sources[i],
+                "to_location_id": sinks[j],
+                "bicycles": moved,
+                "distance_m": round(float(distance), 1) if np.isfinite(distance) else None,
+            })
+            if not to_move:
+                break
+    return targets, transfers
+
+
+demand_matrix = DemandMatrix()
+
+
+def ensure_matrix(load_pickups: Callable[[], Iterable[Tuple[int, datetime]]]) -> DemandMatrix:
+    if demand_matrix.is_stale():
+        demand_matrix.rebuild(load_pickups())
+    return demand_matrix
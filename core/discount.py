@@ -1,39 +1,56 @@
-from typing import List, Optional, Annotated
+from typing import List, Optional, Annotated, Union
 from datetime import datetime
 
 from fastapi import Depends, HTTPException, status
+from sqlalchemy.exc import IntegrityError
 
 from crud.discount import DiscountRepository
+from crud.writes import unique_violation
 from schemas.discount import DiscountCreate, DiscountUpdate, Discount as DiscountDto
+from core.tracing import traced
 
 
+@traced("service")
 class DiscountService:
     def __init__(self, discount_repository: DiscountRepository = Depends(DiscountRepository)):
         self.discount_repository = discount_repository
 
-    def get_all(self) -> List[DiscountDto]:
+    # Методи читання з fields повертають словники лише з вибраними полями (без DTO-валідації)
+
+    def get_all(self, fields: Optional[List[str]] = None) -> List[Union[DiscountDto, dict]]:
+        if fields:
+            return self.discount_repository.get_discounts(fields=fields)
         discounts = self.discount_repository.get_discounts()
         return [DiscountDto.model_validate(d) for d in discounts]
 
-    def get_by_id(self, discount_id: int) -> DiscountDto:
-        discount = self.discount_repository.get_discount(discount_id=discount_id)
+    def get_by_id(self, discount_id: int, fields: Optional[List[str]] = None) -> Union[DiscountDto, dict]:
+        discount = self.discount_repository.get_discount(discount_id=discount_id, fields=fields)
         if discount is None:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Знижку з ID {discount_id} не знайдено")
-        return DiscountDto.model_validate(discount)
+        return discount if fields else DiscountDto.model_validate(discount)
 
     def create(self, discount_data: DiscountCreate) -> DiscountDto:
-        existing_discount = self.discount_repository.get_discount_by_name(name=discount_data.name)
-        if existing_discount:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Знижка з іменем '{discount_data.name}' вже існує."
-            )
-
-        created_discount = self.discount_repository.create_discount(discount=discount_data)
+        try:
+            created_discount = self.discount_repository.create_discount(discount=discount_data)
+        except IntegrityError as e:
+            if unique_violation(e) == "name":
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Знижка з іменем '{discount_data.name}' вже існує."
+                )
+            raise
         return DiscountDto.model_validate(created_discount)
 
     def update(self, discount_id: int, discount_update_data: DiscountUpdate) -> DiscountDto:
-        updated_discount = self.discount_repository.update_discount(discount_id=discount_id, discount_update=discount_update_data)
+        try:
+            updated_discount = self.discount_repository.update_discount(discount_id=discount_id, discount_update=discount_update_data)
+        except IntegrityError as e:
+            if unique_violation(e) == "name":
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Знижка з іменем '{discount_update_data.name}' вже існує."
+                )
+            raise
         if updated_discount is None:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Знижку з ID {discount_id} не знайдено")
         return DiscountDto.model_validate(updated_discount)
@@ -43,7 +60,9 @@ class DiscountService:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Знижку з ID {discount_id} не знайдено")
         return {"message": f"Знижку з ID {discount_id} видалено"}
 
-    def get_active_discounts(self, current_time: Optional[datetime] = None) -> List[DiscountDto]:
+    def get_active_discounts(self, current_time: Optional[datetime] = None, fields: Optional[List[str]] = None) -> List[Union[DiscountDto, dict]]:
+        if fields:
+            return self.discount_repository.get_active_discounts(current_time=current_time, fields=fields)
         discounts = self.discount_repository.get_active_discounts(current_time=current_time)
         return [DiscountDto.model_validate(d) for d in discounts]
 
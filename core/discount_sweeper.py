@@ -0,0 +1,41 @@
+import logging
+import os
+from datetime import datetime, timezone
+
+from db.database import SessionLocal
+from crud.discount import DiscountRepository
+from core.background import PeriodicWorker
+
+
+logger = logging.getLogger(__name__)
+
+DISCOUNT_SWEEP_INTERVAL = float(os.getenv("DISCOUNT_SWEEP_INTERVAL", "60"))
+
+
+class DiscountSweeper(PeriodicWorker):
+    # Вимикає знижки з минулим valid_to і вмикає заплановані, коли настає їх valid_from.
+    # Обидва кроки — в одній транзакції, тож читачі не бачать проміжного стану
+    name = "discount-sweeper"
+
+    def __init__(self, interval: float = DISCOUNT_SWEEP_INTERVAL):
+        super().__init__(interval=interval)
+
+    def run_once(self) -> bool:
+        db = SessionLocal()
+        try:
+            repository = DiscountRepository(db)
+            current_time = datetime.now(timezone.utc)
+            expired_ids = repository.expire_discounts(current_time=current_time)
+            activated_ids = repository.activate_scheduled_discounts(current_time=current_time)
+            db.commit()
+            if expired_ids or activated_ids:
+                logger.info("Discount sweep: expired %s, activated %s", expired_ids, activated_ids)
+            return False
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+
+discount_sweeper = DiscountSweeper()
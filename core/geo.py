@@ -0,0 +1,125 @@
+import math
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+
+# Розмір клітинки сітки в градусах (~1.1 км по широті); пошук обходить кільця клітинок навколо точки
+GEO_CELL_DEGREES = float(os.getenv("GEO_CELL_DEGREES", "0.01"))
+# Через скільки секунд індекс перечитується з БД, щоб підхопити зміни, зроблені іншими воркерами
+GEO_INDEX_TTL = float(os.getenv("GEO_INDEX_TTL", "60"))
+
+EARTH_RADIUS_M = 6_371_000.0
+_METERS_PER_DEGREE = math.pi * EARTH_RADIUS_M / 180
+
+Cell = Tuple[int, int]
+
+
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+class LocationGridIndex:
+    # Рівномірна сітка id -> (lat, lon) у пам'яті воркера. Записи локацій оновлюють її одразу,
+    # а повне перечитування з БД раз на GEO_INDEX_TTL підхоплює зміни інших воркерів
+    def __init__(self, cell_degrees: float = GEO_CELL_DEGREES, ttl: float = GEO_INDEX_TTL):
+        self.cell_degrees = cell_degrees
+        self.ttl = ttl
+        self._cells: Dict[Cell, Dict[int, Tuple[float, float]]] = defaultdict(dict)
+        self._points: Dict[int, Tuple[float, float]] = {}
+        self._loaded_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _cell(self, lat: float, lon: float) -> Cell:
+        return int(math.floor(lat / self.cell_degrees)), int(math.floor(lon / self.cell_degrees))
+
+    def is_stale(self) -> bool:
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl
+
+    def rebuild(self, points: Iterable[Tuple[int, float, float]]) -> None:
+        cells: Dict[Cell, Dict[int, Tuple[float, float]]] = defaultdict(dict)
+        by_id = {}
+        for location_id, lat, lon in points:
+            cells[self._cell(lat, lon)][location_id] = (lat, lon)
+            by_id[location_id] = (lat, lon)
+        with self._lock:
+            self._cells, self._points = cells, by_id
+            self._loaded_at = time.monotonic()
+
+    def upsert(self, location_id: int, lat: Optional[float], lon: Optional[float]) -> None:
+        with self._lock:
+            self._remove(location_id)
+            if lat is not None and lon is not None:
+                self._cells[self._cell(lat, lon)][location_id] = (lat, lon)
+                self._points[location_id] = (lat, lon)
+
+    def remove(self, location_id: int) -> None:
+        with self._lock:
+            self._remove(location_id)
+
+    def _remove(self, location_id: int) -> None:
+        point = self._points.pop(location_id, None)
+        if point is not None:
+            cell = self._cell(*point)
+            self._cells[cell].pop(location_id, None)
+            if not self._cells[cell]:
+                del self._cells[cell]
+
+    def coordinates(self) -> Dict[int, Tuple[float, float]]:
+        with self._lock:
+            return dict(self._points)
+
+    def __len__(self) -> int:
+        return len(self._points)
+
+    def nearest(self, lat: float, lon: float, radius_m: float, limit: int) -> List[Tuple[int, float]]:
+        # Кільця клітинок обходяться від центру; зупиняємось, коли найближча точка наступного кільця
+        # вже далі за радіус або за limit-й знайдений результат
+        center_lat, center_lon = self._cell(lat, lon)
+        # Градус довготи коротшає до полюсів — беремо найкоротший у межах радіуса, щоб не пропустити точок
+        lat_extent = min(89.9, abs(lat) + radius_m / _METERS_PER_DEGREE)
+        cell_m = self.cell_degrees * _METERS_PER_DEGREE * max(math.cos(math.radians(lat_extent)), 1e-6)
+        max_ring = int(math.ceil(radius_m / cell_m)) + 1
+
+        found: List[Tuple[float, int]] = []
+        with self._lock:
+            cells = self._cells
+            for ring in range(max_ring + 1):
+                if (ring - 1) * cell_m > radius_m:
+                    break
+                if len(found) >= limit and (ring - 1) * cell_m > found[limit - 1][0]:
+                    break
+                for cell in _ring_cells(center_lat, center_lon, ring):
+                    for location_id, (p_lat, p_lon) in cells.get(cell, {}).items():
+                        distance = haversine_m(lat, lon, p_lat, p_lon)
+                        if distance <= radius_m:
+                            found.append((distance, location_id))
+                found.sort()
+        return [(location_id, distance) for distance, location_id in found[:limit]]
+
+
+def _ring_cells(center_lat: int, center_lon: int, ring: int) -> Iterable[Cell]:
+    if ring == 0:
+        yield center_lat, center_lon
+        return
+    for d in range(-ring, ring + 1):
+        yield center_lat - ring, center_lon + d
+        yield center_lat + ring, center_lon + d
+    for d in range(-ring + 1, ring):
+        yield center_lat + d, center_lon - ring
+        yield center_lat + d, center_lon + ring
+
+
+location_index = LocationGridIndex()
+
+
+def ensure_index(load_points: Callable[[], Iterable[Tuple[int, float, float]]]) -> LocationGridIndex:
+    if location_index.is_stale():
+        location_index.rebuild(load_points())
+    return location_index
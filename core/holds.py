@@ -0,0 +1,151 @@
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from db.database import SessionLocal
+from crud.bicycle_hold import BicycleHoldRepository
+
+
+logger = logging.getLogger(__name__)
+
+# Тривалість резервування за замовчуванням і найбільша, яку може попросити клієнт (секунди)
+HOLD_TTL = int(os.getenv("HOLD_TTL", "120"))
+HOLD_MAX_TTL = int(os.getenv("HOLD_MAX_TTL", "600"))
+# Як часто (у секундах) реєстр перечитує активні резервування з БД, щоб бачити резервування інших воркерів
+HOLD_REGISTRY_TTL = float(os.getenv("HOLD_REGISTRY_TTL", "5"))
+
+
+@dataclass(frozen=True)
+class Hold:
+    bicycle_id: int
+    user_id: int
+    location_id: Optional[int]
+    expires_at: datetime
+
+
+def _utc(moment: datetime) -> datetime:
+    return moment.replace(tzinfo=timezone.utc) if moment.tzinfo is None else moment
+
+
+class HoldRegistry:
+    # Активні резервування воркера: словник bicycle_id -> Hold і купа (expires_at, seq, bicycle_id).
+    # Таймерів немає — прострочені записи знімаються з вершини купи при кожному зверненні, тож тисячі
+    # резервувань спливають без окремих потоків і без запитів до БД. Запис у купі, витіснений
+    # продовженням чи зняттям резервування, пропускається за seq. Власні резервування воркер бачить одразу,
+    # а резервування інших воркерів — після перечитування з БД раз на HOLD_REGISTRY_TTL (ensure_holds)
+    def __init__(self, ttl: float = HOLD_REGISTRY_TTL):
+        self.ttl = ttl
+        self._loaded_at: Optional[float] = None
+        self._holds: Dict[int, Tuple[Hold, int]] = {}
+        self._heap: List[Tuple[float, int, int]] = []
+        self._counter = itertools.count()
+        self._expired_since_purge = 0
+        self._lock = threading.Lock()
+
+    def _expire(self, now: float) -> None:
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            _, seq, bicycle_id = heapq.heappop(heap)
+            current = self._holds.get(bicycle_id)
+            if current is not None and current[1] == seq:
+                del self._holds[bicycle_id]
+                self._expired_since_purge += 1
+
+    def put(self, hold: Hold) -> None:
+        seq = next(self._counter)
+        with self._lock:
+            self._holds[hold.bicycle_id] = (hold, seq)
+            heapq.heappush(self._heap, (_utc(hold.expires_at).timestamp(), seq, hold.bicycle_id))
+
+    def remove(self, bicycle_id: int) -> None:
+        # Запис у купі лишається і буде пропущений, коли дійде до вершини
+        with self._lock:
+            self._holds.pop(bicycle_id, None)
+
+    def get(self, bicycle_id: int) -> Optional[Hold]:
+        with self._lock:
+            self._expire(datetime.now(timezone.utc).timestamp())
+            current = self._holds.get(bicycle_id)
+            return current[0] if current is not None else None
+
+    def held_by_others(self, bicycle_id: int, user_id: int) -> Optional[Hold]:
+        hold = self.get(bicycle_id)
+        return hold if hold is not None and hold.user_id != user_id else None
+
+    def held_ids(self) -> frozenset:
+        with self._lock:
+            self._expire(datetime.now(timezone.utc).timestamp())
+            return frozenset(self._holds)
+
+    def held_counts(self, location_ids: Iterable[int]) -> Dict[int, int]:
+        wanted = set(location_ids)
+        counts: Dict[int, int] = {}
+        with self._lock:
+            self._expire(datetime.now(timezone.utc).timestamp())
+            for hold, _ in self._holds.values():
+                if hold.location_id in wanted:
+                    counts[hold.location_id] = counts.get(hold.location_id, 0) + 1
+        return counts
+
+    def take_expired(self) -> bool:
+        # Чи спливло щось після останнього очищення таблиці; наступний запис резервування прибере ці рядки
+        with self._lock:
+            self._expire(datetime.now(timezone.utc).timestamp())
+            expired, self._expired_since_purge = self._expired_since_purge, 0
+            return expired > 0
+
+    def is_stale(self) -> bool:
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl
+
+    def rebuild(self, holds: Iterable[Hold]) -> None:
+        holds = list(holds)
+        with self._lock:
+            self._holds.clear()
+            self._heap.clear()
+            for hold in holds:
+                seq = next(self._counter)
+                self._holds[hold.bicycle_id] = (hold, seq)
+                self._heap.append((_utc(hold.expires_at).timestamp(), seq, hold.bicycle_id))
+            heapq.heapify(self._heap)
+            self._expired_since_purge = 0
+            self._loaded_at = time.monotonic()
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._expire(datetime.now(timezone.utc).timestamp())
+            return len(self._holds)
+
+
+hold_registry = HoldRegistry()
+
+
+def to_hold(row) -> Hold:
+    return Hold(bicycle_id=row.bicycle_id, user_id=row.user_id, location_id=row.location_id, expires_at=_utc(row.expires_at))
+
+
+def ensure_holds(load_active_holds: Callable[..., Iterable]) -> HoldRegistry:
+    # Як і геоіндекс: застарілий реєстр перечитується з БД на шляху запиту
+    if hold_registry.is_stale():
+        hold_registry.rebuild(to_hold(row) for row in load_active_holds(now=datetime.now(timezone.utc)))
+    return hold_registry
+
+
+def load_holds() -> int:
+    # Під час старту: прострочені рядки видаляються, активні (пережили перезапуск) — у реєстр
+    db = SessionLocal()
+    try:
+        repository = BicycleHoldRepository(db)
+        now = datetime.now(timezone.utc)
+        repository.delete_expired_holds(now=now)
+        holds = [to_hold(row) for row in repository.get_active_holds(now=now)]
+    finally:
+        db.close()
+    hold_registry.rebuild(holds)
+    logger.info("Loaded %d active bicycle holds", len(holds))
+    return len(holds)
@@ -0,0 +1,40 @@
+from operator import attrgetter
+from typing import Callable, Dict, Generic, Hashable, Iterable, List, Optional, TypeVar
+
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class DataLoader(Generic[K, V]):
+    # Живе стільки ж, скільки сервіс, тобто один запит. load_many() вибирає всі ще не завантажені ключі
+    # одним запитом; load() звертається до БД лише за ключем, якого ще немає в кеші. Окремі виклики load()
+    # не відкладаються і не зливаються в один запит — списки ID треба передавати в load_many()
+    def __init__(self, batch_load: Callable[[List[K]], Iterable[V]], key: Callable[[V], K] = attrgetter("id")):
+        self._batch_load = batch_load
+        self._key = key
+        self._cache: Dict[K, Optional[V]] = {}
+
+    def _fetch(self, keys: List[K]) -> None:
+        for key in keys:
+            self._cache[key] = None
+        for value in self._batch_load(keys):
+            self._cache[self._key(value)] = value
+
+    def load(self, key: K) -> Optional[V]:
+        if key not in self._cache:
+            self._fetch([key])
+        return self._cache[key]
+
+    def load_many(self, keys: Iterable[K]) -> List[Optional[V]]:
+        keys = list(keys)
+        missing = list(dict.fromkeys(key for key in keys if key not in self._cache))
+        if missing:
+            self._fetch(missing)
+        return [self._cache[key] for key in keys]
+
+    def prime(self, value: V) -> None:
+        self._cache[self._key(value)] = value
+
+    def clear(self, key: K) -> None:
+        self._cache.pop(key, None)
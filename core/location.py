@@ -1,43 +1,134 @@
-from typing import List, Optional, Annotated
+from typing import List, Optional, Annotated, Union
 from datetime import datetime
 from fastapi import Depends, HTTPException
 from starlette import status
+from sqlalchemy.exc import IntegrityError
 
 from crud.location import LocationRepository
-from schemas.location import LocationCreate, LocationUpdate, Location as LocationDto
+from crud.bicycle_hold import BicycleHoldRepository
+from crud.writes import unique_violation
+from db.sharding import shard_map
+from core.loader import DataLoader
+from core.geo import location_index, ensure_index
+from core.holds import ensure_holds
+from models.bicycle import BicycleStatus
+from schemas.location import LocationCreate, LocationUpdate, Location as LocationDto, LocationStatusCounts, FleetStatusCounts, NearbyLocation
+from core.tracing import traced
 
 
+@traced("service")
 class LocationService:
-    def __init__(self, location_repository: LocationRepository = Depends(LocationRepository)): # <--- ЗМІНА ТУТ
+    def __init__(self, location_repository: LocationRepository = Depends(LocationRepository), # <--- ЗМІНА ТУТ
+                 hold_repository: BicycleHoldRepository = Depends(BicycleHoldRepository)):
         self.location_repository = location_repository
+        self.hold_repository = hold_repository
+        self.loader = DataLoader(self._load_locations)
 
-    def get_all(self) -> List[LocationDto]:
+    def _load_locations(self, ids: List[int]) -> List[LocationDto]:
+        return [LocationDto.model_validate(l) for l in self.location_repository.get_locations_by_ids(ids=ids)]
+
+    # Методи читання з fields повертають словники лише з вибраними полями (без DTO-валідації)
+
+    def get_all(self, fields: Optional[List[str]] = None) -> List[Union[LocationDto, dict]]:
+        if fields:
+            return self.location_repository.get_locations(fields=fields)
         locations = self.location_repository.get_locations()
         return [LocationDto.model_validate(l) for l in locations]
 
-    def get_by_id(self, location_id: int) -> LocationDto:
-        location = self.location_repository.get_location(location_id=location_id)
+    def get_by_id(self, location_id: int, fields: Optional[List[str]] = None) -> Union[LocationDto, dict]:
+        if fields:
+            location = self.location_repository.get_location(location_id=location_id, fields=fields)
+        else:
+            location = self.loader.load(location_id)
         if location is None:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Локацію з ID {location_id} не знайдено")
-        return LocationDto.model_validate(location)
+        return location
+
+    def get_by_ids(self, ids: List[int], fields: Optional[List[str]] = None) -> List[Union[LocationDto, dict]]:
+        if fields:
+            return self.location_repository.get_locations_by_ids(ids=ids, fields=fields)
+        return [l for l in self.loader.load_many(ids) if l is not None]
 
     def create(self, location_data: LocationCreate) -> LocationDto:
-        created_location = self.location_repository.create_location(location=location_data)
-        return LocationDto.model_validate(created_location)
+        try:
+            created_location = LocationDto.model_validate(self.location_repository.create_location(location=location_data))
+        except IntegrityError as e:
+            if unique_violation(e) == "name":
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Локація з назвою '{location_data.name}' вже існує")
+            raise
+        location_index.upsert(created_location.id, created_location.latitude, created_location.longitude)
+        return created_location
 
     def update(self, location_id: int, location_update_data: LocationUpdate) -> LocationDto:
-        updated_location = self.location_repository.update_location(location_id=location_id, location_update=location_update_data)
+        if shard_map.enabled and "city" in location_update_data.model_fields_set \
+                and shard_map.for_region(location_update_data.city) is not shard_map.for_id(location_id):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Нове місто локації належить іншому шарду; перенесення локації між шардами не підтримується",
+            )
+        try:
+            updated_location = self.location_repository.update_location(location_id=location_id, location_update=location_update_data)
+        except IntegrityError as e:
+            if unique_violation(e) == "name":
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Локація з назвою '{location_update_data.name}' вже існує")
+            raise
         if updated_location is None:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Локацію з ID {location_id} не знайдено")
-        return LocationDto.model_validate(updated_location)
+        updated_location = LocationDto.model_validate(updated_location)
+        self.loader.prime(updated_location)
+        location_index.upsert(updated_location.id, updated_location.latitude, updated_location.longitude)
+        return updated_location
 
     def delete(self, location_id: int) -> dict:
         if not self.location_repository.delete_location(location_id=location_id):
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Локацію з ID {location_id} не знайдено")
+        self.loader.clear(location_id)
+        location_index.remove(location_id)
         return {"message": f"Локацію з ID {location_id} видалено"}
 
-    def get_top_locations_by_rentals(self, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None, limit: int = 5) -> List[LocationDto]:
+    def get_top_locations_by_rentals(self, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None, limit: int = 5, fields: Optional[List[str]] = None) -> List[Union[LocationDto, dict]]:
+        if fields:
+            return self.location_repository.get_top_performing_locations(start_date=start_date, end_date=end_date, limit=limit, fields=fields)
         locations = self.location_repository.get_top_performing_locations(start_date=start_date, end_date=end_date, limit=limit)
         return [LocationDto.model_validate(l) for l in locations]
 
+    def get_nearby(self, latitude: float, longitude: float, radius_m: float, min_available: int = 1, limit: int = 10) -> List[NearbyLocation]:
+        # Кандидати беруться з індексу в пам'яті з запасом; доступність перевіряється одним запитом
+        # до лічильників статусів. Якщо після фільтра результатів замало — запас подвоюється
+        index = ensure_index(self.location_repository.get_coordinates)
+        candidates_limit = limit * 4
+        while True:
+            candidates = index.nearest(latitude, longitude, radius_m, candidates_limit)
+            available = self.location_repository.get_available_counts(ids=[c[0] for c in candidates]) if candidates else {}
+            # Зарезервовані велосипеди лічильники статусів ще рахують доступними
+            for location_id, held in ensure_holds(self.hold_repository.get_active_holds).held_counts(available).items():
+                available[location_id] = max(0, available[location_id] - held)
+            matched = [(l, d) for l, d in candidates if available.get(l, 0) >= min_available][:limit]
+            if len(matched) >= limit or len(candidates) < candidates_limit:
+                break
+            candidates_limit *= 2
+
+        locations = {l.id: l for l in self.loader.load_many([l for l, _ in matched]) if l is not None}
+        return [
+            NearbyLocation(**locations[l].model_dump(), distance_m=round(d, 1), available_bicycles=available.get(l, 0))
+            for l, d in matched if l in locations
+        ]
+
+    def get_status_counts(self, location_id: int) -> LocationStatusCounts:
+        self.get_by_id(location_id=location_id)
+        counts = {s: 0 for s in BicycleStatus}
+        counts.update(dict(self.location_repository.get_status_counts(location_id=location_id)))
+        return LocationStatusCounts(location_id=location_id, counts=counts)
+
+    def get_fleet_status_counts(self) -> FleetStatusCounts:
+        totals = {s: 0 for s in BicycleStatus}
+        by_location = {}
+        for location_id, bicycle_status, count in self.location_repository.get_all_status_counts():
+            by_location.setdefault(location_id, {s: 0 for s in BicycleStatus})[bicycle_status] = count
+            totals[bicycle_status] += count
+        return FleetStatusCounts(
+            counts=totals,
+            locations=[LocationStatusCounts(location_id=l, counts=c) for l, c in sorted(by_location.items())],
+        )
+
 LocationServiceDependency = Annotated[LocationService, Depends]
@@ -0,0 +1,83 @@
+import logging
+import os
+from collections import defaultdict
+from typing import Callable, Dict, List
+
+from db.database import SessionLocal
+from db.sharding import database_infos
+from crud.outbox import OutboxRepository
+from core.background import PeriodicWorker
+from models.outbox import OutboxEvent
+
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_CONSUMER = "projections"
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "500"))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "1"))
+
+ProjectionHandler = Callable[[List[OutboxEvent]], None]
+
+# entity (назва таблиці) або "*" -> обробники, яким передаються події партії по порядку
+_projection_handlers: Dict[str, List[ProjectionHandler]] = defaultdict(list)
+
+
+def register_projection(entity: str = "*") -> Callable[[ProjectionHandler], ProjectionHandler]:
+    def decorator(handler: ProjectionHandler) -> ProjectionHandler:
+        _projection_handlers[entity].append(handler)
+        return handler
+    return decorator
+
+
+def _dispatch(events: List[OutboxEvent]) -> None:
+    by_entity: Dict[str, List[OutboxEvent]] = defaultdict(list)
+    for event in events:
+        by_entity[event.entity].append(event)
+
+    for handler in _projection_handlers.get("*", []):
+        handler(events)
+    for entity, entity_events in by_entity.items():
+        for handler in _projection_handlers.get(entity, []):
+            handler(entity_events)
+
+
+class OutboxWorker(PeriodicWorker):
+    # Доставка "щонайменше один раз": події партії видаляються лише після того, як усі обробники
+    # успішно їх обробили, тож після збою партія повториться. Журнал містить тільки недоставлені події
+    name = "outbox-worker"
+
+    def __init__(self, batch_size: int = OUTBOX_BATCH_SIZE, interval: float = OUTBOX_POLL_INTERVAL):
+        super().__init__(interval=interval)
+        self.batch_size = batch_size
+
+    def run_once(self) -> bool:
+        # У кожної БД (основної і кожного шарда) свій журнал подій і своя контрольна точка
+        has_more = [self._run_on(SessionLocal(info=info)) for info in database_infos()]
+        return any(has_more)
+
+    def _run_on(self, db) -> bool:
+        try:
+            repository = OutboxRepository(db)
+            # Блокування рядка споживача впорядковує воркери: партії одного журналу обробляються по черзі
+            checkpoint = repository.lock_checkpoint(OUTBOX_CONSUMER)
+            events = repository.get_pending_events(limit=self.batch_size)
+            if not events:
+                db.commit()
+                return False
+
+            _dispatch(events)
+
+            ids = [event.id for event in events]
+            repository.save_checkpoint(checkpoint, last_event_id=max(ids))
+            repository.delete_events(ids=ids)
+            db.commit()
+            logger.debug("Outbox: processed %d events (ids %d..%d)", len(ids), ids[0], ids[-1])
+            return len(events) == self.batch_size
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+
+outbox_worker = OutboxWorker()
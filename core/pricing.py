@@ -0,0 +1,13 @@
+from datetime import datetime, timezone
+from typing import Optional
+
+
+def _utc(moment: datetime) -> datetime:
+    return moment.replace(tzinfo=timezone.utc) if moment.tzinfo is None else moment
+
+
+def rental_price(start: datetime, end: datetime, price_per_hour: float, discount_percentage: Optional[float] = None) -> float:
+    # Погодинна ціна за фактичну (дробову) тривалість прокату мінус знижка у відсотках; до копійок
+    hours = max(0.0, (_utc(end) - _utc(start)).total_seconds() / 3600)
+    price = hours * price_per_hour * (1 - (discount_percentage or 0.0) / 100)
+    return round(price, 2)
@@ -2,14 +2,23 @@ from typing import List, Optional, Union, Annotated
 from datetime import datetime, timezone
 
 from fastapi import Depends, HTTPException, status
+from sqlalchemy.exc import IntegrityError
 
 
-from schemas.rental import RentalCreate, RentalUpdate, Rental as RentalDto
+from schemas.rental import RentalCreate, RentalUpdate, RentalReturn, Rental as RentalDto
 
 from crud.rental import RentalRepository
 from crud.user import UserRepository
 from crud.bicycle import BicycleRepository
 from crud.discount import DiscountRepository
+from crud.writes import is_foreign_key_violation
+from db.sharding import shard_map
+from core.availability import availability_hub
+from core.demand import demand_matrix
+from core.holds import hold_registry
+from schemas.bicycle import Bicycle as BicycleDto
+from models.bicycle import BicycleStatus
+from core.tracing import traced
 
 
 def make_utc_aware(dt: datetime) -> datetime:
@@ -18,6 +27,7 @@ def make_utc_aware(dt: datetime) -> datetime:
     return dt.astimezone(timezone.utc)
 
 
+@traced("service")
 class RentalService:
     def __init__(
         self,
@@ -31,30 +41,40 @@ class RentalService:
         self.bicycle_repository = bicycle_repository
         self.discount_repository = discount_repository
 
-    def get_all(self) -> List[RentalDto]:
+    # Методи читання з fields повертають словники лише з вибраними полями (без DTO-валідації)
+
+    def get_all(self, fields: Optional[List[str]] = None) -> List[Union[RentalDto, dict]]:
+        if fields:
+            return self.rental_repository.get_rentals(fields=fields)
         rentals = self.rental_repository.get_rentals()
         return [RentalDto.model_validate(r) for r in rentals]
 
-    def get_by_id(self, rental_id: int) -> RentalDto:
-        rental = self.rental_repository.get_rental(rental_id=rental_id)
+    def get_by_id(self, rental_id: int, fields: Optional[List[str]] = None) -> Union[RentalDto, dict]:
+        rental = self.rental_repository.get_rental(rental_id=rental_id, fields=fields)
         if rental is None:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Запис про прокат з ID {rental_id} не знайдено")
-        return RentalDto.model_validate(rental)
+        return rental if fields else RentalDto.model_validate(rental)
 
     def create(self, rental_data: RentalCreate) -> RentalDto:
-        user = self.user_repository.get_user(user_id=rental_data.user_id)
-        if not user:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Користувача не знайдено")
-
+        # Користувача перевіряє зовнішній ключ; велосипед і знижку все одно треба прочитати для перевірок статусу
         bicycle = self.bicycle_repository.get_bicycle(bicycle_id=rental_data.bicycle_id)
         if not bicycle:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Велосипед не знайдено")
 
-        if bicycle.status != "доступний":
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Велосипед недоступний. Поточний статус: {bicycle.status}")
+        if bicycle.status != BicycleStatus.AVAILABLE:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Велосипед недоступний. Поточний статус: {bicycle.status.value}")
+
+        # Резервування, про яке знає цей воркер, перевіряється одразу; решту відсікає умова UPDATE у репозиторії
+        hold = hold_registry.held_by_others(rental_data.bicycle_id, rental_data.user_id)
+        if hold is not None:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Велосипед зарезервовано іншим користувачем до {hold.expires_at.isoformat()}",
+            )
 
         rental_start_aware = make_utc_aware(rental_data.rental_start_time)
 
+        discount = None
         if rental_data.discount_id is not None:
             discount = self.discount_repository.get_discount(discount_id=rental_data.discount_id)
 
@@ -64,28 +84,63 @@ class RentalService:
             discount_valid_from_aware = make_utc_aware(discount.valid_from)
             discount_valid_to_aware = make_utc_aware(discount.valid_to)
 
-            is_discount_active = discount.is_active
+            # Знижка з майбутнім valid_from зберігається неактивною до проходу sweeper; у своєму вікні вона вже діє
+            is_discount_active = discount.is_active or discount.is_scheduled
             is_in_valid_range = (discount_valid_from_aware <= rental_start_aware <= discount_valid_to_aware)
 
             if not is_discount_active or not is_in_valid_range:
                 raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Недійсна або неактивна знижка")
 
+        references = []
+        if shard_map.enabled:
+            # Користувач живе в основній БД, а прокат — у шарді велосипеда: зовнішній ключ там перевіряє
+            # лише копію, тож існування користувача перевіряємо тут
+            user = self.user_repository.get_user(user_id=rental_data.user_id)
+            if user is None:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Користувача не знайдено")
+            references = [user] + ([discount] if discount is not None else [])
+
+        location_id = bicycle.current_location_id
         try:
-            created_rental = self.rental_repository.create_rental(rental=rental_data)
+            created_rental = self.rental_repository.create_rental(rental=rental_data, references=references)
+            hold_registry.remove(rental_data.bicycle_id)
+            demand_matrix.record_pickup(location_id, rental_data.rental_start_time)
+            # Після commit велосипед (вже "в прокаті") перечитується з БД, тож робимо це лише коли є підписники
+            if availability_hub.subscriber_count(location_id):
+                availability_hub.publish_bicycle(BicycleDto.model_validate(bicycle))
             return RentalDto.model_validate(created_rental)
         except ValueError as e:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        except IntegrityError as e:
+            # Велосипед і знижка вже прочитані вище, тож не знайтися міг лише користувач
+            if is_foreign_key_violation(e):
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Користувача не знайдено")
+            raise
 
     def update(self, rental_id: int, rental_update_data: RentalUpdate) -> RentalDto:
+        # Існування велосипеда й користувача перевіряють зовнішні ключі, а чинність нової знижки — умова
+        # самого UPDATE; читання потрібне лише тоді, коли жоден рядок не змінився, щоб пояснити чому
+        try:
+            updated_rental = self.rental_repository.update_rental(
+                rental_id=rental_id, rental_update=rental_update_data, references=self._references_for_update(rental_update_data),
+            )
+        except IntegrityError as e:
+            if is_foreign_key_violation(e):
+                if rental_update_data.bicycle_id is not None:
+                    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Велосипед не знайдено для оновлення")
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Користувача не знайдено")
+            raise
+        except ValueError as e:
+            # Активний прокат переводиться на велосипед, який не вдалося позначити "в прокаті"
+            if self.bicycle_repository.get_bicycle(bicycle_id=rental_update_data.bicycle_id) is None:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Велосипед не знайдено для оновлення")
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        if updated_rental is not None:
+            return RentalDto.model_validate(updated_rental)
+
         db_rental = self.rental_repository.get_rental(rental_id=rental_id)
         if not db_rental:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Запис про прокат з ID {rental_id} не знайдено")
-
-        if rental_update_data.bicycle_id is not None and rental_update_data.bicycle_id != db_rental.bicycle_id:
-            bicycle = self.bicycle_repository.get_bicycle(bicycle_id=rental_update_data.bicycle_id)
-            if not bicycle:
-                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Велосипед не знайдено для оновлення")
-
         if rental_update_data.discount_id is not None and rental_update_data.discount_id != db_rental.discount_id:
             discount = self.discount_repository.get_discount(discount_id=rental_update_data.discount_id)
 
@@ -93,25 +148,69 @@ class RentalService:
             discount_valid_from_aware = make_utc_aware(discount.valid_from) if discount else None
             discount_valid_to_aware = make_utc_aware(discount.valid_to) if discount else None
 
-            if not discount or not discount.is_active or \
+            if not discount or not (discount.is_active or discount.is_scheduled) or \
                     not (
                             discount_valid_from_aware <= rental_start_aware_for_update <= discount_valid_to_aware):
                 raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Недійсна або неактивна знижка для оновлення")
-
+        # Рядок є, але не в гарячій таблиці
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Запис про прокат з ID {rental_id} заархівовано, його не можна змінити")
+
+    def _references_for_update(self, rental_update_data: RentalUpdate) -> list:
+        # У шардованому режимі новий користувач і нова знижка копіюються з основної БД у шард прокату;
+        # знижки, якої немає, не копіюємо — тоді UPDATE не пройде умову чинності, як і без шардів
+        if not shard_map.enabled:
+            return []
+        references = []
+        if rental_update_data.user_id is not None:
+            user = self.user_repository.get_user(user_id=rental_update_data.user_id)
+            if user is None:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Користувача не знайдено")
+            references.append(user)
+        if rental_update_data.discount_id is not None:
+            discount = self.discount_repository.get_discount(discount_id=rental_update_data.discount_id)
+            if discount is not None:
+                references.append(discount)
+        return references
+
+    def return_bicycle(self, rental_id: int, return_data: RentalReturn) -> RentalDto:
+        # Один виклик замість PUT прокату і PUT велосипеда: вартість за фактичною тривалістю рахує сервер,
+        # а велосипед звільняється в тій самій транзакції. Існування локації перевіряє зовнішній ключ
+        # (у шардованому режимі — лише серед локацій шарда велосипеда, як і для PUT /bicycles)
         try:
-            updated_rental = self.rental_repository.update_rental(rental_id=rental_id, rental_update=rental_update_data)
-            if updated_rental is None:
-                raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Помилка при оновленні запису про прокат")
-            return RentalDto.model_validate(updated_rental)
-        except ValueError as e:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+            returned = self.rental_repository.return_rental(
+                rental_id=rental_id, location_id=return_data.location_id, returned_at=datetime.now(timezone.utc),
+            )
+        except IntegrityError as e:
+            if is_foreign_key_violation(e):
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Локацію повернення не знайдено")
+            raise
+        if returned is None:
+            db_rental = self.rental_repository.get_rental(rental_id=rental_id)
+            if not db_rental:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Запис про прокат з ID {rental_id} не знайдено")
+            if db_rental.actual_return_time is not None:
+                raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Велосипед за прокатом з ID {rental_id} вже повернено")
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Запис про прокат з ID {rental_id} заархівовано, його не можна змінити")
+
+        rental, bicycle, previous_location_id = returned
+        if availability_hub.subscriber_count(previous_location_id) or availability_hub.subscriber_count(bicycle.current_location_id):
+            availability_hub.publish_bicycle(BicycleDto.model_validate(bicycle), previous_location_id=previous_location_id)
+        # SQLite повертає з RETURNING час без зони; відповідь має бути в тому ж форматі, що й після створення
+        returned_rental = RentalDto.model_validate(rental)
+        return returned_rental.model_copy(update={
+            "rental_start_time": make_utc_aware(returned_rental.rental_start_time),
+            "rental_end_time": make_utc_aware(returned_rental.rental_end_time),
+            "actual_return_time": make_utc_aware(returned_rental.actual_return_time),
+        })
 
     def delete(self, rental_id: int) -> dict:
         if not self.rental_repository.delete_rental(rental_id=rental_id):
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Запис про прокат з ID {rental_id} не знайдено")
         return {"message": f"Запис про прокат з ID {rental_id} видалено"}
 
-    def get_rental_history_for_bicycle(self, bicycle_id: int) -> List[RentalDto]:
+    def get_rental_history_for_bicycle(self, bicycle_id: int, fields: Optional[List[str]] = None) -> List[Union[RentalDto, dict]]:
+        if fields:
+            return self.rental_repository.get_rentals_by_bicycle_id(bicycle_id=bicycle_id, fields=fields)
         rentals = self.rental_repository.get_rentals_by_bicycle_id(bicycle_id=bicycle_id)
         return [RentalDto.model_validate(r) for r in rentals]
 
@@ -120,9 +219,11 @@ class RentalService:
         end_date_aware = make_utc_aware(end_date)
         return self.rental_repository.get_total_revenue_by_time_range(start_time=start_date_aware, end_time=end_date_aware)
 
-    def get_rentals_in_time_range(self, start_date: datetime, end_date: datetime) -> List[RentalDto]:
+    def get_rentals_in_time_range(self, start_date: datetime, end_date: datetime, fields: Optional[List[str]] = None) -> List[Union[RentalDto, dict]]:
         start_date_aware = make_utc_aware(start_date)
         end_date_aware = make_utc_aware(end_date)
+        if fields:
+            return self.rental_repository.get_rentals_by_time_range(start_time=start_date_aware, end_time=end_date_aware, fields=fields)
         rentals = self.rental_repository.get_rentals_by_time_range(start_time=start_date_aware, end_time=end_date_aware)
         return [RentalDto.model_validate(r) for r in rentals]
 
@@ -0,0 +1,57 @@
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+
+from db.database import SessionLocal
+from db.sharding import shard_map
+from crud.rental_archive import RentalArchiveRepository
+from core.background import PeriodicWorker
+
+
+logger = logging.getLogger(__name__)
+
+RENTAL_ARCHIVE_AFTER_DAYS = int(os.getenv("RENTAL_ARCHIVE_AFTER_DAYS", "180"))
+RENTAL_ARCHIVE_BATCH_SIZE = int(os.getenv("RENTAL_ARCHIVE_BATCH_SIZE", "500"))
+RENTAL_ARCHIVE_INTERVAL = float(os.getenv("RENTAL_ARCHIVE_INTERVAL", "3600"))
+# Пауза між партіями, щоб перенесення не забирало основну БД у запитів користувачів
+RENTAL_ARCHIVE_BATCH_PAUSE = float(os.getenv("RENTAL_ARCHIVE_BATCH_PAUSE", "0.1"))
+
+
+class RentalArchiver(PeriodicWorker):
+    # Переносить завершені прокати, повернуті понад RENTAL_ARCHIVE_AFTER_DAYS днів тому, у місячні
+    # архівні таблиці. Кожна партія — окрема коротка транзакція, тож запис у rentals не блокується надовго
+    name = "rental-archiver"
+
+    def __init__(self, batch_size: int = RENTAL_ARCHIVE_BATCH_SIZE, interval: float = RENTAL_ARCHIVE_INTERVAL):
+        super().__init__(interval=interval)
+        self.batch_size = batch_size
+
+    def run_once(self) -> bool:
+        # Прокати живуть у шардах — кожен архівує свої; без шардування — лише основна БД
+        infos = [{"shard": shard} for shard in shard_map.shards] or [{}]
+        has_more = [self._run_on(SessionLocal(info=info)) for info in infos]
+        if any(has_more):
+            self._stop.wait(RENTAL_ARCHIVE_BATCH_PAUSE)
+        return any(has_more)
+
+    def _run_on(self, db) -> bool:
+        try:
+            repository = RentalArchiveRepository(db)
+            cutoff = datetime.now(timezone.utc) - timedelta(days=RENTAL_ARCHIVE_AFTER_DAYS)
+            rentals = repository.get_archivable_rentals(cutoff=cutoff, limit=self.batch_size)
+            if not rentals:
+                db.commit()
+                return False
+            moved = repository.archive_rentals(rentals)
+            db.commit()
+            logger.info("Rental archive: moved %s", moved)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        return len(rentals) == self.batch_size
+
+
+rental_archiver = RentalArchiver()
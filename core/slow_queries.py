@@ -0,0 +1,236 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, URL
+
+from core.background import PeriodicWorker
+
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_LOG = os.getenv("SLOW_QUERY_LOG", "1") == "1"
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "200"))
+# Скільки останніх повільних запитів тримати в пам'яті для GET /system/slow-queries
+SLOW_QUERY_BUFFER_SIZE = int(os.getenv("SLOW_QUERY_BUFFER_SIZE", "200"))
+# Файл JSON Lines з усіма повільними запитами; порожньо — лише буфер у пам'яті
+SLOW_QUERY_LOG_FILE = os.getenv("SLOW_QUERY_LOG_FILE", "slow_queries.jsonl")
+SLOW_QUERY_EXPLAIN = os.getenv("SLOW_QUERY_EXPLAIN", "1") == "1"
+# Параметри запиту можуть містити персональні дані (телефони, email) — їх можна не записувати
+SLOW_QUERY_LOG_PARAMS = os.getenv("SLOW_QUERY_LOG_PARAMS", "1") == "1"
+SLOW_QUERY_MAX_LENGTH = int(os.getenv("SLOW_QUERY_MAX_LENGTH", "4000"))
+
+# Запити, план яких має сенс: службові BEGIN/PRAGMA/SAVEPOINT не пояснюються
+_EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")
+# План однакового тексту запиту не перечитується, доки не витісниться з кешу
+_PLAN_CACHE_SIZE = 256
+
+# Маршрут, що виконує запит ("GET /locations/top-rentals/"); виставляє NegotiatingRoute
+request_route: ContextVar[Optional[str]] = ContextVar("request_route", default=None)
+
+
+def _operation(statement: str) -> str:
+    words = statement.lstrip().split(None, 1)
+    return words[0].upper() if words else ""
+
+
+def _render_parameters(parameters, executemany: bool):
+    if not SLOW_QUERY_LOG_PARAMS:
+        return None
+    if executemany:
+        # Для executemany досить розміру пакета і першого набору
+        return {"executemany": len(parameters), "first": repr(parameters[0])[:SLOW_QUERY_MAX_LENGTH] if parameters else None}
+    return repr(parameters)[:SLOW_QUERY_MAX_LENGTH]
+
+
+class SlowQueryLog:
+    # Кільцевий буфер повільних запитів. Запис у буфер — у потоці запиту, а EXPLAIN і запис у файл —
+    # у фоновому потоці на окремому з'єднанні, тож запит, що й так повільний, не чекає на план
+    def __init__(self, buffer_size: int = SLOW_QUERY_BUFFER_SIZE, threshold_ms: float = SLOW_QUERY_THRESHOLD_MS):
+        self.threshold_ms = threshold_ms
+        self._entries: deque = deque(maxlen=buffer_size)
+        self._lock = threading.Lock()
+        self._pending: "queue.Queue[tuple]" = queue.Queue(maxsize=buffer_size)
+        self._plans: "OrderedDict[tuple, list]" = OrderedDict()
+        self._explain_engines: Dict[str, Engine] = {}
+        self._recorded = 0
+        self._sequence = 0
+
+    def record(self, conn, statement: str, parameters, executemany: bool, duration_ms: float, rowcount) -> None:
+        operation = _operation(statement)
+        with self._lock:
+            self._sequence += 1
+            self._recorded += 1
+            entry = {
+                "id": self._sequence,
+                "recorded_at": datetime.now(timezone.utc).isoformat(),
+                "duration_ms": round(duration_ms, 2),
+                "route": request_route.get() or f"thread:{threading.current_thread().name}",
+                "database": conn.engine.url.render_as_string(hide_password=True),
+                "operation": operation,
+                "statement": statement[:SLOW_QUERY_MAX_LENGTH],
+                "parameters": _render_parameters(parameters, executemany),
+                "rowcount": rowcount if rowcount is not None and rowcount >= 0 else None,
+                "plan": None,
+                "plan_status": "pending" if SLOW_QUERY_EXPLAIN and operation in _EXPLAINABLE else "skipped",
+            }
+            self._entries.append(entry)
+        logger.warning("Slow query %.1f ms in %s: %s", duration_ms, entry["route"], " ".join(statement[:400].split())[:200])
+        explain_parameters = (parameters[0] if parameters else None) if executemany else parameters
+        try:
+            self._pending.put_nowait((entry, conn.engine.url, statement, explain_parameters))
+        except queue.Full:
+            entry["plan_status"] = "dropped" if entry["plan_status"] == "pending" else entry["plan_status"]
+            self._write(entry)
+
+    def process_pending(self, limit: int = 100) -> int:
+        done = 0
+        while done < limit:
+            try:
+                entry, url, statement, parameters = self._pending.get_nowait()
+            except queue.Empty:
+                break
+            if entry["plan_status"] == "pending":
+                self._explain(entry, url, statement, parameters)
+            self._write(entry)
+            done += 1
+        return done
+
+    def _explain(self, entry: dict, url: URL, statement: str, parameters) -> None:
+        key = (entry["database"], statement)
+        plan = self._plans.get(key)
+        if plan is not None:
+            self._plans.move_to_end(key)
+            entry["plan"], entry["plan_status"] = plan, "cached"
+            return
+        try:
+            plan = self._run_explain(url, statement, parameters)
+        except Exception as e:
+            entry["plan_status"] = f"failed: {e}"[:500]
+            return
+        if plan is None:
+            entry["plan_status"] = "unavailable"
+            return
+        self._plans[key] = plan
+        while len(self._plans) > _PLAN_CACHE_SIZE:
+            self._plans.popitem(last=False)
+        entry["plan"], entry["plan_status"] = plan, "explained"
+
+    def _explain_engine(self, url: URL) -> Optional[Engine]:
+        # Окреме з'єднання для EXPLAIN: не займає записувача SQLite і пул запитів. БД у пам'яті
+        # живе лише у своєму з'єднанні, тож для неї плану не буде
+        name = url.render_as_string(hide_password=False)
+        if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+            return None
+        if name not in self._explain_engines:
+            connect_args = {"check_same_thread": False} if url.get_backend_name() == "sqlite" else {}
+            self._explain_engines[name] = create_engine(url, pool_size=1, max_overflow=0, connect_args=connect_args)
+        return self._explain_engines[name]
+
+    def _run_explain(self, url: URL, statement: str, parameters) -> Optional[List[str]]:
+        explain_engine = self._explain_engine(url)
+        if explain_engine is None:
+            return None
+        # EXPLAIN без ANALYZE не виконує запит, тож і для UPDATE/DELETE нічого не змінює; транзакція однаково відкочується
+        with explain_engine.connect().execution_options(slow_query_log=False) as connection:
+            try:
+                if explain_engine.dialect.name == "sqlite":
+                    rows = connection.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters or ()).all()
+                    return _sqlite_plan(rows)
+                rows = connection.exec_driver_sql("EXPLAIN " + statement, parameters or {}).all()
+                return [row[0] for row in rows]
+            finally:
+                connection.rollback()
+
+    def _write(self, entry: dict) -> None:
+        if not SLOW_QUERY_LOG_FILE:
+            return
+        try:
+            with open(SLOW_QUERY_LOG_FILE, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+        except OSError:
+            logger.exception("Cannot write slow query log to %s", SLOW_QUERY_LOG_FILE)
+
+    def entries(self, limit: Optional[int] = None) -> List[dict]:
+        # Найновіші спершу
+        with self._lock:
+            entries = list(reversed(self._entries))
+        return [dict(entry) for entry in entries[:limit]]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": SLOW_QUERY_LOG,
+                "threshold_ms": self.threshold_ms,
+                "recorded": self._recorded,
+                "buffered": len(self._entries),
+                "capacity": self._entries.maxlen,
+                "pending_explains": self._pending.qsize(),
+                "log_file": SLOW_QUERY_LOG_FILE or None,
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._plans.clear()
+
+
+def _sqlite_plan(rows) -> List[str]:
+    # Рядки EXPLAIN QUERY PLAN (id, parent, notused, detail) у вигляді дерева з відступами
+    depth = {0: -1}
+    plan = []
+    for node_id, parent_id, _, detail in rows:
+        depth[node_id] = depth.get(parent_id, -1) + 1
+        plan.append("  " * depth[node_id] + detail)
+    return plan
+
+
+slow_query_log = SlowQueryLog()
+
+
+class SlowQueryExplainer(PeriodicWorker):
+    name = "slow-query-explainer"
+
+    def __init__(self, log: SlowQueryLog = slow_query_log, interval: float = 0.5):
+        super().__init__(interval=interval)
+        self.log = log
+
+    def run_once(self) -> bool:
+        return self.log.process_pending() == 100
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        # Запити, що не дочекались плану, все одно потрапляють у файл
+        super().stop(timeout)
+        while self.run_once():
+            pass
+
+
+slow_query_explainer = SlowQueryExplainer()
+
+
+def _start_timer(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._slow_query_started = time.perf_counter()
+
+
+def _check_duration(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_slow_query_started", None)
+    if started is None:
+        return
+    # Час виконання курсора; для SELECT у SQLite дочитування решти рядків сюди не входить
+    duration_ms = (time.perf_counter() - started) * 1000
+    if duration_ms >= slow_query_log.threshold_ms and context.execution_options.get("slow_query_log", True):
+        slow_query_log.record(conn, statement, parameters, executemany, duration_ms, cursor.rowcount)
+
+
+if SLOW_QUERY_LOG:
+    event.listen(Engine, "before_cursor_execute", _start_timer)
+    event.listen(Engine, "after_cursor_execute", _check_duration)
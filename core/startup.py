@@ -0,0 +1,135 @@
+import importlib
+import logging
+import pkgutil
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from fastapi import FastAPI
+from pydantic import BaseModel
+from sqlalchemy.orm import configure_mappers
+
+import schemas
+from db.database import engine, read_engine, replicas, SessionLocal, DB_POOL_MIN_SIZE
+from db.sharding import shard_map
+from crud.bicycle import BicycleRepository
+from crud.discount import DiscountRepository
+from crud.location import LocationRepository
+from crud.rental import RentalRepository
+from crud.user import UserRepository
+from core.geo import location_index
+
+
+logger = logging.getLogger(__name__)
+
+# Неіснуючий ID: запити виконуються і компілюються, але нічого не повертають
+_WARMUP_ID = -1
+
+
+@dataclass
+class StartupReport:
+    phases: Dict[str, float] = field(default_factory=dict)
+    errors: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def total_ms(self) -> float:
+        return round(sum(self.phases.values()), 3)
+
+    def measure(self, name: str, func: Callable[[], None]) -> None:
+        started = time.perf_counter()
+        try:
+            func()
+        except Exception as e:
+            # Прогрів не повинен блокувати старт воркера — фіксуємо помилку у звіті
+            logger.warning("Startup phase '%s' failed: %s", name, e)
+            self.errors[name] = str(e)
+        self.phases[name] = round((time.perf_counter() - started) * 1000, 3)
+
+    def as_dict(self) -> dict:
+        return {"phases_ms": self.phases, "total_ms": self.total_ms, "errors": self.errors}
+
+
+def _schema_models() -> List[type]:
+    models = []
+    for module_info in pkgutil.iter_modules(schemas.__path__):
+        module = importlib.import_module(f"{schemas.__name__}.{module_info.name}")
+        for value in vars(module).values():
+            if isinstance(value, type) and issubclass(value, BaseModel) and value.__module__ == module.__name__:
+                models.append(value)
+    return models
+
+
+def warm_up_schemas() -> None:
+    for model in _schema_models():
+        model.model_rebuild()
+        model.model_json_schema()
+        model.model_json_schema(mode="serialization")
+
+
+def warm_up_statements() -> None:
+    # Кеш скомпільованих запитів окремий для кожного engine, тож прогріваємо і репліки
+    _warm_up_statements(SessionLocal())
+    if read_engine is not engine:
+        _warm_up_statements(SessionLocal(info={"read_only": True, "replica": read_engine}))
+    for replica in replicas.engines:
+        _warm_up_statements(SessionLocal(info={"read_only": True, "replica": replica}))
+    for shard in shard_map.shards:
+        _warm_up_statements(SessionLocal(info={"shard": shard}))
+        if shard.read_engine is not shard.engine:
+            _warm_up_statements(SessionLocal(info={"shard": shard, "read_only": True}))
+
+
+def _warm_up_statements(db) -> None:
+    try:
+        bicycles = BicycleRepository(db)
+        bicycles.get_bicycle(bicycle_id=_WARMUP_ID)
+        bicycles.get_bicycles_by_location(location_id=_WARMUP_ID)
+        LocationRepository(db).get_location(location_id=_WARMUP_ID)
+        users = UserRepository(db)
+        users.get_user(user_id=_WARMUP_ID)
+        users.get_user_by_email(email="")
+        users.get_user_by_phone(phone="")
+        RentalRepository(db).get_rental(rental_id=_WARMUP_ID)
+        discounts = DiscountRepository(db)
+        discounts.get_discount(discount_id=_WARMUP_ID)
+        discounts.get_active_discounts()
+    finally:
+        db.close()
+
+
+def warm_up_geo_index() -> None:
+    db = SessionLocal(info={"read_only": True})
+    try:
+        location_index.rebuild(LocationRepository(db).get_coordinates())
+    finally:
+        db.close()
+
+
+def warm_up_pool(min_size: int = DB_POOL_MIN_SIZE) -> None:
+    connections = []
+    try:
+        shard_engines = [e for shard in shard_map.shards for e in (shard.engine, shard.read_engine)]
+        for pool_engine in {engine, read_engine, *replicas.engines, *shard_engines}:
+            # Пул записувача SQLite має одне з'єднання — більше відкрити не вийде
+            size = pool_engine.pool.size() if hasattr(pool_engine.pool, "size") else min_size
+            for _ in range(min(min_size, size)):
+                connections.append(pool_engine.connect())
+    finally:
+        for connection in connections:
+            connection.close()
+
+
+def warm_up(app: FastAPI, import_seconds: Optional[float] = None) -> StartupReport:
+    report = StartupReport()
+    if import_seconds is not None:
+        report.phases["imports"] = round(import_seconds * 1000, 3)
+
+    report.measure("mappers", configure_mappers)
+    report.measure("schemas", warm_up_schemas)
+    report.measure("openapi", app.openapi)
+    report.measure("pool", warm_up_pool)
+    report.measure("statements", warm_up_statements)
+    report.measure("geo_index", warm_up_geo_index)
+
+    logger.info("Startup warm-up finished in %.1f ms: %s", report.total_ms, report.phases)
+    return report
@@ -0,0 +1,446 @@
+import inspect
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+import urllib.request
+from contextvars import ContextVar
+from functools import wraps
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from core.background import PeriodicWorker
+
+
+logger = logging.getLogger(__name__)
+
+# Трасування запитів: HTTP -> маршрут (валідація, контролер, серіалізація) -> сервіс -> репозиторій -> SQL.
+# Вимкнене (типово) — декоратори повертають класи без змін, а обробники подій SQLAlchemy не реєструються
+TRACING = os.getenv("TRACING", "0") == "1"
+# Частка запитів, що трасуються. Заголовок W3C traceparent від клієнта має пріоритет: його прапорець
+# sampled вирішує за нас, а trace id продовжується (як ParentBased(TraceIdRatioBased) в OpenTelemetry)
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.01"))
+# Файл, куди дописуються трейси у форматі OTLP/JSON (один ExportTraceServiceRequest на рядок, як у
+# file exporter колектора OpenTelemetry); порожньо — не писати у файл
+TRACE_EXPORT_FILE = os.getenv("TRACE_EXPORT_FILE", "traces.jsonl")
+# OTLP/HTTP JSON колектора, наприклад http://localhost:4318/v1/traces; порожньо — не надсилати
+TRACE_EXPORT_ENDPOINT = os.getenv("TRACE_EXPORT_ENDPOINT", "")
+TRACE_EXPORT_INTERVAL = float(os.getenv("TRACE_EXPORT_INTERVAL", "1"))
+TRACE_EXPORT_QUEUE_SIZE = int(os.getenv("TRACE_EXPORT_QUEUE_SIZE", "2048"))
+# Обмеження, щоб N+1 запитів чи великі IN-списки не роздували трейс
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", "1000"))
+TRACE_SQL_MAX_LENGTH = int(os.getenv("TRACE_SQL_MAX_LENGTH", "2000"))
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "bicycle-rental")
+
+# Коди OTLP: SpanKind і StatusCode
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+
+class Trace:
+    # Спільний для всіх спанів запиту список завершених спанів; експортується, коли завершується кореневий
+    __slots__ = ("trace_id", "spans", "dropped")
+
+    def __init__(self, trace_id: str):
+        self.trace_id = trace_id
+        self.spans: List["Span"] = []
+        self.dropped = 0
+
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "kind", "start_ns", "end_ns", "attributes", "status", "status_message", "events")
+
+    def __init__(self, trace: Trace, name: str, parent_id: Optional[str] = None, kind: int = SPAN_KIND_INTERNAL,
+                 attributes: Optional[Dict[str, Any]] = None, start_ns: Optional[int] = None):
+        self.trace = trace
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = start_ns if start_ns is not None else time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = attributes or {}
+        self.status = 0
+        self.status_message = ""
+        self.events: List[dict] = []
+
+    def child(self, name: str, kind: int = SPAN_KIND_INTERNAL, attributes: Optional[Dict[str, Any]] = None,
+              start_ns: Optional[int] = None) -> "Span":
+        return Span(self.trace, name, parent_id=self.span_id, kind=kind, attributes=attributes, start_ns=start_ns)
+
+    def record_exception(self, error: BaseException) -> None:
+        # HTTPException з кодом 4xx — очікувана відповідь клієнту (не знайдено, недійсна знижка), а не збій:
+        # подія лишається в спані, але статус помилки не ставиться
+        message = str(getattr(error, "detail", None) or error)[:500]
+        if getattr(error, "status_code", 500) >= 500:
+            self.status = STATUS_ERROR
+            self.status_message = message
+        self.events.append({
+            "name": "exception",
+            "time_ns": time.time_ns(),
+            "attributes": {"exception.type": type(error).__name__, "exception.message": message},
+        })
+
+    def end(self, end_ns: Optional[int] = None) -> None:
+        self.end_ns = end_ns if end_ns is not None else time.time_ns()
+        if len(self.trace.spans) < TRACE_MAX_SPANS:
+            self.trace.spans.append(self)
+        else:
+            self.trace.dropped += 1
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def should_sample(traceparent: Optional[str]):
+    # (trace_id, parent_span_id) для трасованого запиту або None. Некоректний traceparent ігнорується
+    if traceparent:
+        parts = traceparent.strip().split("-")
+        if len(parts) == 4 and len(parts[1]) == 32 and len(parts[2]) == 16 and len(parts[3]) == 2:
+            try:
+                sampled = int(parts[3], 16) & 1
+            except ValueError:
+                sampled = None
+            if sampled is not None:
+                return (parts[1], parts[2]) if sampled else None
+    if TRACE_SAMPLE_RATE <= 0 or random.random() >= TRACE_SAMPLE_RATE:
+        return None
+    return f"{random.getrandbits(128):032x}", None
+
+
+def start_trace(name: str, traceparent: Optional[str] = None, kind: int = SPAN_KIND_SERVER,
+                attributes: Optional[Dict[str, Any]] = None) -> Optional[Span]:
+    sampled = should_sample(traceparent)
+    if sampled is None:
+        return None
+    trace_id, parent_id = sampled
+    return Span(Trace(trace_id), name, parent_id=parent_id, kind=kind, attributes=attributes)
+
+
+def activate(span: Optional[Span]):
+    return _current_span.set(span)
+
+
+def deactivate(token) -> None:
+    _current_span.reset(token)
+
+
+def finish_trace(root: Span) -> None:
+    root.end()
+    trace_exporter.enqueue(root.trace)
+
+
+class _SpanScope:
+    # with start_span(...) — дочірній спан поточного; без активного трейсу нічого не робить
+    __slots__ = ("name", "attributes", "span", "token")
+
+    def __init__(self, name: str, attributes: Optional[Dict[str, Any]]):
+        self.name = name
+        self.attributes = attributes
+        self.span: Optional[Span] = None
+
+    def __enter__(self) -> Optional[Span]:
+        parent = _current_span.get()
+        if parent is not None:
+            self.span = parent.child(self.name, attributes=self.attributes)
+            self.token = _current_span.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if self.span is not None:
+            if exc is not None:
+                self.span.record_exception(exc)
+            _current_span.reset(self.token)
+            self.span.end()
+
+
+def start_span(name: str, attributes: Optional[Dict[str, Any]] = None) -> _SpanScope:
+    return _SpanScope(name, attributes)
+
+
+_SCALARS = (int, float, str, bool)
+
+
+def _argument_attributes(signature: inspect.Signature, args: tuple, kwargs: dict) -> Dict[str, Any]:
+    # Скалярні аргументи виклику (ID, прапорці, ліміти) як атрибути спану; моделі й списки пропускаються
+    try:
+        bound = signature.bind_partial(*args, **kwargs)
+    except TypeError:
+        return {}
+    return {
+        f"code.arg.{name}": (value[:200] if isinstance(value, str) else value)
+        for name, value in bound.arguments.items()
+        if name != "self" and isinstance(value, _SCALARS)
+    }
+
+
+def _traced_method(method, layer: str, owner: str):
+    signature = inspect.signature(method)
+    name = f"{owner}.{method.__name__}"
+
+    @wraps(method)
+    def wrapper(*args, **kwargs):
+        parent = _current_span.get()
+        if parent is None:
+            return method(*args, **kwargs)
+        attributes = {"app.layer": layer, "code.namespace": owner, "code.function": method.__name__}
+        attributes.update(_argument_attributes(signature, args, kwargs))
+        span = parent.child(name, attributes=attributes)
+        token = _current_span.set(span)
+        try:
+            return method(*args, **kwargs)
+        except BaseException as e:
+            span.record_exception(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end()
+    return wrapper
+
+
+def traced(layer: str):
+    # Декоратор класу сервісу (core/) чи репозиторію (crud/): кожен публічний метод отримує спан.
+    # Без TRACING клас лишається як є — жодної обгортки на шляху запиту
+    def decorator(cls):
+        if not TRACING:
+            return cls
+        for attribute, value in list(vars(cls).items()):
+            if not attribute.startswith("_") and inspect.isfunction(value):
+                setattr(cls, attribute, _traced_method(value, layer, cls.__name__))
+        return cls
+    return decorator
+
+
+def traced_endpoint(endpoint):
+    # Спан функції маршруту. include_router створює маршрути заново з уже обгорнутою функцією,
+    # тож повторно вона не обгортається
+    if getattr(endpoint, "__traced__", False):
+        return endpoint
+
+    def enter():
+        parent = _current_span.get()
+        if parent is None:
+            return None, None
+        span = parent.child(f"controller {endpoint.__name__}", attributes={"app.layer": "controller", "code.function": endpoint.__name__})
+        return span, _current_span.set(span)
+
+    def leave(span, token, error):
+        if error is not None:
+            span.record_exception(error)
+        _current_span.reset(token)
+        span.end()
+
+    if inspect.iscoroutinefunction(endpoint):
+        @wraps(endpoint)
+        async def async_wrapper(*args, **kwargs):
+            span, token = enter()
+            if span is None:
+                return await endpoint(*args, **kwargs)
+            error = None
+            try:
+                return await endpoint(*args, **kwargs)
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                leave(span, token, error)
+        async_wrapper.__traced__ = True
+        return async_wrapper
+
+    @wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        span, token = enter()
+        if span is None:
+            return endpoint(*args, **kwargs)
+        error = None
+        try:
+            return endpoint(*args, **kwargs)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            leave(span, token, error)
+    wrapper.__traced__ = True
+    return wrapper
+
+
+def add_phase_spans(route: Span) -> None:
+    # Час маршруту до спану контролера — розбір і валідація запиту та залежності (Depends, сесія БД),
+    # після нього — валідація response_model і рендеринг відповіді
+    controller = next((s for s in reversed(route.trace.spans) if s.parent_id == route.span_id and s.name.startswith("controller ")), None)
+    if controller is None:
+        return
+    route.child("request.validate", start_ns=route.start_ns).end(controller.start_ns)
+    route.child("response.serialize", start_ns=controller.end_ns).end(route.end_ns)
+
+
+# SQL: спан на кожне виконання курсора всередині трасованого запиту
+
+def _sql_before(conn, cursor, statement, parameters, context, executemany):
+    parent = _current_span.get()
+    if parent is None or context is None:
+        return
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "SQL"
+    context._trace_span = parent.child(operation, kind=SPAN_KIND_CLIENT, attributes={
+        "db.system": conn.dialect.name,
+        "db.operation": operation,
+        "db.statement": statement[:TRACE_SQL_MAX_LENGTH],
+        "db.executemany": bool(executemany),
+    })
+
+
+def _sql_after(conn, cursor, statement, parameters, context, executemany):
+    span = getattr(context, "_trace_span", None)
+    if span is not None:
+        if cursor.rowcount is not None and cursor.rowcount >= 0:
+            span.attributes["db.rows_affected"] = cursor.rowcount
+        context._trace_span = None
+        span.end()
+
+
+def _sql_error(exception_context):
+    span = getattr(exception_context.execution_context, "_trace_span", None)
+    if span is not None:
+        span.record_exception(exception_context.original_exception)
+        exception_context.execution_context._trace_span = None
+        span.end()
+
+
+if TRACING:
+    event.listen(Engine, "before_cursor_execute", _sql_before)
+    event.listen(Engine, "after_cursor_execute", _sql_after)
+    event.listen(Engine, "handle_error", _sql_error)
+
+
+# Експорт у форматі OTLP/JSON
+
+def _attribute_value(value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _attributes(attributes: Dict[str, Any]) -> List[dict]:
+    return [{"key": key, "value": _attribute_value(value)} for key, value in attributes.items()]
+
+
+def _span_json(span: Span) -> dict:
+    result = {
+        "traceId": span.trace.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        "kind": span.kind,
+        "startTimeUnixNano": str(span.start_ns),
+        "endTimeUnixNano": str(span.end_ns),
+        "attributes": _attributes(span.attributes),
+        "status": {"code": span.status, "message": span.status_message} if span.status else {"code": 0},
+    }
+    if span.parent_id:
+        result["parentSpanId"] = span.parent_id
+    if span.events:
+        result["events"] = [
+            {"name": e["name"], "timeUnixNano": str(e["time_ns"]), "attributes": _attributes(e["attributes"])}
+            for e in span.events
+        ]
+    return result
+
+
+def export_request(traces: List[Trace]) -> dict:
+    # ExportTraceServiceRequest з opentelemetry-proto у JSON-кодуванні
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": _attributes({"service.name": TRACE_SERVICE_NAME})},
+            "scopeSpans": [{
+                "scope": {"name": __name__},
+                "spans": [_span_json(span) for trace in traces for span in trace.spans],
+            }],
+        }],
+    }
+
+
+class TraceExporter(PeriodicWorker):
+    # Запити лише кладуть завершені трейси в чергу; серіалізація й запис — у фоновому потоці.
+    # Переповнена черга відкидає трейси, а не гальмує запити
+    name = "trace-exporter"
+
+    def __init__(self, interval: float = TRACE_EXPORT_INTERVAL, max_queue: int = TRACE_EXPORT_QUEUE_SIZE):
+        super().__init__(interval=interval)
+        self._queue: "queue.Queue[Trace]" = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._stats = {"exported_traces": 0, "exported_spans": 0, "dropped_traces": 0, "dropped_spans": 0, "export_errors": 0}
+
+    def enqueue(self, trace: Trace) -> None:
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            with self._lock:
+                self._stats["dropped_traces"] += 1
+
+    def run_once(self) -> bool:
+        traces: List[Trace] = []
+        while len(traces) < 512:
+            try:
+                traces.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if not traces:
+            return False
+        try:
+            self._export(export_request(traces))
+            with self._lock:
+                self._stats["exported_traces"] += len(traces)
+                self._stats["exported_spans"] += sum(len(t.spans) for t in traces)
+                self._stats["dropped_spans"] += sum(t.dropped for t in traces)
+        except Exception:
+            with self._lock:
+                self._stats["export_errors"] += 1
+            raise
+        return len(traces) == 512
+
+    def _export(self, payload: dict) -> None:
+        body = json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+        if TRACE_EXPORT_FILE:
+            with open(TRACE_EXPORT_FILE, "a", encoding="utf-8") as f:
+                f.write(body + "\n")
+        if TRACE_EXPORT_ENDPOINT:
+            request = urllib.request.Request(
+                TRACE_EXPORT_ENDPOINT, data=body.encode("utf-8"), headers={"Content-Type": "application/json"}, method="POST",
+            )
+            with urllib.request.urlopen(request, timeout=5) as response:
+                response.read()
+
+    def flush(self) -> None:
+        while self.run_once():
+            pass
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        super().stop(timeout)
+        self.flush()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": TRACING,
+                "sample_rate": TRACE_SAMPLE_RATE,
+                "queued_traces": self._queue.qsize(),
+                **self._stats,
+            }
+
+
+trace_exporter = TraceExporter()
@@ -1,13 +1,17 @@
-from typing import List, Optional, Annotated
+from typing import List, Optional, Annotated, Union
 
 from fastapi import Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
 
-from crud.user import UserRepository
+from crud.user import UserRepository, SEARCH_MIN_TERM_LENGTH
+from crud.writes import unique_violation
 from crud.rental import RentalRepository
+from core.loader import DataLoader
 from schemas.user import UserCreate, UserUpdate, User as UserDto
+from core.tracing import traced
 
 
+@traced("service")
 class UserService:
     def __init__(
         self,
@@ -16,16 +20,32 @@ class UserService:
     ):
         self.user_repository = user_repository
         self.rental_repository = rental_repository
+        self.loader = DataLoader(self._load_users)
 
-    def get_all(self) -> List[UserDto]:
+    def _load_users(self, ids: List[int]) -> List[UserDto]:
+        return [UserDto.model_validate(u) for u in self.user_repository.get_users_by_ids(ids=ids)]
+
+    # Методи читання з fields повертають словники лише з вибраними полями (без DTO-валідації)
+
+    def get_all(self, fields: Optional[List[str]] = None) -> List[Union[UserDto, dict]]:
+        if fields:
+            return self.user_repository.get_users(fields=fields)
         users = self.user_repository.get_users()
         return [UserDto.model_validate(u) for u in users]
 
-    def get_by_id(self, user_id: int) -> UserDto:
-        user = self.user_repository.get_user(user_id=user_id)
+    def get_by_id(self, user_id: int, fields: Optional[List[str]] = None) -> Union[UserDto, dict]:
+        if fields:
+            user = self.user_repository.get_user(user_id=user_id, fields=fields)
+        else:
+            user = self.loader.load(user_id)
         if user is None:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Користувача з ID {user_id} не знайдено")
-        return UserDto.model_validate(user)
+        return user
+
+    def get_by_ids(self, ids: List[int], fields: Optional[List[str]] = None) -> List[Union[UserDto, dict]]:
+        if fields:
+            return self.user_repository.get_users_by_ids(ids=ids, fields=fields)
+        return [u for u in self.loader.load_many(ids) if u is not None]
 
     def get_by_email(self, email: str) -> UserDto:
         user = self.user_repository.get_user_by_email(email=email)
@@ -39,23 +59,42 @@ class UserService:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Користувача з номером телефону '{phone}' не знайдено")
         return UserDto.model_validate(user)
 
-    def create(self, user_data: UserCreate) -> UserDto:
-        existing_user_email = self.user_repository.get_user_by_email(email=user_data.email)
-        if existing_user_email:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Користувач з таким email вже існує")
+    def search(self, query: str, limit: int, offset: int) -> List[UserDto]:
+        # Короткі слова триграмний індекс не знаходить, тож вони відкидаються
+        terms = [term for term in query.split() if len(term) >= SEARCH_MIN_TERM_LENGTH]
+        if not terms:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Пошуковий запит має містити слово щонайменше з {SEARCH_MIN_TERM_LENGTH} символів",
+            )
+        users = self.user_repository.search_users(terms=terms, limit=limit, offset=offset)
+        return [UserDto.model_validate(u) for u in users]
 
-        existing_user_phone = self.user_repository.get_user_by_phone(phone=user_data.phone)
-        if existing_user_phone:
+    def _raise_duplicate(self, error: IntegrityError) -> None:
+        column = unique_violation(error)
+        if column == "email":
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Користувач з таким email вже існує")
+        if column == "phone":
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Користувач з таким номером телефону вже існує")
+        raise error
 
-        created_user = self.user_repository.create_user(user=user_data)
+    def create(self, user_data: UserCreate) -> UserDto:
+        try:
+            created_user = self.user_repository.create_user(user=user_data)
+        except IntegrityError as e:
+            self._raise_duplicate(e)
         return UserDto.model_validate(created_user)
 
     def update(self, user_id: int, user_update_data: UserUpdate) -> UserDto:
-        updated_user = self.user_repository.update_user(user_id=user_id, user_update=user_update_data)
+        try:
+            updated_user = self.user_repository.update_user(user_id=user_id, user_update=user_update_data)
+        except IntegrityError as e:
+            self._raise_duplicate(e)
         if updated_user is None:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Користувача з ID {user_id} не знайдено")
-        return UserDto.model_validate(updated_user)
+        updated_user = UserDto.model_validate(updated_user)
+        self.loader.prime(updated_user)
+        return updated_user
 
     def delete(self, user_id: int) -> dict:
         rentals_for_user = self.rental_repository.get_rentals_by_user_id(user_id=user_id)
@@ -67,6 +106,7 @@ class UserService:
 
         if not self.user_repository.delete_user(user_id=user_id):
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Користувача з ID {user_id} не знайдено")
+        self.loader.clear(user_id)
         return {"message": f"Користувача з ID {user_id} видалено"}
 
 UserServiceDependency = Annotated[UserService, Depends]
\ No newline at end of file
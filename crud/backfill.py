@@ -0,0 +1,74 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import select, bindparam
+from typing import List, Annotated
+from datetime import datetime, timezone
+from fastapi import Depends
+
+from db.database import get_db
+from models.backfill import BackfillCheckpoint, BACKFILL_PENDING, BACKFILL_RUNNING, BACKFILL_DONE
+from core.tracing import traced
+
+
+_select_checkpoints = select(BackfillCheckpoint).order_by(BackfillCheckpoint.name)
+_select_checkpoint_for_update = (
+    select(BackfillCheckpoint)
+    .where(BackfillCheckpoint.name == bindparam("name"))
+    .with_for_update()
+)
+_select_pending_names = (
+    select(BackfillCheckpoint.name)
+    .where(BackfillCheckpoint.status != BACKFILL_DONE)
+    .order_by(BackfillCheckpoint.name)
+)
+
+
+@traced("repository")
+class BackfillRepository:
+    def __init__(self, db: Session = Depends(get_db)):
+        self.db = db
+
+    def get_checkpoints(self) -> List[BackfillCheckpoint]:
+        return list(self.db.scalars(_select_checkpoints))
+
+    def get_unfinished_names(self) -> List[str]:
+        return list(self.db.scalars(_select_pending_names))
+
+    def lock_checkpoint(self, name: str) -> BackfillCheckpoint:
+        # FOR UPDATE тримається до кінця транзакції порції: два запущені runner-и обробляють порції
+        # по черзі, і кожна порція обробляється рівно один раз
+        checkpoint = self.db.scalars(_select_checkpoint_for_update, {"name": name}).first()
+        if checkpoint is None:
+            checkpoint = BackfillCheckpoint(name=name, status=BACKFILL_PENDING, last_key=0, rows_scanned=0, rows_changed=0)
+            self.db.add(checkpoint)
+            self.db.flush()
+        return checkpoint
+
+    def advance(self, checkpoint: BackfillCheckpoint, last_key: int, scanned: int, changed: int) -> None:
+        now = datetime.now(timezone.utc)
+        if checkpoint.status == BACKFILL_PENDING:
+            checkpoint.status = BACKFILL_RUNNING
+            checkpoint.started_at = now
+        checkpoint.last_key = last_key
+        checkpoint.rows_scanned += scanned
+        checkpoint.rows_changed += changed
+        checkpoint.updated_at = now
+
+    def finish(self, checkpoint: BackfillCheckpoint) -> None:
+        now = datetime.now(timezone.utc)
+        checkpoint.status = BACKFILL_DONE
+        checkpoint.started_at = checkpoint.started_at or now
+        checkpoint.updated_at = now
+        checkpoint.finished_at = now
+
+    def reset(self, name: str) -> None:
+        # Повторний прохід з початку таблиці (--restart)
+        checkpoint = self.lock_checkpoint(name)
+        checkpoint.status = BACKFILL_PENDING
+        checkpoint.last_key = 0
+        checkpoint.rows_scanned = 0
+        checkpoint.rows_changed = 0
+        checkpoint.started_at = None
+        checkpoint.finished_at = None
+        checkpoint.updated_at = datetime.now(timezone.utc)
+
+BackfillRepositoryDependency = Annotated[BackfillRepository, Depends]
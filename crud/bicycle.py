@@ -1,71 +1,217 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from typing import Optional, List, Annotated
+from sqlalchemy import func, select, update, delete, bindparam, exists, Select, ColumnElement
+from sqlalchemy.exc import IntegrityError
+from typing import Optional, List, Annotated, Union, Collection, Tuple
 from fastapi import Depends
 
 from db.database import get_db
-from models.bicycle import Bicycle
-from models.location import Location
+from db.sharding import shard_map, is_routing, on_shard, on_all_shards, on_shards_by_ids, by_id, concat
+from crud.outbox import append_outbox_event, append_outbox_events
+from crud.writes import commit_detached, update_returning
+from crud.rental_archive import RentalArchiveRepository
+from crud.fields import select_fields, select_fields_one
+from models.bicycle import Bicycle, BicycleStatus
+from models.rental import Rental
+from models.rental_archive import RentalArchiveBicycle
 from schemas.bicycle import BicycleCreate, BicycleUpdate
+from core.tracing import traced
 
+
+# Запити будуються один раз на рівні модуля, значення передаються через bindparam,
+# тож скомпільований SQL береться з кешу SQLAlchemy при кожному виклику
+_select_bicycle_by_id = select(Bicycle).where(Bicycle.id == bindparam("bicycle_id"))
+_select_bicycles = select(Bicycle)
+_select_bicycles_by_ids = select(Bicycle).where(Bicycle.id.in_(bindparam("ids", expanding=True)))
+_select_bicycles_by_location = select(Bicycle).where(Bicycle.current_location_id == bindparam("location_id"))
+_select_bicycles_by_status = select(Bicycle).where(Bicycle.status == bindparam("status"))
+_delete_bicycle = (
+    delete(Bicycle)
+    .where(Bicycle.id == bindparam("bicycle_id"))
+    .returning(Bicycle)
+    .execution_options(synchronize_session=False)
+)
+
+# Масові операції: один UPDATE/DELETE ... RETURNING на весь набір. Лічильники статусів на локаціях
+# оновлюють ті самі тригери, що й для поодиноких записів
+_move_bicycles = (
+    update(Bicycle)
+    .where(
+        Bicycle.current_location_id == bindparam("from_location_id"),
+        Bicycle.status.in_(bindparam("statuses", expanding=True)),
+    )
+    .values(current_location_id=bindparam("to_location_id"))
+    .returning(Bicycle)
+    .execution_options(synchronize_session=False)
+)
+_set_bicycles_status = (
+    update(Bicycle)
+    .where(
+        Bicycle.id.in_(bindparam("ids", expanding=True)),
+        Bicycle.status.in_(bindparam("from_statuses", expanding=True)),
+    )
+    .values(status=bindparam("new_status"))
+    .returning(Bicycle)
+    .execution_options(synchronize_session=False)
+)
+# Велосипеди з історією прокатів (гарячою чи архівною) не видаляються — історія має лишатися повною
+_has_rentals = exists().where(Rental.bicycle_id == Bicycle.id)
+_has_archived_rentals = exists().where(RentalArchiveBicycle.bicycle_id == Bicycle.id)
+_select_most_rented_bicycle = (
+    select(Bicycle)
+    .join(Rental)
+    .group_by(Bicycle.id)
+    .order_by(func.count(Rental.id).desc())
+)
+
+
+@traced("repository")
 class BicycleRepository:
     def __init__(self, db: Session = Depends(get_db)):
         self.db = db
 
-    def get_bicycle(self, bicycle_id: int) -> Optional[Bicycle]:
-        return self.db.query(Bicycle).filter(Bicycle.id == bicycle_id).first()
+    # Якщо передано fields, повертаються словники лише з цими колонками замість ORM-об'єктів
 
-    def get_bicycles(self) -> List[Bicycle]:
-        return self.db.query(Bicycle).all()
+    @on_shard(by_id("bicycle_id"))
+    def get_bicycle(self, bicycle_id: int, fields: Optional[List[str]] = None) -> Optional[Union[Bicycle, dict]]:
+        if fields:
+            return select_fields_one(self.db, _select_bicycle_by_id, Bicycle, fields, {"bicycle_id": bicycle_id})
+        return self.db.scalars(_select_bicycle_by_id, {"bicycle_id": bicycle_id}).first()
 
-    def get_bicycles_by_location(self, location_id: int) -> List[Bicycle]:
-        return self.db.query(Bicycle).filter(Bicycle.current_location_id == location_id).all()
+    @on_all_shards(merge=concat)
+    def get_bicycles(self, fields: Optional[List[str]] = None) -> List[Union[Bicycle, dict]]:
+        if fields:
+            return select_fields(self.db, _select_bicycles, Bicycle, fields)
+        return list(self.db.scalars(_select_bicycles))
 
-    def get_bicycles_by_status(self, status: str) -> List[Bicycle]:
-        return self.db.query(Bicycle).filter(Bicycle.status == status).all()
+    @on_shards_by_ids("ids", merge=concat)
+    def get_bicycles_by_ids(self, ids: List[int], fields: Optional[List[str]] = None) -> List[Union[Bicycle, dict]]:
+        if fields:
+            return select_fields(self.db, _select_bicycles_by_ids, Bicycle, fields, {"ids": ids})
+        return list(self.db.scalars(_select_bicycles_by_ids, {"ids": ids}))
 
-    def create_bicycle(self, bicycle: BicycleCreate) -> Bicycle:
-        if bicycle.current_location_id is not None:
-            location = self.db.query(Location).filter(Location.id == bicycle.current_location_id).first()
-            if not location:
-                raise ValueError(f"Location with ID {bicycle.current_location_id} does not exist.")
+    @on_shard(by_id("location_id"))
+    def get_bicycles_by_location(self, location_id: int, fields: Optional[List[str]] = None) -> List[Union[Bicycle, dict]]:
+        if fields:
+            return select_fields(self.db, _select_bicycles_by_location, Bicycle, fields, {"location_id": location_id})
+        return list(self.db.scalars(_select_bicycles_by_location, {"location_id": location_id}))
+
+    @on_all_shards(merge=concat)
+    def get_bicycles_by_status(self, status: BicycleStatus, fields: Optional[List[str]] = None) -> List[Union[Bicycle, dict]]:
+        if fields:
+            return select_fields(self.db, _select_bicycles_by_status, Bicycle, fields, {"status": status})
+        return list(self.db.scalars(_select_bicycles_by_status, {"status": status}))
 
+    # Велосипед живе в шарді своєї локації; переміщення на локацію іншого шарда не проходить зовнішній ключ
+    @on_shard(lambda arguments: shard_map.for_id(arguments["bicycle"].current_location_id))
+    def create_bicycle(self, bicycle: BicycleCreate) -> Bicycle:
+        # Існування локації перевіряє зовнішній ключ
         db_bicycle = Bicycle(**bicycle.model_dump())
-        self.db.add(db_bicycle)
-        self.db.commit()
-        self.db.refresh(db_bicycle)
+        try:
+            self.db.add(db_bicycle)
+            self.db.flush()
+        except IntegrityError:
+            self.db.rollback()
+            raise
+        append_outbox_event(self.db, Bicycle.__tablename__, db_bicycle.id, "create", bicycle.model_dump(mode="json"))
+        commit_detached(self.db, db_bicycle)
         return db_bicycle
 
-    def update_bicycle(self, bicycle_id: int, bicycle_update: BicycleUpdate) -> Optional[Bicycle]:
-        db_bicycle = self.get_bicycle(bicycle_id)
-        if db_bicycle:
-            update_data = bicycle_update.model_dump(exclude_unset=True)
-            for key, value in update_data.items():
-                if key == "current_location_id" and value is not None:
-                    location = self.db.query(Location).filter(Location.id == value).first()
-                    if not location:
-                        raise ValueError(f"Location with ID {value} does not exist for update.")
-                setattr(db_bicycle, key, value)
-            self.db.add(db_bicycle)
-            self.db.commit()
-            self.db.refresh(db_bicycle)
-            return db_bicycle
-        return None
-
-    def delete_bicycle(self, bicycle_id: int) -> bool:
-        db_bicycle = self.get_bicycle(bicycle_id)
-        if db_bicycle:
-            self.db.delete(db_bicycle)
-            self.db.commit()
-            return True
-        return False
+    @on_shard(by_id("bicycle_id"))
+    def update_bicycle(
+        self,
+        bicycle_id: int,
+        bicycle_update: BicycleUpdate,
+        from_statuses: Optional[Collection[BicycleStatus]] = None,
+    ) -> Optional[Bicycle]:
+        # from_statuses — з яких статусів дозволено оновлення; None, якщо статус не змінюється
+        criteria = [Bicycle.status.in_(list(from_statuses))] if from_statuses is not None else []
+        try:
+            db_bicycle = update_returning(self.db, Bicycle, bicycle_id, bicycle_update.model_dump(exclude_unset=True), *criteria)
+        except IntegrityError:
+            self.db.rollback()
+            raise
+        if db_bicycle is None:
+            return None
+        append_outbox_event(self.db, Bicycle.__tablename__, bicycle_id, "update", bicycle_update.model_dump(mode="json", exclude_unset=True))
+        commit_detached(self.db, db_bicycle)
+        return db_bicycle
+
+    @on_shard(by_id("bicycle_id"))
+    def delete_bicycle(self, bicycle_id: int) -> Optional[Bicycle]:
+        # Повертає видалений велосипед (з його останньою локацією) або None, якщо його не було
+        try:
+            db_bicycle = self.db.scalars(_delete_bicycle, {"bicycle_id": bicycle_id}).first()
+        except IntegrityError:
+            self.db.rollback()
+            raise
+        if db_bicycle is None:
+            return None
+        append_outbox_event(self.db, Bicycle.__tablename__, bicycle_id, "delete")
+        commit_detached(self.db, db_bicycle)
+        return db_bicycle
+
+    @on_shard(by_id("from_location_id"))
+    def move_bicycles(self, from_location_id: int, to_location_id: int, statuses: Collection[BicycleStatus]) -> List[Bicycle]:
+        params = {"from_location_id": from_location_id, "to_location_id": to_location_id, "statuses": list(statuses)}
+        try:
+            moved = list(self.db.scalars(_move_bicycles, params))
+        except IntegrityError:
+            self.db.rollback()
+            raise
+        append_outbox_events(self.db, Bicycle.__tablename__, [b.id for b in moved], "update", {"current_location_id": to_location_id})
+        commit_detached(self.db, *moved)
+        return moved
+
+    @on_shards_by_ids("ids", merge=concat)
+    def set_bicycles_status(self, ids: List[int], new_status: BicycleStatus, from_statuses: Collection[BicycleStatus]) -> List[Bicycle]:
+        params = {"ids": ids, "new_status": new_status, "from_statuses": list(from_statuses)}
+        updated = list(self.db.scalars(_set_bicycles_status, params))
+        append_outbox_events(self.db, Bicycle.__tablename__, [b.id for b in updated], "update", {"status": new_status.value})
+        commit_detached(self.db, *updated)
+        return updated
+
+    @on_all_shards(
+        merge=concat,
+        shard_of=lambda arguments: shard_map.for_id(arguments["location_id"]) if arguments["location_id"] is not None else None,
+    )
+    def delete_bicycles(self, location_id: Optional[int] = None, status: Optional[BicycleStatus] = None) -> List[Bicycle]:
+        statement = delete(Bicycle).where(~_has_rentals, ~_has_archived_rentals)
+        if location_id is not None:
+            statement = statement.where(Bicycle.current_location_id == location_id)
+        if status is not None:
+            statement = statement.where(Bicycle.status == status)
+        statement = statement.returning(Bicycle).execution_options(synchronize_session=False)
+        deleted = list(self.db.scalars(statement))
+        append_outbox_events(self.db, Bicycle.__tablename__, [b.id for b in deleted], "delete")
+        commit_detached(self.db, *deleted)
+        return deleted
 
     def get_most_rented_bicycle(self) -> Optional[Bicycle]:
-        from models.rental import Rental
-        result = self.db.query(Bicycle, func.count(Rental.id).label("rental_count")).join(Rental).group_by(Bicycle.id).order_by(func.count(Rental.id).desc()).first()
+        if is_routing(self.db):
+            # Прокати велосипеда лежать у його шарді: лідер — найкращий серед лідерів шардів
+            counts = self.get_bicycle_rental_counts(limit=1)
+            return self.get_bicycle(max(counts, key=lambda row: row[1])[0]) if counts else None
+        stmt, _ = self._most_rented_query()
+        return self.db.scalars(stmt.limit(1)).first()
+
+    @on_all_shards(merge=concat)
+    def get_bicycle_rental_counts(self, limit: int = 1) -> List[tuple]:
+        # (bicycle_id, кількість прокатів) для limit найпопулярніших велосипедів
+        stmt, rental_count = self._most_rented_query()
+        return [tuple(row) for row in self.db.execute(stmt.with_only_columns(Bicycle.id, rental_count).limit(limit))]
 
-        if result:
-            return result.Bicycle
-        return None
+    def _most_rented_query(self) -> Tuple[Select, ColumnElement]:
+        history = RentalArchiveRepository(self.db).get_rental_history()
+        if history is None:
+            return _select_most_rented_bicycle, func.count(Rental.id)
+        # Є архів — рахуємо прокати з гарячої таблиці разом з архівними
+        rental_count = func.count(history.c.id)
+        stmt = (
+            select(Bicycle)
+            .join(history, Bicycle.id == history.c.bicycle_id)
+            .group_by(Bicycle.id)
+            .order_by(rental_count.desc())
+        )
+        return stmt, rental_count
 
-BicycleRepositoryDependency = Annotated[BicycleRepository, Depends]
\ No newline at end of file
+BicycleRepositoryDependency = Annotated[BicycleRepository, Depends]
@@ -0,0 +1,109 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import select, delete, bindparam, or_
+from sqlalchemy.dialects import postgresql, sqlite
+from typing import Optional, List, Annotated
+from datetime import datetime, timezone
+from fastapi import Depends
+
+from db.database import get_db
+from db.sharding import on_shard, on_all_shards, by_id, concat
+from models.bicycle import Bicycle, BicycleStatus
+from models.bicycle_hold import BicycleHold
+from core.tracing import traced
+
+
+_select_hold = select(BicycleHold).where(BicycleHold.bicycle_id == bindparam("bicycle_id"))
+_select_active_holds = select(BicycleHold).where(BicycleHold.expires_at > bindparam("now"))
+_delete_expired_holds = (
+    delete(BicycleHold)
+    .where(BicycleHold.expires_at <= bindparam("now"))
+    .execution_options(synchronize_session=False)
+)
+_release_hold = (
+    delete(BicycleHold)
+    .where(BicycleHold.bicycle_id == bindparam("bicycle_id"), BicycleHold.user_id == bindparam("user_id"))
+    .returning(BicycleHold.bicycle_id)
+    .execution_options(synchronize_session=False)
+)
+# Рядок нового резервування береться з самого велосипеда: якщо той не доступний, рядка немає і INSERT нічого не вставляє
+_hold_source = (
+    select(
+        Bicycle.id,
+        bindparam("user_id", type_=BicycleHold.user_id.type),
+        Bicycle.current_location_id,
+        bindparam("expires_at", type_=BicycleHold.expires_at.type),
+        bindparam("created_at", type_=BicycleHold.created_at.type),
+    )
+    .where(Bicycle.id == bindparam("bicycle_id"), Bicycle.status == BicycleStatus.AVAILABLE)
+)
+_hold_columns = ["bicycle_id", "user_id", "location_id", "expires_at", "created_at"]
+# INSERT ... SELECT будується над таблицею, а не ORM-сутністю: ORM-варіант з параметрами вважається масовою вставкою
+_holds = BicycleHold.__table__
+
+
+def _place_hold_statement(dialect_name: str):
+    # Один INSERT ... SELECT ... ON CONFLICT DO UPDATE ... RETURNING: перевірка доступності велосипеда,
+    # заміна простроченого чужого або продовження власного резервування — атомарно в БД, тож двоє
+    # користувачів (навіть на різних воркерах) не зарезервують той самий велосипед
+    dialect_insert = postgresql.insert if dialect_name == "postgresql" else sqlite.insert
+    statement = dialect_insert(_holds).from_select(_hold_columns, _hold_source)
+    return (
+        statement.on_conflict_do_update(
+            index_elements=[_holds.c.bicycle_id],
+            set_={
+                "user_id": statement.excluded.user_id,
+                "location_id": statement.excluded.location_id,
+                "expires_at": statement.excluded.expires_at,
+                "created_at": statement.excluded.created_at,
+            },
+            where=or_(_holds.c.expires_at <= statement.excluded.created_at, _holds.c.user_id == statement.excluded.user_id),
+        )
+        .returning(*_holds.c)
+    )
+
+
+_place_hold = {name: _place_hold_statement(name) for name in ("postgresql", "sqlite")}
+
+
+@traced("repository")
+class BicycleHoldRepository:
+    def __init__(self, db: Session = Depends(get_db)):
+        self.db = db
+
+    # Резервування живе в шарді свого велосипеда
+
+    @on_shard(by_id("bicycle_id"))
+    def get_hold(self, bicycle_id: int) -> Optional[BicycleHold]:
+        return self.db.scalars(_select_hold, {"bicycle_id": bicycle_id}).first()
+
+    @on_shard(by_id("bicycle_id"))
+    def place_hold(self, bicycle_id: int, user_id: int, expires_at: datetime, purge_expired: bool = False) -> Optional[BicycleHold]:
+        # None — велосипеда немає, він не доступний або вже зарезервований іншим користувачем.
+        # purge_expired — заодно прибрати прострочені рядки (реєстр у пам'яті бачив, що такі є)
+        now = datetime.now(timezone.utc)
+        if purge_expired:
+            self.db.execute(_delete_expired_holds, {"now": now})
+        statement = _place_hold[self.db.get_bind().dialect.name]
+        params = {"bicycle_id": bicycle_id, "user_id": user_id, "expires_at": expires_at, "created_at": now}
+        row = self.db.execute(statement, params).mappings().first()
+        self.db.commit()
+        # Від'єднаний об'єкт зі значеннями з RETURNING
+        return BicycleHold(**row) if row is not None else None
+
+    @on_shard(by_id("bicycle_id"))
+    def release_hold(self, bicycle_id: int, user_id: int) -> bool:
+        released = self.db.execute(_release_hold, {"bicycle_id": bicycle_id, "user_id": user_id}).first() is not None
+        self.db.commit()
+        return released
+
+    @on_all_shards(merge=concat)
+    def get_active_holds(self, now: datetime) -> List[BicycleHold]:
+        return list(self.db.scalars(_select_active_holds, {"now": now}))
+
+    @on_all_shards(merge=sum)
+    def delete_expired_holds(self, now: datetime) -> int:
+        deleted = self.db.execute(_delete_expired_holds, {"now": now}).rowcount
+        self.db.commit()
+        return deleted
+
+BicycleHoldRepositoryDependency = Annotated[BicycleHoldRepository, Depends]
@@ -1,62 +1,178 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from typing import Optional, List, Annotated
+from sqlalchemy import select, update, delete, bindparam, and_, or_, not_, true, false
+from sqlalchemy.exc import IntegrityError
+from typing import Optional, List, Annotated, Union
 from datetime import datetime, timezone
 from fastapi import Depends
 
 from db.database import get_db
+from crud.outbox import append_outbox_event
+from crud.writes import commit_detached, update_returning
+from crud.fields import select_fields, select_fields_one
 
 from models.discount import Discount
+from models.rental import Rental
 from schemas.discount import DiscountCreate, DiscountUpdate
+from core.tracing import traced
 
 
+_select_discount_by_id = select(Discount).where(Discount.id == bindparam("discount_id"))
+_select_discount_by_name = select(Discount).where(Discount.name == bindparam("name"))
+_select_discounts = select(Discount)
+_select_active_discounts = select(Discount).where(
+    Discount.is_active == True,
+    Discount.valid_from <= bindparam("current_time"),
+    Discount.valid_to >= bindparam("current_time")
+)
+
+# Одним UPDATE ... RETURNING на весь набір — без завантаження рядків у сесію
+_expire_discounts = (
+    update(Discount)
+    .where(Discount.is_active == True, Discount.valid_to < bindparam("current_time"))
+    .values(is_active=False)
+    .returning(Discount.id)
+    .execution_options(synchronize_session=False)
+)
+_activate_scheduled_discounts = (
+    update(Discount)
+    .where(
+        Discount.is_scheduled == True,
+        Discount.valid_from <= bindparam("current_time"),
+        Discount.valid_to >= bindparam("current_time"),
+    )
+    .values(is_active=True, is_scheduled=False)
+    .returning(Discount.id)
+    .execution_options(synchronize_session=False)
+)
+# Заплановані знижки, чий термін минув раніше, ніж sweeper їх активував
+_drop_missed_scheduled_discounts = (
+    update(Discount)
+    .where(Discount.is_scheduled == True, Discount.valid_to < bindparam("current_time"))
+    .values(is_scheduled=False)
+    .execution_options(synchronize_session=False)
+)
+
+
+# Прокати видаленої знижки лишаються без знижки — так само, як це робив ORM при session.delete
+_detach_discount_rentals = (
+    update(Rental)
+    .where(Rental.discount_id == bindparam("deleted_discount_id"))
+    .values(discount_id=None)
+    .execution_options(synchronize_session=False)
+)
+_delete_discount = (
+    delete(Discount)
+    .where(Discount.id == bindparam("discount_id"))
+    .returning(Discount.id)
+    .execution_options(synchronize_session=False)
+)
+
+
+def _apply_schedule(db_discount: Discount, current_time: datetime) -> None:
+    # Знижка, що має бути активною, але ще не почалась, чекає на sweeper як запланована
+    wanted = db_discount.is_active or db_discount.is_scheduled
+    valid_from = db_discount.valid_from
+    if valid_from.tzinfo is None:
+        valid_from = valid_from.replace(tzinfo=timezone.utc)
+    starts_later = valid_from > current_time
+    db_discount.is_active = wanted and not starts_later
+    db_discount.is_scheduled = wanted and starts_later
+
+
+def _schedule_values(update_data: dict, current_time: datetime) -> dict:
+    # Те саме, що _apply_schedule, але виразами SQL над поточним рядком — для UPDATE без попереднього читання
+    if not update_data.keys() & {"is_active", "valid_from"}:
+        return {}
+    if "valid_from" in update_data:
+        valid_from = update_data["valid_from"]
+        if valid_from.tzinfo is None:
+            valid_from = valid_from.replace(tzinfo=timezone.utc)
+        starts_later = true() if valid_from > current_time else false()
+    else:
+        starts_later = Discount.valid_from > current_time
+    if "is_active" in update_data:
+        wanted = true() if update_data["is_active"] else false()
+    else:
+        wanted = or_(Discount.is_active, Discount.is_scheduled)
+    return {"is_active": and_(wanted, not_(starts_later)), "is_scheduled": and_(wanted, starts_later)}
+
+
+@traced("repository")
 class DiscountRepository:
     def __init__(self, db: Session = Depends(get_db)):
         self.db = db
 
-    def get_discount(self, discount_id: int) -> Optional[Discount]:
-        return self.db.query(Discount).filter(Discount.id == discount_id).first()
+    # Якщо передано fields, повертаються словники лише з цими колонками замість ORM-об'єктів
+
+    def get_discount(self, discount_id: int, fields: Optional[List[str]] = None) -> Optional[Union[Discount, dict]]:
+        if fields:
+            return select_fields_one(self.db, _select_discount_by_id, Discount, fields, {"discount_id": discount_id})
+        return self.db.scalars(_select_discount_by_id, {"discount_id": discount_id}).first()
 
     def get_discount_by_name(self, name: str) -> Optional[Discount]:
-        return self.db.query(Discount).filter(Discount.name == name).first()
+        return self.db.scalars(_select_discount_by_name, {"name": name}).first()
 
-    def get_discounts(self) -> List[Discount]:
-        return self.db.query(Discount).all()
+    def get_discounts(self, fields: Optional[List[str]] = None) -> List[Union[Discount, dict]]:
+        if fields:
+            return select_fields(self.db, _select_discounts, Discount, fields)
+        return list(self.db.scalars(_select_discounts))
 
-    def get_active_discounts(self, current_time: Optional[datetime] = None) -> List[Discount]:
+    def get_active_discounts(self, current_time: Optional[datetime] = None, fields: Optional[List[str]] = None) -> List[Union[Discount, dict]]:
         if current_time is None:
             current_time = datetime.utcnow()
-        return self.db.query(Discount).filter(
-            Discount.is_active == True,
-            Discount.valid_from <= current_time,
-            Discount.valid_to >= current_time
-        ).all()
+        if fields:
+            return select_fields(self.db, _select_active_discounts, Discount, fields, {"current_time": current_time})
+        return list(self.db.scalars(_select_active_discounts, {"current_time": current_time}))
 
     def create_discount(self, discount: DiscountCreate) -> Discount:
         db_discount = Discount(**discount.model_dump())
-        self.db.add(db_discount)
-        self.db.commit()
-        self.db.refresh(db_discount)
+        _apply_schedule(db_discount, datetime.now(timezone.utc))
+        try:
+            self.db.add(db_discount)
+            self.db.flush()
+        except IntegrityError:
+            self.db.rollback()
+            raise
+        append_outbox_event(self.db, Discount.__tablename__, db_discount.id, "create", discount.model_dump(mode="json"))
+        commit_detached(self.db, db_discount)
         return db_discount
 
     def update_discount(self, discount_id: int, discount_update: DiscountUpdate) -> Optional[Discount]:
-        db_discount = self.get_discount(discount_id)
-        if db_discount:
-            update_data = discount_update.model_dump(exclude_unset=True)
-            for key, value in update_data.items():
-                setattr(db_discount, key, value)
-            self.db.add(db_discount)
-            self.db.commit()
-            self.db.refresh(db_discount)
-            return db_discount
-        return None
+        update_data = discount_update.model_dump(exclude_unset=True)
+        values = {**update_data, **_schedule_values(update_data, datetime.now(timezone.utc))}
+        try:
+            db_discount = update_returning(self.db, Discount, discount_id, values)
+        except IntegrityError:
+            self.db.rollback()
+            raise
+        if db_discount is None:
+            return None
+        append_outbox_event(self.db, Discount.__tablename__, discount_id, "update", discount_update.model_dump(mode="json", exclude_unset=True))
+        commit_detached(self.db, db_discount)
+        return db_discount
 
     def delete_discount(self, discount_id: int) -> bool:
-        db_discount = self.get_discount(discount_id)
-        if db_discount:
-            self.db.delete(db_discount)
-            self.db.commit()
-            return True
-        return False
+        self.db.execute(_detach_discount_rentals, {"deleted_discount_id": discount_id})
+        if self.db.execute(_delete_discount, {"discount_id": discount_id}).first() is None:
+            self.db.rollback()
+            return False
+        append_outbox_event(self.db, Discount.__tablename__, discount_id, "delete")
+        self.db.commit()
+        return True
+
+    # Методи sweeper'а не фіксують транзакцію — це робить воркер після обох кроків
+
+    def expire_discounts(self, current_time: datetime) -> List[int]:
+        expired_ids = list(self.db.scalars(_expire_discounts, {"current_time": current_time}))
+        for discount_id in expired_ids:
+            append_outbox_event(self.db, Discount.__tablename__, discount_id, "update", {"is_active": False})
+        return expired_ids
+
+    def activate_scheduled_discounts(self, current_time: datetime) -> List[int]:
+        activated_ids = list(self.db.scalars(_activate_scheduled_discounts, {"current_time": current_time}))
+        for discount_id in activated_ids:
+            append_outbox_event(self.db, Discount.__tablename__, discount_id, "update", {"is_active": True})
+        self.db.execute(_drop_missed_scheduled_discounts, {"current_time": current_time})
+        return activated_ids
 
 DiscountRepositoryDependency = Annotated[DiscountRepository, Depends]
\ No newline at end of file
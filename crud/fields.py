@@ -0,0 +1,15 @@
+from typing import List, Optional
+
+from sqlalchemy import Select
+from sqlalchemy.orm import Session
+
+
+def select_fields(db: Session, stmt: Select, model: type, fields: List[str], params: Optional[dict] = None) -> List[dict]:
+    # Вибираються лише запитані колонки; ORM-об'єкти не створюються
+    columns = [getattr(model, field) for field in fields]
+    return [dict(row) for row in db.execute(stmt.with_only_columns(*columns), params or {}).mappings()]
+
+
+def select_fields_one(db: Session, stmt: Select, model: type, fields: List[str], params: Optional[dict] = None) -> Optional[dict]:
+    rows = select_fields(db, stmt.limit(1), model, fields, params)
+    return rows[0] if rows else None
@@ -1,66 +1,192 @@
 from datetime import datetime
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from typing import Optional, List, Annotated
+from sqlalchemy import func, select, update, delete, bindparam, Select, ColumnElement
+from sqlalchemy.exc import IntegrityError
+from typing import Optional, List, Annotated, Union, Tuple
 from fastapi import Depends
 
 from db.database import get_db
+from db.sharding import shard_map, is_routing, on_shard, on_all_shards, on_shards_by_ids, by_id, concat, merge_dicts
+from crud.outbox import append_outbox_event
+from crud.writes import commit_detached, update_returning
+from crud.rental_archive import RentalArchiveRepository
+from crud.fields import select_fields, select_fields_one
 from models.location import Location
 from models.rental import Rental
-from models.bicycle import Bicycle
+from models.bicycle import Bicycle, BicycleStatus
+from models.location_status_count import LocationStatusCount
 from schemas.location import LocationCreate, LocationUpdate
+from core.tracing import traced
 
 
+_select_location_by_id = select(Location).where(Location.id == bindparam("location_id"))
+_select_locations = select(Location)
+_select_locations_by_ids = select(Location).where(Location.id.in_(bindparam("ids", expanding=True)))
+_select_top_performing_locations = (
+    select(Location)
+    .join(Bicycle, Location.id == Bicycle.current_location_id)
+    .join(Rental, Bicycle.id == Rental.bicycle_id)
+    .group_by(Location.id)
+    .order_by(func.count(Rental.id).desc())
+)
+_select_status_counts_by_location = (
+    select(LocationStatusCount.status, LocationStatusCount.count)
+    .where(LocationStatusCount.location_id == bindparam("location_id"))
+)
+_select_status_counts = select(LocationStatusCount.location_id, LocationStatusCount.status, LocationStatusCount.count)
+_select_available_counts_by_ids = (
+    select(LocationStatusCount.location_id, LocationStatusCount.count)
+    .where(
+        LocationStatusCount.status == BicycleStatus.AVAILABLE,
+        LocationStatusCount.location_id.in_(bindparam("ids", expanding=True)),
+    )
+)
+_select_coordinates = (
+    select(Location.id, Location.latitude, Location.longitude)
+    .where(Location.latitude.is_not(None), Location.longitude.is_not(None))
+)
+# Велосипеди видаленої локації лишаються без локації — так само, як це робив ORM при session.delete
+_detach_location_bicycles = (
+    update(Bicycle)
+    .where(Bicycle.current_location_id == bindparam("location_id"))
+    .values(current_location_id=None)
+    .execution_options(synchronize_session=False)
+)
+_delete_location = (
+    delete(Location)
+    .where(Location.id == bindparam("location_id"))
+    .returning(Location.id)
+    .execution_options(synchronize_session=False)
+)
+
+
+@traced("repository")
 class LocationRepository:
     def __init__(self, db: Session = Depends(get_db)):
         self.db = db
 
-    def get_location(self, location_id: int) -> Optional[Location]:
-        return self.db.query(Location).filter(Location.id == location_id).first()
+    # Якщо передано fields, повертаються словники лише з цими колонками замість ORM-об'єктів
+
+    @on_shard(by_id("location_id"))
+    def get_location(self, location_id: int, fields: Optional[List[str]] = None) -> Optional[Union[Location, dict]]:
+        if fields:
+            return select_fields_one(self.db, _select_location_by_id, Location, fields, {"location_id": location_id})
+        return self.db.scalars(_select_location_by_id, {"location_id": location_id}).first()
+
+    @on_all_shards(merge=concat)
+    def get_locations(self, fields: Optional[List[str]] = None) -> List[Union[Location, dict]]:
+        if fields:
+            return select_fields(self.db, _select_locations, Location, fields)
+        return list(self.db.scalars(_select_locations))
 
-    def get_locations(self) -> List[Location]:
-        return self.db.query(Location).all()
+    @on_shards_by_ids("ids", merge=concat)
+    def get_locations_by_ids(self, ids: List[int], fields: Optional[List[str]] = None) -> List[Union[Location, dict]]:
+        if fields:
+            return select_fields(self.db, _select_locations_by_ids, Location, fields, {"ids": ids})
+        return list(self.db.scalars(_select_locations_by_ids, {"ids": ids}))
 
+    @on_shard(lambda arguments: shard_map.for_region(arguments["location"].city))
     def create_location(self, location: LocationCreate) -> Location:
         db_location = Location(**location.model_dump())
-        self.db.add(db_location)
-        self.db.commit()
-        self.db.refresh(db_location)
+        try:
+            self.db.add(db_location)
+            self.db.flush()
+        except IntegrityError:
+            self.db.rollback()
+            raise
+        append_outbox_event(self.db, Location.__tablename__, db_location.id, "create", location.model_dump(mode="json"))
+        commit_detached(self.db, db_location)
         return db_location
 
+    @on_shard(by_id("location_id"))
     def update_location(self, location_id: int, location_update: LocationUpdate) -> Optional[Location]:
-        db_location = self.get_location(location_id)
-        if db_location:
-            update_data = location_update.model_dump(exclude_unset=True)
-            for key, value in update_data.items():
-                setattr(db_location, key, value)
-            self.db.add(db_location)
-            self.db.commit()
-            self.db.refresh(db_location)
-            return db_location
-        return None
+        try:
+            db_location = update_returning(self.db, Location, location_id, location_update.model_dump(exclude_unset=True))
+        except IntegrityError:
+            self.db.rollback()
+            raise
+        if db_location is None:
+            return None
+        append_outbox_event(self.db, Location.__tablename__, location_id, "update", location_update.model_dump(mode="json", exclude_unset=True))
+        commit_detached(self.db, db_location)
+        return db_location
 
+    @on_shard(by_id("location_id"))
     def delete_location(self, location_id: int) -> bool:
-        db_location = self.get_location(location_id)
-        if db_location:
-            self.db.delete(db_location)
-            self.db.commit()
-            return True
-        return False
-
-    def get_top_performing_locations(self, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None, limit: int = 5) -> List[Location]:
-        query = self.db.query(
-            Location,
-            func.count(Rental.id).label("rental_count")
-        ).join(Bicycle, Location.id == Bicycle.current_location_id)\
-        .join(Rental, Bicycle.id == Rental.bicycle_id)
+        params = {"location_id": location_id}
+        self.db.execute(_detach_location_bicycles, params)
+        if self.db.execute(_delete_location, params).first() is None:
+            self.db.rollback()
+            return False
+        append_outbox_event(self.db, Location.__tablename__, location_id, "delete")
+        self.db.commit()
+        return True
 
+    def _top_performing_query(self, start_date: Optional[datetime], end_date: Optional[datetime]) -> Tuple[Select, ColumnElement, dict]:
+        # Кожна комбінація фільтрів дає окремий, але так само кешований запит
+        rentals = Rental.__table__
+        stmt = _select_top_performing_locations
+        rental_count = func.count(Rental.id)
+        history = RentalArchiveRepository(self.db).get_rental_history(start_date, end_date)
+        if history is not None:
+            # Є архів — рахуємо прокати з гарячої таблиці разом з архівними партиціями за період
+            rentals = history
+            rental_count = func.count(history.c.id)
+            stmt = (
+                select(Location)
+                .join(Bicycle, Location.id == Bicycle.current_location_id)
+                .join(history, Bicycle.id == history.c.bicycle_id)
+                .group_by(Location.id)
+                .order_by(rental_count.desc())
+            )
+        params = {}
         if start_date:
-            query = query.filter(Rental.rental_start_time >= start_date)
+            stmt = stmt.where(rentals.c.rental_start_time >= bindparam("start_date"))
+            params["start_date"] = start_date
         if end_date:
-            query = query.filter(Rental.rental_start_time <= end_date)
+            stmt = stmt.where(rentals.c.rental_start_time <= bindparam("end_date"))
+            params["end_date"] = end_date
+        return stmt, rental_count, params
+
+    def get_top_performing_locations(self, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None, limit: int = 5, fields: Optional[List[str]] = None) -> List[Union[Location, dict]]:
+        if is_routing(self.db):
+            # Локація живе в одному шарді, тож глобальний топ складається з топів шардів
+            counts = sorted(self.get_location_rental_counts(start_date, end_date, limit), key=lambda row: row[1], reverse=True)[:limit]
+            order = {location_id: position for position, (location_id, _) in enumerate(counts)}
+            locations = self.get_locations_by_ids([location_id for location_id, _ in counts], fields=fields and list(dict.fromkeys(["id", *fields])))
+            locations.sort(key=lambda l: order[l["id"] if fields else l.id])
+            if fields and "id" not in fields:
+                for location in locations:
+                    del location["id"]
+            return locations
+
+        stmt, _, params = self._top_performing_query(start_date, end_date)
+        if fields:
+            return select_fields(self.db, stmt.limit(limit), Location, fields, params)
+        return list(self.db.scalars(stmt.limit(limit), params))
+
+    @on_all_shards(merge=concat)
+    def get_location_rental_counts(self, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None, limit: int = 5) -> List[tuple]:
+        # (location_id, кількість прокатів) для limit найпопулярніших локацій
+        stmt, rental_count, params = self._top_performing_query(start_date, end_date)
+        return [tuple(row) for row in self.db.execute(stmt.with_only_columns(Location.id, rental_count).limit(limit), params)]
+
+    # Лічильники підтримуються тригерами БД — читання не рахує велосипеди
+
+    @on_shard(by_id("location_id"))
+    def get_status_counts(self, location_id: int) -> List[tuple]:
+        return list(self.db.execute(_select_status_counts_by_location, {"location_id": location_id}))
+
+    @on_all_shards(merge=concat)
+    def get_all_status_counts(self) -> List[tuple]:
+        return list(self.db.execute(_select_status_counts))
+
+    @on_shards_by_ids("ids", merge=merge_dicts)
+    def get_available_counts(self, ids: List[int]) -> dict:
+        return dict(self.db.execute(_select_available_counts_by_ids, {"ids": ids}).all())
 
-        results = query.group_by(Location.id).order_by(func.count(Rental.id).desc()).limit(limit).all()
-        return [result.Location for result in results]
+    @on_all_shards(merge=concat)
+    def get_coordinates(self) -> List[tuple]:
+        return [tuple(row) for row in self.db.execute(_select_coordinates)]
 
 LocationRepositoryDependency = Annotated[LocationRepository, Depends]
\ No newline at end of file
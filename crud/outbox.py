@@ -0,0 +1,71 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import select, insert, delete, bindparam
+from typing import Optional, List, Annotated, Iterable
+from datetime import datetime, timezone
+from fastapi import Depends
+
+from db.database import get_db
+from models.outbox import OutboxEvent, OutboxCheckpoint
+from core.tracing import traced
+
+
+# Читаються всі ще не видалені події, а не ті, що після контрольної точки: у PostgreSQL транзакції отримують
+# ID з послідовності в одному порядку, а фіксуються в іншому, тож подія з меншим ID може з'явитися вже після
+# обробки більших і лишилася б нижче контрольної точки назавжди. SKIP LOCKED пропускає рядки, які тримає інша транзакція
+_select_pending_events = (
+    select(OutboxEvent)
+    .order_by(OutboxEvent.id)
+    .limit(bindparam("limit"))
+    .with_for_update(skip_locked=True)
+)
+_select_checkpoint_for_update = (
+    select(OutboxCheckpoint)
+    .where(OutboxCheckpoint.consumer == bindparam("consumer"))
+    .with_for_update()
+)
+_delete_events = delete(OutboxEvent).where(OutboxEvent.id.in_(bindparam("ids", expanding=True)))
+
+
+def append_outbox_event(db: Session, entity: str, entity_id: int, operation: str, changed_fields: Optional[dict] = None) -> None:
+    # Подія додається в ту саму транзакцію, що й запис сутності, і фіксується разом з нею
+    db.add(OutboxEvent(entity=entity, entity_id=entity_id, operation=operation, changed_fields=changed_fields))
+
+
+def append_outbox_events(db: Session, entity: str, entity_ids: Iterable[int], operation: str, changed_fields: Optional[dict] = None) -> None:
+    # Для масових операцій: однакові події для багатьох рядків одним executemany замість INSERT на кожну
+    rows = [
+        {"entity": entity, "entity_id": entity_id, "operation": operation, "changed_fields": changed_fields}
+        for entity_id in entity_ids
+    ]
+    if rows:
+        db.execute(insert(OutboxEvent), rows)
+
+
+@traced("repository")
+class OutboxRepository:
+    def __init__(self, db: Session = Depends(get_db)):
+        self.db = db
+
+    def get_pending_events(self, limit: int) -> List[OutboxEvent]:
+        return list(self.db.scalars(_select_pending_events, {"limit": limit}))
+
+    def lock_checkpoint(self, consumer: str) -> OutboxCheckpoint:
+        # FOR UPDATE не дає двом воркерам одночасно обробляти ту саму партію
+        checkpoint = self.db.scalars(_select_checkpoint_for_update, {"consumer": consumer}).first()
+        if checkpoint is None:
+            checkpoint = OutboxCheckpoint(consumer=consumer, last_event_id=0)
+            self.db.add(checkpoint)
+            self.db.flush()
+        return checkpoint
+
+    def save_checkpoint(self, checkpoint: OutboxCheckpoint, last_event_id: int) -> None:
+        # last_event_id — лише для моніторингу (останній доставлений ID); вибірку подій він не обмежує
+        checkpoint.last_event_id = last_event_id
+        checkpoint.updated_at = datetime.now(timezone.utc)
+        self.db.add(checkpoint)
+
+    def delete_events(self, ids: List[int]) -> None:
+        # Видаляються рівно доставлені події, а не все до якогось ID
+        self.db.execute(_delete_events, {"ids": ids})
+
+OutboxRepositoryDependency = Annotated[OutboxRepository, Depends]
@@ -1,45 +1,205 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from typing import Optional, List, Annotated
-from datetime import datetime
+from sqlalchemy import func, select, update, delete, bindparam, exists, or_, case, literal, Table
+from sqlalchemy.exc import IntegrityError
+from typing import Optional, List, Annotated, Union, Callable, Sequence, Tuple
+from datetime import datetime, timezone
 from fastapi import Depends
 
 from db.database import get_db
+from db.sharding import shard_map, on_shard, on_all_shards, by_id, concat
+from crud.outbox import append_outbox_event
+from crud.writes import commit_detached, update_returning, upsert_copies
+from crud.fields import select_fields, select_fields_one
+from crud.rental_archive import RentalArchiveRepository
 
 from models.rental import Rental as DBRental
+from models.bicycle import Bicycle, BicycleStatus
+from models.discount import Discount
+from models.bicycle_hold import BicycleHold
 from schemas.rental import RentalCreate, RentalUpdate, Rental
+from core.pricing import rental_price
+from core.tracing import traced
 
 
+_select_rental_by_id = select(DBRental).where(DBRental.id == bindparam("rental_id"))
+_select_rentals = select(DBRental)
+_select_rentals_by_user = select(DBRental).where(DBRental.user_id == bindparam("user_id"))
+_select_rentals_by_bicycle = select(DBRental).where(DBRental.bicycle_id == bindparam("bicycle_id"))
+_select_rentals_by_time_range = select(DBRental).where(
+    DBRental.rental_start_time >= bindparam("start_time"),
+    DBRental.rental_end_time <= bindparam("end_time")
+)
+_select_revenue_by_time_range = select(func.sum(DBRental.total_price)).where(
+    DBRental.rental_start_time >= bindparam("start_time"),
+    DBRental.rental_end_time <= bindparam("end_time")
+)
+# Видачі для матриці попиту: місце видачі в прокаті не зберігається, тож береться поточна локація велосипеда
+_select_pickups_since = (
+    select(Bicycle.current_location_id, DBRental.rental_start_time)
+    .join(Bicycle, Bicycle.id == DBRental.bicycle_id)
+    .where(DBRental.rental_start_time >= bindparam("since"), Bicycle.current_location_id.is_not(None))
+)
+# Умовний UPDATE: з двох одночасних прокатів одного велосипеда пройде лише один, і жоден — поки
+# велосипед зарезервований іншим користувачем
+_held_by_other_user = exists().where(
+    BicycleHold.bicycle_id == Bicycle.id,
+    BicycleHold.expires_at > bindparam("now"),
+    BicycleHold.user_id != bindparam("user_id"),
+)
+_mark_bicycle_rented = (
+    update(Bicycle)
+    .where(Bicycle.id == bindparam("bicycle_id"), Bicycle.status == BicycleStatus.AVAILABLE, ~_held_by_other_user)
+    .values(status=BicycleStatus.RENTED)
+    .execution_options(synchronize_session=False)
+)
+# Резервування, з якого створено прокат, більше не потрібне
+_consume_hold = (
+    delete(BicycleHold)
+    .where(BicycleHold.bicycle_id == bindparam("bicycle_id"))
+    .execution_options(synchronize_session=False)
+)
+# Повернення: усе, що потрібно для ціни, одним запитом; знижка в шарді — копія, зроблена під час створення прокату
+_select_rental_for_return = (
+    select(DBRental.rental_start_time, Bicycle.price_per_hour, Bicycle.current_location_id, Discount.percentage_amount)
+    .join(Bicycle, Bicycle.id == DBRental.bicycle_id)
+    .outerjoin(Discount, Discount.id == DBRental.discount_id)
+    .where(DBRental.id == bindparam("rental_id"), DBRental.actual_return_time.is_(None))
+)
+# Велосипед стає доступним на локації повернення; статус "на ремонті", виставлений під час прокату, лишається
+_release_bicycle = (
+    update(Bicycle)
+    .where(Bicycle.id == bindparam("bicycle_id"))
+    .values(
+        current_location_id=bindparam("location_id"),
+        status=case(
+            (Bicycle.status == BicycleStatus.RENTED, literal(BicycleStatus.AVAILABLE, Bicycle.status.type)),
+            else_=Bicycle.status,
+        ),
+    )
+    .returning(Bicycle)
+    .execution_options(synchronize_session=False)
+)
+# Видалений чи переведений на інший велосипед активний прокат звільняє свій велосипед; статус "на ремонті" лишається
+_free_bicycle = (
+    update(Bicycle)
+    .where(Bicycle.id == bindparam("bicycle_id"), Bicycle.status == BicycleStatus.RENTED)
+    .values(status=BicycleStatus.AVAILABLE)
+    .returning(Bicycle.id)
+    .execution_options(synchronize_session=False)
+)
+# Велосипед і користувач активного прокату, заблоковані до кінця транзакції, що змінює велосипед прокату
+_select_active_rental_for_update = (
+    select(DBRental.bicycle_id, DBRental.user_id)
+    .where(DBRental.id == bindparam("rental_id"), DBRental.actual_return_time.is_(None))
+    .with_for_update()
+)
+# Змінюються лише прокати з гарячої таблиці; архів тільки читається
+_delete_rental = (
+    delete(DBRental)
+    .where(DBRental.id == bindparam("rental_id"))
+    .returning(DBRental.id, DBRental.bicycle_id, DBRental.actual_return_time)
+    .execution_options(synchronize_session=False)
+)
+
+
+def _discount_valid_for_rental(discount_id: int):
+    # Нова знижка має бути активною (або запланованою, якщо sweeper її ще не активував) на момент початку прокату;
+    # вже призначену знижку повторно не перевіряємо
+    return or_(
+        DBRental.discount_id == discount_id,
+        exists().where(
+            Discount.id == discount_id,
+            or_(Discount.is_active == True, Discount.is_scheduled == True),
+            Discount.valid_from <= DBRental.rental_start_time,
+            Discount.valid_to >= DBRental.rental_start_time,
+        ),
+    )
+
+
+def _by_time_range(table: Table) -> list:
+    return [table.c.rental_start_time >= bindparam("start_time"), table.c.rental_end_time <= bindparam("end_time")]
+
+
+@traced("repository")
 class RentalRepository:
     def __init__(self, db: Session = Depends(get_db)):
         self.db = db
+        self.archive = RentalArchiveRepository(db)
+
+    def _get_archived(self, tables: List[Table], criteria: Callable[[Table], list], params: dict, fields: Optional[List[str]] = None) -> List[Union[DBRental, dict]]:
+        # Рядки з архівних таблиць повертаються як від'єднані об'єкти Rental (або словники для fields)
+        rows = []
+        for table in tables:
+            columns = [table.c[field] for field in fields] if fields else list(table.c)
+            rows.extend(dict(row) for row in self.db.execute(select(*columns).where(*criteria(table)), params).mappings())
+        return rows if fields else [DBRental(**row) for row in rows]
+
+    # Якщо передано fields, повертаються словники лише з цими колонками замість ORM-об'єктів.
+    # Читання охоплюють і архів: гаряча таблиця, потім лише ті місячні таблиці, де можуть бути рядки
+
+    @on_shard(by_id("rental_id"))
+    def get_rental(self, rental_id: int, fields: Optional[List[str]] = None) -> Optional[Union[DBRental, dict]]:
+        params = {"rental_id": rental_id}
+        if fields:
+            rental = select_fields_one(self.db, _select_rental_by_id, DBRental, fields, params)
+        else:
+            rental = self._get_hot_rental(rental_id)
+        if rental is None:
+            archived = self._get_archived(self.archive.get_tables_for_rental(rental_id), lambda t: [t.c.id == bindparam("rental_id")], params, fields)
+            rental = archived[0] if archived else None
+        return rental
 
-    def get_rental(self, rental_id: int) -> Optional[DBRental]:
-        return self.db.query(DBRental).filter(DBRental.id == rental_id).first()
+    def _get_hot_rental(self, rental_id: int) -> Optional[DBRental]:
+        # Змінювати можна лише прокати з гарячої таблиці; архів доступний тільки для читання
+        return self.db.scalars(_select_rental_by_id, {"rental_id": rental_id}).first()
 
-    def get_rentals(self) -> List[DBRental]:
-        return self.db.query(DBRental).all()
+    @on_all_shards(merge=concat)
+    def get_rentals(self, fields: Optional[List[str]] = None) -> List[Union[DBRental, dict]]:
+        archived = self._get_archived(self.archive.get_tables_for_range(), lambda t: [], {}, fields)
+        if fields:
+            return archived + select_fields(self.db, _select_rentals, DBRental, fields)
+        return archived + list(self.db.scalars(_select_rentals))
 
+    @on_all_shards(merge=concat)
     def get_rentals_by_user_id(self, user_id: int) -> List[DBRental]:
-        return self.db.query(DBRental).filter(DBRental.user_id == user_id).all()
+        params = {"user_id": user_id}
+        archived = self._get_archived(self.archive.get_tables_for_range(), lambda t: [t.c.user_id == bindparam("user_id")], params)
+        return archived + list(self.db.scalars(_select_rentals_by_user, params))
 
-    def get_rentals_by_bicycle_id(self, bicycle_id: int) -> List[DBRental]:
-        return self.db.query(DBRental).filter(DBRental.bicycle_id == bicycle_id).all()
+    @on_shard(by_id("bicycle_id"))
+    def get_rentals_by_bicycle_id(self, bicycle_id: int, fields: Optional[List[str]] = None) -> List[Union[DBRental, dict]]:
+        params = {"bicycle_id": bicycle_id}
+        tables = self.archive.get_tables_for_bicycle(bicycle_id)
+        archived = self._get_archived(tables, lambda t: [t.c.bicycle_id == bindparam("bicycle_id")], params, fields)
+        if fields:
+            return archived + select_fields(self.db, _select_rentals_by_bicycle, DBRental, fields, params)
+        return archived + list(self.db.scalars(_select_rentals_by_bicycle, params))
 
-    def get_rentals_by_time_range(self, start_time: datetime, end_time: datetime) -> List[DBRental]:
-        return self.db.query(DBRental).filter(
-            DBRental.rental_start_time >= start_time,
-            DBRental.rental_end_time <= end_time
-        ).all()
+    @on_all_shards(merge=concat)
+    def get_rentals_by_time_range(self, start_time: datetime, end_time: datetime, fields: Optional[List[str]] = None) -> List[Union[DBRental, dict]]:
+        params = {"start_time": start_time, "end_time": end_time}
+        archived = self._get_archived(self.archive.get_tables_for_range(start_time, end_time), _by_time_range, params, fields)
+        if fields:
+            return archived + select_fields(self.db, _select_rentals_by_time_range, DBRental, fields, params)
+        return archived + list(self.db.scalars(_select_rentals_by_time_range, params))
 
+    @on_all_shards(merge=sum)
     def get_total_revenue_by_time_range(self, start_time: datetime, end_time: datetime) -> float:
-        result = self.db.query(func.sum(DBRental.total_price)).filter(
-            DBRental.rental_start_time >= start_time,
-            DBRental.rental_end_time <= end_time
-        ).scalar()
-        return float(result) if result is not None else 0.0
+        params = {"start_time": start_time, "end_time": end_time}
+        total = self.db.scalar(_select_revenue_by_time_range, params) or 0.0
+        for table in self.archive.get_tables_for_range(start_time, end_time):
+            total += self.db.scalar(select(func.sum(table.c.total_price)).where(*_by_time_range(table)), params) or 0.0
+        return float(total)
 
-    def create_rental(self, rental: RentalCreate) -> DBRental:
+    @on_all_shards(merge=concat)
+    def get_pickups_since(self, since: datetime) -> List[tuple]:
+        return [tuple(row) for row in self.db.execute(_select_pickups_since, {"since": since})]
+
+    # Прокат живе в шарді свого велосипеда. references — рядки з основної БД (користувач, знижка),
+    # копії яких мають бути в шарді, щоб пройшли зовнішні ключі й перевірка знижки
+
+    @on_shard(lambda arguments: shard_map.for_id(arguments["rental"].bicycle_id))
+    def create_rental(self, rental: RentalCreate, references: Sequence[object] = ()) -> DBRental:
         db_rental = DBRental(
             user_id=rental.user_id,
             bicycle_id=rental.bicycle_id,
@@ -49,30 +209,104 @@ class RentalRepository:
             total_price=rental.total_price,
             discount_id=rental.discount_id
         )
-        self.db.add(db_rental)
-        self.db.commit()
-        self.db.refresh(db_rental)
+        upsert_copies(self.db, *references)
+        params = {"bicycle_id": rental.bicycle_id, "user_id": rental.user_id, "now": datetime.now(timezone.utc)}
+        if self.db.execute(_mark_bicycle_rented, params).rowcount == 0:
+            self.db.rollback()
+            raise ValueError("Велосипед вже недоступний для прокату")
+        self.db.execute(_consume_hold, params)
+        try:
+            self.db.add(db_rental)
+            self.db.flush()
+        except IntegrityError:
+            self.db.rollback()
+            raise
+        append_outbox_event(self.db, Bicycle.__tablename__, rental.bicycle_id, "update", {"status": BicycleStatus.RENTED.value})
+        append_outbox_event(self.db, DBRental.__tablename__, db_rental.id, "create", rental.model_dump(mode="json"))
+        commit_detached(self.db, db_rental)
         return db_rental
 
-    def update_rental(self, rental_id: int, rental_update: RentalUpdate) -> Optional[DBRental]:
-        db_rental = self.get_rental(rental_id)
-        if db_rental:
-            update_data = rental_update.model_dump(exclude_unset=True)
+    @on_shard(by_id("rental_id"))
+    def update_rental(self, rental_id: int, rental_update: RentalUpdate, references: Sequence[object] = ()) -> Optional[DBRental]:
+        upsert_copies(self.db, *references)
+        swapped = self._swap_bicycle(rental_id, rental_update) if rental_update.bicycle_id is not None else None
+        criteria = [_discount_valid_for_rental(rental_update.discount_id)] if rental_update.discount_id is not None else []
+        try:
+            db_rental = update_returning(self.db, DBRental, rental_id, rental_update.model_dump(exclude_unset=True), *criteria)
+        except IntegrityError:
+            self.db.rollback()
+            raise
+        if db_rental is None:
+            self.db.rollback()
+            return None
+        if swapped is not None:
+            self._free_bicycle(swapped)
+        append_outbox_event(self.db, DBRental.__tablename__, rental_id, "update", rental_update.model_dump(mode="json", exclude_unset=True))
+        commit_detached(self.db, db_rental)
+        return db_rental
 
-            for field, value in update_data.items():
-                setattr(db_rental, field, value)
+    def _swap_bicycle(self, rental_id: int, rental_update: RentalUpdate) -> Optional[int]:
+        # Активний прокат переходить на інший велосипед: новий позначається "в прокаті" тією ж умовою, що й
+        # під час створення. Повертає ID старого велосипеда, який треба звільнити, або None, якщо нічого не змінюється
+        current = self.db.execute(_select_active_rental_for_update, {"rental_id": rental_id}).first()
+        if current is None or current.bicycle_id == rental_update.bicycle_id:
+            return None
+        params = {
+            "bicycle_id": rental_update.bicycle_id,
+            "user_id": rental_update.user_id if rental_update.user_id is not None else current.user_id,
+            "now": datetime.now(timezone.utc),
+        }
+        if self.db.execute(_mark_bicycle_rented, params).rowcount == 0:
+            self.db.rollback()
+            raise ValueError("Велосипед вже недоступний для прокату")
+        self.db.execute(_consume_hold, params)
+        append_outbox_event(self.db, Bicycle.__tablename__, rental_update.bicycle_id, "update", {"status": BicycleStatus.RENTED.value})
+        return current.bicycle_id
 
-            self.db.add(db_rental)
-            self.db.commit()
-            self.db.refresh(db_rental)
-        return db_rental
+    def _free_bicycle(self, bicycle_id: int) -> None:
+        if self.db.execute(_free_bicycle, {"bicycle_id": bicycle_id}).first() is not None:
+            append_outbox_event(self.db, Bicycle.__tablename__, bicycle_id, "update", {"status": BicycleStatus.AVAILABLE.value})
 
+    @on_shard(by_id("rental_id"))
+    def return_rental(self, rental_id: int, location_id: int, returned_at: datetime) -> Optional[Tuple[DBRental, Bicycle, Optional[int]]]:
+        # Завершення прокату однією транзакцією: читання для ціни, UPDATE прокату й велосипеда з RETURNING і події outbox.
+        # Лічильники статусів на локаціях оновлюють тригери. Повертає прокат, велосипед і його попередню локацію
+        # або None, якщо в гарячій таблиці немає неповернутого прокату з таким ID
+        row = self.db.execute(_select_rental_for_return, {"rental_id": rental_id}).first()
+        if row is None:
+            return None
+        values = {
+            "actual_return_time": returned_at,
+            "total_price": rental_price(row.rental_start_time, returned_at, row.price_per_hour, row.percentage_amount),
+        }
+        # Умова actual_return_time IS NULL відсікає одночасне повторне повернення
+        db_rental = update_returning(self.db, DBRental, rental_id, values, DBRental.actual_return_time.is_(None))
+        if db_rental is None:
+            self.db.rollback()
+            return None
+        try:
+            db_bicycle = self.db.scalars(_release_bicycle, {"bicycle_id": db_rental.bicycle_id, "location_id": location_id}).one()
+        except IntegrityError:
+            self.db.rollback()
+            raise
+        append_outbox_event(self.db, DBRental.__tablename__, rental_id, "update", {
+            "actual_return_time": returned_at.isoformat(), "total_price": values["total_price"],
+        })
+        append_outbox_event(self.db, Bicycle.__tablename__, db_bicycle.id, "update", {
+            "status": db_bicycle.status.value, "current_location_id": location_id,
+        })
+        commit_detached(self.db, db_rental, db_bicycle)
+        return db_rental, db_bicycle, row.current_location_id
+
+    @on_shard(by_id("rental_id"))
     def delete_rental(self, rental_id: int) -> bool:
-        db_rental = self.get_rental(rental_id)
-        if db_rental:
-            self.db.delete(db_rental)
-            self.db.commit()
-            return True
-        return False
+        deleted = self.db.execute(_delete_rental, {"rental_id": rental_id}).first()
+        if deleted is None:
+            return False
+        if deleted.actual_return_time is None:
+            self._free_bicycle(deleted.bicycle_id)
+        append_outbox_event(self.db, DBRental.__tablename__, rental_id, "delete")
+        self.db.commit()
+        return True
 
 RentalRepositoryDependency = Annotated[RentalRepository, Depends]
@@ -0,0 +1,142 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import select, insert, delete, union_all, bindparam, FromClause, Table
+from typing import Optional, List, Annotated, Dict
+from datetime import datetime
+from fastapi import Depends
+
+from db.database import get_db
+from models.rental import Rental
+from models.rental_archive import (
+    RentalArchivePartition, RentalArchiveBicycle, archive_table, archive_table_name, month_bounds,
+)
+from core.tracing import traced
+
+
+_rental_columns = [column.name for column in Rental.__table__.columns]
+
+# Завершені прокати, старші за межу; SKIP LOCKED не чекає на рядки, які зараз змінюють інші транзакції
+_select_archivable_rentals = (
+    select(Rental.id, Rental.rental_start_time)
+    .where(Rental.actual_return_time < bindparam("cutoff"))
+    .order_by(Rental.id)
+    .limit(bindparam("limit"))
+    .with_for_update(skip_locked=True)
+)
+_delete_rentals_by_ids = (
+    delete(Rental)
+    .where(Rental.id.in_(bindparam("ids", expanding=True)))
+    .execution_options(synchronize_session=False)
+)
+_select_partitions = select(RentalArchivePartition).order_by(RentalArchivePartition.month_start)
+_select_partition_for_update = (
+    select(RentalArchivePartition)
+    .where(RentalArchivePartition.table_name == bindparam("table_name"))
+    .with_for_update()
+)
+_select_partitions_by_range = (
+    select(RentalArchivePartition.table_name)
+    .where(
+        RentalArchivePartition.month_start <= bindparam("end_time"),
+        RentalArchivePartition.month_end > bindparam("start_time"),
+    )
+    .order_by(RentalArchivePartition.month_start)
+)
+_select_partitions_by_rental_id = (
+    select(RentalArchivePartition.table_name)
+    .where(
+        RentalArchivePartition.min_rental_id <= bindparam("rental_id"),
+        RentalArchivePartition.max_rental_id >= bindparam("rental_id"),
+    )
+)
+_select_partitions_by_bicycle = (
+    select(RentalArchiveBicycle.table_name)
+    .join(RentalArchivePartition, RentalArchivePartition.table_name == RentalArchiveBicycle.table_name)
+    .where(RentalArchiveBicycle.bicycle_id == bindparam("bicycle_id"))
+    .order_by(RentalArchivePartition.month_start)
+)
+_select_archived_bicycles = (
+    select(RentalArchiveBicycle.bicycle_id)
+    .where(
+        RentalArchiveBicycle.table_name == bindparam("table_name"),
+        RentalArchiveBicycle.bicycle_id.in_(bindparam("bicycle_ids", expanding=True)),
+    )
+)
+
+
+@traced("repository")
+class RentalArchiveRepository:
+    def __init__(self, db: Session = Depends(get_db)):
+        self.db = db
+
+    def get_partitions(self) -> List[RentalArchivePartition]:
+        return list(self.db.scalars(_select_partitions))
+
+    # Відсікання партицій: повертаються лише таблиці, де можуть бути потрібні рядки
+
+    def get_tables_for_range(self, start_time: Optional[datetime] = None, end_time: Optional[datetime] = None) -> List[Table]:
+        if start_time is None and end_time is None:
+            return [archive_table(p.table_name) for p in self.get_partitions()]
+        params = {"start_time": start_time or datetime.min, "end_time": end_time or datetime.max}
+        return [archive_table(name) for name in self.db.scalars(_select_partitions_by_range, params)]
+
+    def get_tables_for_rental(self, rental_id: int) -> List[Table]:
+        return [archive_table(name) for name in self.db.scalars(_select_partitions_by_rental_id, {"rental_id": rental_id})]
+
+    def get_tables_for_bicycle(self, bicycle_id: int) -> List[Table]:
+        return [archive_table(name) for name in self.db.scalars(_select_partitions_by_bicycle, {"bicycle_id": bicycle_id})]
+
+    def get_rental_history(self, start_time: Optional[datetime] = None, end_time: Optional[datetime] = None) -> Optional[FromClause]:
+        # Прокати з гарячої таблиці та потрібних архівних (id, bicycle_id, rental_start_time) для аналітики;
+        # None — архіву немає, і запит може йти прямо по rentals
+        tables = self.get_tables_for_range(start_time, end_time)
+        if not tables:
+            return None
+        parts = [select(Rental.id, Rental.bicycle_id, Rental.rental_start_time)]
+        parts += [select(t.c.id, t.c.bicycle_id, t.c.rental_start_time) for t in tables]
+        return union_all(*parts).subquery("rental_history")
+
+    # Перенесення в архів не фіксує транзакцію — це робить воркер після кожної партії
+
+    def get_archivable_rentals(self, cutoff: datetime, limit: int) -> List[tuple]:
+        return list(self.db.execute(_select_archivable_rentals, {"cutoff": cutoff, "limit": limit}))
+
+    def archive_rentals(self, rentals: List[tuple]) -> Dict[str, int]:
+        by_table: Dict[str, List[int]] = {}
+        month_starts: Dict[str, tuple] = {}
+        for rental_id, rental_start_time in rentals:
+            month_start, month_end = month_bounds(rental_start_time)
+            table_name = archive_table_name(month_start)
+            by_table.setdefault(table_name, []).append(rental_id)
+            month_starts[table_name] = (month_start, month_end)
+
+        connection = self.db.connection()
+        moved = {}
+        for table_name, ids in by_table.items():
+            table = archive_table(table_name)
+            table.create(connection, checkfirst=True)
+            source = select(*[Rental.__table__.c[name] for name in _rental_columns]).where(Rental.id.in_(ids))
+            self.db.execute(insert(table).from_select(_rental_columns, source))
+            bicycle_ids = set(self.db.scalars(select(Rental.bicycle_id).where(Rental.id.in_(ids)).distinct()))
+            self._register(table_name, *month_starts[table_name], ids, bicycle_ids)
+            moved[table_name] = len(ids)
+
+        self.db.execute(_delete_rentals_by_ids, {"ids": [rental_id for rental_id, _ in rentals]})
+        return moved
+
+    def _register(self, table_name: str, month_start: datetime, month_end: datetime, ids: List[int], bicycle_ids: set) -> None:
+        partition = self.db.scalars(_select_partition_for_update, {"table_name": table_name}).first()
+        if partition is None:
+            partition = RentalArchivePartition(
+                table_name=table_name, month_start=month_start, month_end=month_end,
+                min_rental_id=min(ids), max_rental_id=max(ids), row_count=0,
+            )
+            self.db.add(partition)
+        partition.min_rental_id = min(partition.min_rental_id, *ids)
+        partition.max_rental_id = max(partition.max_rental_id, *ids)
+        partition.row_count += len(ids)
+
+        known = set(self.db.scalars(_select_archived_bicycles, {"table_name": table_name, "bicycle_ids": list(bicycle_ids)}))
+        self.db.add_all(RentalArchiveBicycle(bicycle_id=b, table_name=table_name) for b in bicycle_ids - known)
+        self.db.flush()
+
+RentalArchiveRepositoryDependency = Annotated[RentalArchiveRepository, Depends]
@@ -1,26 +1,92 @@
 from fastapi import Depends
 from sqlalchemy.orm import Session
-from typing import Optional, List, Annotated
+from sqlalchemy import select, delete, bindparam, text, or_
+from sqlalchemy.exc import IntegrityError
+from typing import Optional, List, Annotated, Union
 
 from db.database import get_db
-from models.user import User as DBUser
+from crud.outbox import append_outbox_event
+from crud.writes import commit_detached, update_returning
+from crud.fields import select_fields, select_fields_one
+from models.user import User as DBUser, POSTGRES_USER_SEARCH_DOCUMENT
 from schemas.user import UserCreate, UserUpdate
+from core.tracing import traced
 
+_select_user_by_id = select(DBUser).where(DBUser.id == bindparam("user_id"))
+_select_users = select(DBUser)
+_select_users_by_ids = select(DBUser).where(DBUser.id.in_(bindparam("ids", expanding=True)))
+_select_user_by_email = select(DBUser).where(DBUser.email == bindparam("email"))
+_select_user_by_phone = select(DBUser).where(DBUser.phone == bindparam("phone"))
+_delete_user = (
+    delete(DBUser)
+    .where(DBUser.id == bindparam("user_id"))
+    .returning(DBUser.id)
+    .execution_options(synchronize_session=False)
+)
+
+# Триграмний індекс знаходить будь-який підрядок від 3 символів: частину імені, кінець телефону, шматок email
+SEARCH_MIN_TERM_LENGTH = 3
+
+# rank у FTS5 — bm25: менше значення означає кращий збіг
+_search_users_sqlite = select(DBUser).from_statement(text(
+    "SELECT users.* FROM users_search JOIN users ON users.id = users_search.rowid "
+    "WHERE users_search MATCH :query ORDER BY users_search.rank, users.id LIMIT :limit OFFSET :offset"
+))
+_search_users_postgres = select(DBUser).from_statement(text(
+    f"SELECT * FROM users WHERE {POSTGRES_USER_SEARCH_DOCUMENT} ILIKE ALL(:patterns) "
+    f"ORDER BY similarity({POSTGRES_USER_SEARCH_DOCUMENT}, :query) DESC, id LIMIT :limit OFFSET :offset"
+))
+
+
+def _like_pattern(term: str) -> str:
+    escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+@traced("repository")
 class UserRepository:
     def __init__(self, db: Session = Depends(get_db)):
         self.db = db
 
-    def get_user(self, user_id: int) -> Optional[DBUser]:
-        return self.db.query(DBUser).filter(DBUser.id == user_id).first()
+    # Якщо передано fields, повертаються словники лише з цими колонками замість ORM-об'єктів
+
+    def get_user(self, user_id: int, fields: Optional[List[str]] = None) -> Optional[Union[DBUser, dict]]:
+        if fields:
+            return select_fields_one(self.db, _select_user_by_id, DBUser, fields, {"user_id": user_id})
+        return self.db.scalars(_select_user_by_id, {"user_id": user_id}).first()
+
+    def get_users(self, fields: Optional[List[str]] = None) -> List[Union[DBUser, dict]]:
+        if fields:
+            return select_fields(self.db, _select_users, DBUser, fields)
+        return list(self.db.scalars(_select_users))
 
-    def get_users(self) -> List[DBUser]:
-        return self.db.query(DBUser).all()
+    def get_users_by_ids(self, ids: List[int], fields: Optional[List[str]] = None) -> List[Union[DBUser, dict]]:
+        if fields:
+            return select_fields(self.db, _select_users_by_ids, DBUser, fields, {"ids": ids})
+        return list(self.db.scalars(_select_users_by_ids, {"ids": ids}))
 
     def get_user_by_email(self, email: str) -> Optional[DBUser]:
-        return self.db.query(DBUser).filter(DBUser.email == email).first()
+        return self.db.scalars(_select_user_by_email, {"email": email}).first()
 
     def get_user_by_phone(self, phone: str) -> Optional[DBUser]:
-        return self.db.query(DBUser).filter(DBUser.phone == phone).first()
+        return self.db.scalars(_select_user_by_phone, {"phone": phone}).first()
+
+    def search_users(self, terms: List[str], limit: int, offset: int) -> List[DBUser]:
+        # Усі терміни мають знайтися (AND); кожен — підрядок будь-якого з полів
+        dialect = self.db.get_bind().dialect.name
+        params = {"limit": limit, "offset": offset}
+        if dialect == "sqlite":
+            query = " ".join('"' + term.replace('"', '""') + '"' for term in terms)
+            return list(self.db.scalars(_search_users_sqlite, {**params, "query": query}))
+        if dialect == "postgresql":
+            patterns = [_like_pattern(term) for term in terms]
+            return list(self.db.scalars(_search_users_postgres, {**params, "query": " ".join(terms), "patterns": patterns}))
+        # Інші СУБД: той самий збіг без індексу
+        columns = (DBUser.first_name, DBUser.last_name, DBUser.phone, DBUser.email)
+        statement = select(DBUser).order_by(DBUser.id).limit(limit).offset(offset)
+        for term in terms:
+            statement = statement.where(or_(*(c.ilike(_like_pattern(term), escape="\\") for c in columns)))
+        return list(self.db.scalars(statement))
 
     def create_user(self, user: UserCreate) -> DBUser:
         db_user = DBUser(
@@ -31,30 +97,38 @@ class UserRepository:
             address=user.address,
             is_active=True
         )
-        self.db.add(db_user)
-        self.db.commit()
-        self.db.refresh(db_user)
+        try:
+            self.db.add(db_user)
+            self.db.flush()
+        except IntegrityError:
+            self.db.rollback()
+            raise
+        append_outbox_event(self.db, DBUser.__tablename__, db_user.id, "create", user.model_dump(mode="json"))
+        commit_detached(self.db, db_user)
         return db_user
 
     def update_user(self, user_id: int, user_update: UserUpdate) -> Optional[DBUser]:
-        db_user = self.get_user(user_id)
-        if db_user:
-            update_data = user_update.model_dump(exclude_unset=True)
-
-            for field, value in update_data.items():
-                setattr(db_user, field, value)
-
-            self.db.add(db_user)
-            self.db.commit()
-            self.db.refresh(db_user)
+        try:
+            db_user = update_returning(self.db, DBUser, user_id, user_update.model_dump(exclude_unset=True))
+        except IntegrityError:
+            self.db.rollback()
+            raise
+        if db_user is None:
+            return None
+        append_outbox_event(self.db, DBUser.__tablename__, user_id, "update", user_update.model_dump(mode="json", exclude_unset=True))
+        commit_detached(self.db, db_user)
         return db_user
 
     def delete_user(self, user_id: int) -> bool:
-        db_user = self.get_user(user_id)
-        if db_user:
-            self.db.delete(db_user)
-            self.db.commit()
-            return True
-        return False
+        try:
+            deleted = self.db.execute(_delete_user, {"user_id": user_id}).first()
+        except IntegrityError:
+            self.db.rollback()
+            raise
+        if deleted is None:
+            return False
+        append_outbox_event(self.db, DBUser.__tablename__, user_id, "delete")
+        self.db.commit()
+        return True
 
 UserRepositoryDependency = Annotated[UserRepository, Depends]
\ No newline at end of file
@@ -0,0 +1,76 @@
+import re
+from typing import Optional
+
+from sqlalchemy import inspect, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+
+# Унікальність і зовнішні ключі перевіряє сама БД; репозиторії відкочують транзакцію і передають
+# IntegrityError далі, а сервіси за цими функціями перетворюють його на ту саму HTTP-помилку
+_SQLITE_UNIQUE = re.compile(r"UNIQUE constraint failed: \w+\.(\w+)")
+# PostgreSQL: "Key (email)=(a@b.c) already exists." / "Key (user_id)=(7) is not present in table ..."
+_POSTGRES_KEY = re.compile(r"Key \((\w+)\)=")
+_POSTGRES_UNIQUE_VIOLATION = "23505"
+_POSTGRES_FOREIGN_KEY_VIOLATION = "23503"
+
+
+def _postgres_column(error: IntegrityError) -> Optional[str]:
+    diag = getattr(error.orig, "diag", None)
+    match = _POSTGRES_KEY.search(getattr(diag, "message_detail", None) or "")
+    return match.group(1) if match else None
+
+
+def unique_violation(error: IntegrityError) -> Optional[str]:
+    # Колонка, чия унікальність порушена, або None, якщо це інше порушення
+    if getattr(error.orig, "pgcode", None) == _POSTGRES_UNIQUE_VIOLATION:
+        return _postgres_column(error)
+    match = _SQLITE_UNIQUE.search(str(error.orig))
+    return match.group(1) if match else None
+
+
+def is_foreign_key_violation(error: IntegrityError) -> bool:
+    # SQLite не повідомляє, який саме ключ порушено, тож викликач має знати, який з них міг не знайтися
+    return getattr(error.orig, "pgcode", None) == _POSTGRES_FOREIGN_KEY_VIOLATION \
+        or "FOREIGN KEY constraint failed" in str(error.orig)
+
+
+def commit_detached(db: Session, *instances) -> None:
+    # commit позначає всі об'єкти сесії застарілими, і перше ж звернення до атрибута перечитало б рядок.
+    # Від'єднані перед commit об'єкти зберігають значення, отримані під час INSERT/UPDATE
+    for instance in instances:
+        db.expunge(instance)
+    db.commit()
+
+
+def update_returning(db: Session, model: type, entity_id: int, values: dict, *criteria):
+    # Один UPDATE ... WHERE id = ? RETURNING замість читання рядка, setattr і refresh; None — рядок не знайдено
+    # (або не пройшли додаткові умови criteria)
+    if not values:
+        return db.scalars(select(model).where(model.id == entity_id, *criteria)).first()
+    statement = (
+        update(model)
+        .where(model.id == entity_id, *criteria)
+        .values(**values)
+        .returning(model)
+        .execution_options(synchronize_session=False, populate_existing=True)
+    )
+    return db.scalars(statement).first()
+
+
+def upsert_copies(db: Session, *instances) -> None:
+    # Копії рядків з іншої БД (користувач і знижка з основної БД у шарді прокату): INSERT ... ON CONFLICT
+    # DO UPDATE за первинним ключем, тож копія щоразу оновлюється до стану джерела в тій самій транзакції
+    if not instances:
+        return
+    dialect_insert = postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert
+    for instance in instances:
+        mapper = inspect(instance).mapper
+        values = {attribute.columns[0].name: getattr(instance, attribute.key) for attribute in mapper.column_attrs}
+        statement = dialect_insert(mapper.local_table).values(values)
+        keys = [column.name for column in mapper.primary_key]
+        db.execute(statement.on_conflict_do_update(
+            index_elements=keys,
+            set_={name: statement.excluded[name] for name in values if name not in keys},
+        ))
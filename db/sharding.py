@@ -0,0 +1,267 @@
+import contextvars
+import inspect
+import itertools
+import logging
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import wraps
+from typing import Any, Callable, Dict, Iterable, List, Optional, TypeVar
+
+from sqlalchemy import event, func, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from db.database import Base, RoutingSession, SessionLocal, create_engines
+
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+def _parse_pairs(value: str) -> Dict[str, str]:
+    pairs = {}
+    for item in value.split(","):
+        if item.strip():
+            key, _, target = item.partition("=")
+            pairs[key.strip()] = target.strip()
+    return pairs
+
+
+# Шарди операційних даних (локації, велосипеди, прокати): "kyiv=sqlite:///kyiv.db,lviv=sqlite:///lviv.db".
+# Порядок задає індекс шарда, а з ним і діапазон ID. Порожньо — шардування вимкнене, все живе в DATABASE_URL
+DATABASE_SHARDS = _parse_pairs(os.getenv("DATABASE_SHARDS", ""))
+# Регіон локації (Location.city) -> шард: "Київ=kyiv,Бровари=kyiv,Львів=lviv"; решта — у перший шард
+SHARD_REGIONS = _parse_pairs(os.getenv("SHARD_REGIONS", ""))
+# Шард з індексом i видає ID з (i * SHARD_ID_BLOCK, (i + 1) * SHARD_ID_BLOCK], тож власник рядка
+# визначається за самим ID. Типове значення вміщує 21 шард у 32-бітний INTEGER PostgreSQL
+SHARD_ID_BLOCK = int(os.getenv("SHARD_ID_BLOCK", "100000000"))
+SHARD_FAN_OUT_WORKERS = int(os.getenv("SHARD_FAN_OUT_WORKERS", "8"))
+
+# Таблиці, рядки яких розподіляються між шардами. Користувачі й знижки живуть в основній БД,
+# а шард тримає копії тих рядків, на які посилаються його прокати (crud/writes.py: upsert_copies)
+SHARDED_TABLES = ("locations", "bicycles", "rentals")
+
+
+@dataclass(eq=False)
+class Shard:
+    name: str
+    index: int
+    engine: Engine
+    read_engine: Engine
+
+    @property
+    def id_base(self) -> int:
+        return self.index * SHARD_ID_BLOCK
+
+    def __repr__(self):
+        return f"<Shard(name='{self.name}', index={self.index})>"
+
+
+class ShardMap:
+    def __init__(self, shards: List[Shard], regions: Dict[str, str]):
+        self.shards = shards
+        self._by_name = {shard.name: shard for shard in shards}
+        unknown = set(regions.values()) - set(self._by_name)
+        if unknown:
+            raise ValueError(f"SHARD_REGIONS посилається на невідомі шарди: {', '.join(sorted(unknown))}")
+        self._regions = {region: self._by_name[name] for region, name in regions.items()}
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.shards)
+
+    def for_region(self, region: Optional[str]) -> Shard:
+        return self._regions.get(region, self.shards[0])
+
+    def for_id(self, entity_id: Optional[int]) -> Shard:
+        # ID поза всіма діапазонами (зокрема None) ведуть у перший шард — запит там просто нічого не знайде
+        if entity_id is None:
+            return self.shards[0]
+        index = (entity_id - 1) // SHARD_ID_BLOCK
+        return self.shards[index] if 0 <= index < len(self.shards) else self.shards[0]
+
+    def group_ids(self, ids: Iterable[int]) -> Dict[Shard, List[int]]:
+        grouped: Dict[Shard, List[int]] = {}
+        for entity_id in ids:
+            grouped.setdefault(self.for_id(entity_id), []).append(entity_id)
+        return grouped
+
+    def session(self, db: Session, shard: Shard) -> Session:
+        # Сесія шарда живе стільки ж, скільки сесія запиту, і закривається разом з нею
+        sessions = db.info.setdefault("shard_sessions", {})
+        if shard.name not in sessions:
+            sessions[shard.name] = SessionLocal(info={"shard": shard, "read_only": db.info.get("read_only", False)})
+        return sessions[shard.name]
+
+    def run(self, db: Session, calls: Dict[Shard, Callable[[Session], T]]) -> List[T]:
+        # Виклики на кількох шардах ідуть паралельно, кожен у власній сесії (Session не потокобезпечна);
+        # результати повертаються в порядку шардів
+        read_only = db.info.get("read_only", False)
+
+        def call(shard: Shard) -> T:
+            shard_db = SessionLocal(info={"shard": shard, "read_only": read_only})
+            try:
+                return calls[shard](shard_db)
+            finally:
+                shard_db.close()
+
+        shards = sorted(calls, key=lambda shard: shard.index)
+        if len(shards) == 1:
+            return [call(shards[0])]
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=SHARD_FAN_OUT_WORKERS, thread_name_prefix="shard-fan-out")
+        # Потоки пулу отримують контекст запиту (зокрема поточний спан трасування)
+        contexts = [contextvars.copy_context() for _ in shards]
+        return list(self._executor.map(lambda context, shard: context.run(call, shard), contexts, shards))
+
+
+def _create_shards() -> List[Shard]:
+    shards = []
+    for index, (name, url) in enumerate(DATABASE_SHARDS.items()):
+        writer, reader = create_engines(url)
+        shards.append(Shard(name=name, index=index, engine=writer, read_engine=reader))
+    return shards
+
+
+shard_map = ShardMap(_create_shards(), SHARD_REGIONS)
+
+
+def database_infos() -> List[dict]:
+    # info сесій для фонових воркерів, що обходять усі БД: основну і кожен шард
+    return [{}] + [{"shard": shard} for shard in shard_map.shards]
+
+
+def is_routing(db: Session) -> bool:
+    # Сесія запиту маршрутизує виклики репозиторіїв на шарди; сесія, вже прив'язана до шарда, працює напряму
+    return shard_map.enabled and "shard" not in db.info
+
+
+# Декоратори методів репозиторію (self.db — сесія). Без шардування метод викликається як є.
+# Інакше метод виконується на копії репозиторію, створеній із сесією потрібного шарда
+
+def _bind_arguments(signature: inspect.Signature, args: tuple, kwargs: dict) -> Dict[str, Any]:
+    bound = signature.bind(*args, **kwargs)
+    bound.apply_defaults()
+    arguments = dict(bound.arguments)
+    arguments.pop("self")
+    return arguments
+
+
+def on_shard(shard_of: Callable[[Dict[str, Any]], Shard]):
+    # Операція над однією сутністю: shard_of за аргументами виклику визначає шард-власник
+    def decorator(method):
+        signature = inspect.signature(method)
+
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if not is_routing(self.db):
+                return method(self, *args, **kwargs)
+            arguments = _bind_arguments(signature, (self, *args), kwargs)
+            repository = type(self)(shard_map.session(self.db, shard_of(arguments)))
+            return method(repository, **arguments)
+        return wrapper
+    return decorator
+
+
+def on_all_shards(merge: Callable[[List[Any]], Any], shard_of: Optional[Callable[[Dict[str, Any]], Optional[Shard]]] = None):
+    # Списки й агрегати: метод виконується на кожному шарді паралельно, результати зводить merge.
+    # Якщо shard_of за аргументами знаходить шард (наприклад, задано фільтр за локацією), запит іде лише туди
+    def decorator(method):
+        signature = inspect.signature(method)
+
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if not is_routing(self.db):
+                return method(self, *args, **kwargs)
+            arguments = _bind_arguments(signature, (self, *args), kwargs)
+            shard = shard_of(arguments) if shard_of is not None else None
+            if shard is not None:
+                return method(type(self)(shard_map.session(self.db, shard)), **arguments)
+            call = lambda shard_db: method(type(self)(shard_db), **arguments)
+            return merge(shard_map.run(self.db, {shard: call for shard in shard_map.shards}))
+        return wrapper
+    return decorator
+
+
+def on_shards_by_ids(parameter: str, merge: Callable[[List[Any]], Any]):
+    # Пакетні операції за списком ID: кожен шард отримує лише ті ID, що йому належать
+    def decorator(method):
+        signature = inspect.signature(method)
+
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if not is_routing(self.db):
+                return method(self, *args, **kwargs)
+            arguments = _bind_arguments(signature, (self, *args), kwargs)
+            calls = {
+                shard: (lambda shard_db, ids=ids: method(type(self)(shard_db), **{**arguments, parameter: ids}))
+                for shard, ids in shard_map.group_ids(arguments[parameter]).items()
+            }
+            return merge(shard_map.run(self.db, calls) if calls else [])
+        return wrapper
+    return decorator
+
+
+def by_id(parameter: str) -> Callable[[Dict[str, Any]], Shard]:
+    return lambda arguments: shard_map.for_id(arguments[parameter])
+
+
+def concat(results: List[Iterable]) -> list:
+    return list(itertools.chain.from_iterable(results))
+
+
+def merge_dicts(results: List[dict]) -> dict:
+    merged = {}
+    for result in results:
+        merged.update(result)
+    return merged
+
+
+@event.listens_for(RoutingSession, "before_flush")
+def _assign_shard_ids(session, flush_context, instances):
+    # SQLite видає rowid = max + 1, тож у порожньому шарді перший рядок отримав би ID 1 з чужого діапазону.
+    # ID рахується в самому INSERT підзапитом по діапазону шарда; у PostgreSQL діапазон задає послідовність (init)
+    shard = session.info.get("shard")
+    if shard is None or not shard.id_base or shard.engine.dialect.name != "sqlite":
+        return
+    for instance in session.new:
+        model = type(instance)
+        if model.__table__.name in SHARDED_TABLES and instance.id is None:
+            instance.id = (
+                select(func.coalesce(func.max(model.id), shard.id_base) + 1)
+                .where(model.id > shard.id_base)
+                .scalar_subquery()
+            )
+
+
+def init_shards() -> None:
+    # Створює відсутні таблиці на шардах і переводить послідовності ID PostgreSQL у діапазон шарда
+    import models  # noqa: F401 — реєструє всі моделі в Base.metadata
+
+    for shard in shard_map.shards:
+        Base.metadata.create_all(shard.engine)
+        if shard.engine.dialect.name == "postgresql" and shard.id_base:
+            with shard.engine.begin() as connection:
+                for table in SHARDED_TABLES:
+                    connection.execute(
+                        text(
+                            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                            f"GREATEST((SELECT coalesce(max(id), 0) FROM {table}), :base))"
+                        ),
+                        {"base": shard.id_base},
+                    )
+        logger.info("Shard %s initialized (ids from %d)", shard.name, shard.id_base + 1)
+
+
+if __name__ == "__main__":
+    # python -m db.sharding init
+    if sys.argv[1:] != ["init"]:
+        sys.exit("Використання: python -m db.sharding init")
+    logging.basicConfig(level=logging.INFO)
+    if not shard_map.enabled:
+        sys.exit("DATABASE_SHARDS не задано")
+    init_shards()
@@ -0,0 +1,42 @@
+import threading
+from collections import Counter
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine.interfaces import CacheStats
+
+from db.database import engine
+
+
+_lock = threading.Lock()
+_counts: Counter = Counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _count_cache_usage(conn, cursor, statement, parameters, context, executemany):
+    if context is None:
+        return
+    with _lock:
+        _counts[context.cache_hit] += 1
+
+
+def get_statement_cache_stats() -> dict:
+    with _lock:
+        hits = _counts[CacheStats.CACHE_HIT]
+        misses = _counts[CacheStats.CACHE_MISS]
+        uncached = sum(count for stat, count in _counts.items() if stat not in (CacheStats.CACHE_HIT, CacheStats.CACHE_MISS))
+
+    compiled_cache = engine._compiled_cache
+    return {
+        "hits": hits,
+        "misses": misses,
+        "uncached": uncached,
+        "hit_ratio": round(hits / (hits + misses), 4) if hits + misses else None,
+        "size": len(compiled_cache) if compiled_cache is not None else 0,
+        "capacity": compiled_cache.capacity if compiled_cache is not None else 0,
+    }
+
+
+def reset_statement_cache_stats() -> None:
+    with _lock:
+        _counts.clear()
@@ -1,15 +1,73 @@
+import os
+import time
+from contextlib import asynccontextmanager
+
+_import_started = time.perf_counter()
+
 import uvicorn
 from fastapi import FastAPI
 from fastapi.responses import RedirectResponse
 
 from controllers import api_router
+from core.startup import warm_up
+from core.holds import load_holds
+from core.outbox import outbox_worker
+from core.discount_sweeper import discount_sweeper
+from core.rental_archiver import rental_archiver
+from core.tracing import TRACING, trace_exporter
+from core.slow_queries import SLOW_QUERY_LOG, slow_query_explainer
+from middleware.admission import AdmissionMiddleware
+from middleware.compression import CompressionMiddleware
+from middleware.idempotency import IdempotencyMiddleware
+from middleware.tracing import TracingMiddleware
+
+_import_seconds = time.perf_counter() - _import_started
+
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "1") == "1"
+OUTBOX_WORKER = os.getenv("OUTBOX_WORKER", "1") == "1"
+DISCOUNT_SWEEPER = os.getenv("DISCOUNT_SWEEPER", "1") == "1"
+RENTAL_ARCHIVER = os.getenv("RENTAL_ARCHIVER", "1") == "1"
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Прогріваємо воркер до того, як він почне приймати запити
+    if STARTUP_WARMUP:
+        app.state.startup_report = warm_up(app, import_seconds=_import_seconds)
+    # Резервування, що пережили перезапуск, мають діяти й далі
+    load_holds()
+    if OUTBOX_WORKER:
+        outbox_worker.start()
+    if DISCOUNT_SWEEPER:
+        discount_sweeper.start()
+    if RENTAL_ARCHIVER:
+        rental_archiver.start()
+    if TRACING:
+        trace_exporter.start()
+    if SLOW_QUERY_LOG:
+        slow_query_explainer.start()
+    yield
+    slow_query_explainer.stop()
+    trace_exporter.stop()
+    rental_archiver.stop()
+    discount_sweeper.stop()
+    outbox_worker.stop()
 
 
 app = FastAPI(
     description="API для Сервісу Прокату Велосипедів. Дозволяє керувати велосипедами, локаціями, користувачами, прокатами та знижками.",
-    docs_url="/docs"
+    docs_url="/docs",
+    lifespan=lifespan,
 )
 
+# Додані пізніше middleware — зовнішні: відповіді зберігаються нестиснутими, стискаються при кожній віддачі,
+# а контроль допуску відсікає зайві запити ще до будь-якої роботи
+app.add_middleware(IdempotencyMiddleware)
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(AdmissionMiddleware)
+if TRACING:
+    app.add_middleware(TracingMiddleware)
+
 app.include_router(api_router)
 
 @app.get("/", include_in_schema=False)
@@ -0,0 +1,275 @@
+import asyncio
+import bisect
+import itertools
+import json
+import math
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import anyio.to_thread
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from db.database import READ_CONSISTENCY_HEADER, is_read_only_request, pool_exhausted, serving_engines
+
+
+ADMISSION_MAX_CONCURRENCY = int(os.getenv("ADMISSION_MAX_CONCURRENCY", "32"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "256"))
+ADMISSION_ANALYTICS_CONCURRENCY = int(os.getenv("ADMISSION_ANALYTICS_CONCURRENCY", "4"))
+# Скільки секунд запит може чекати в черзі, перш ніж отримає 503
+ADMISSION_CRITICAL_TIMEOUT = float(os.getenv("ADMISSION_CRITICAL_TIMEOUT", "5"))
+ADMISSION_DEFAULT_TIMEOUT = float(os.getenv("ADMISSION_DEFAULT_TIMEOUT", "2"))
+ADMISSION_ANALYTICS_TIMEOUT = float(os.getenv("ADMISSION_ANALYTICS_TIMEOUT", "1"))
+# Токен-бакет на клієнта: швидкість поповнення (запитів/с) і розмір сплеску; 0 вимикає обмеження
+ADMISSION_CLIENT_RATE = float(os.getenv("ADMISSION_CLIENT_RATE", "20"))
+ADMISSION_CLIENT_BURST = float(os.getenv("ADMISSION_CLIENT_BURST", "40"))
+ADMISSION_MAX_CLIENTS = int(os.getenv("ADMISSION_MAX_CLIENTS", "10000"))
+
+# Довгоживучі з'єднання і службові маршрути не проходять через чергу
+ADMISSION_EXEMPT_PREFIXES = ("/sse/", "/system/", "/docs", "/openapi.json")
+
+
+@dataclass(frozen=True)
+class PriorityClass:
+    name: str
+    priority: int  # менше значення — вищий пріоритет
+    queue_timeout: float
+    limit: Optional[int] = None
+    # Під перевантаженням пулу з'єднань чи threadpool такі запити відхиляються одразу, без черги
+    shed_on_overload: bool = False
+
+
+CRITICAL = PriorityClass("critical", 0, ADMISSION_CRITICAL_TIMEOUT)
+DEFAULT = PriorityClass("default", 1, ADMISSION_DEFAULT_TIMEOUT)
+ANALYTICS = PriorityClass("analytics", 2, ADMISSION_ANALYTICS_TIMEOUT, limit=ADMISSION_ANALYTICS_CONCURRENCY, shed_on_overload=True)
+
+
+@dataclass(frozen=True)
+class AdmissionRule:
+    method: str
+    path: str
+    priority_class: PriorityClass
+    # Окремий ліміт одночасних запитів для маршруту, додатково до ліміту класу
+    limit: Optional[int] = None
+
+
+ADMISSION_RULES: List[AdmissionRule] = [
+    AdmissionRule("POST", "/rentals/", CRITICAL),
+    AdmissionRule("GET", "/rentals/revenue/", ANALYTICS, limit=2),
+    AdmissionRule("GET", "/locations/top-rentals/", ANALYTICS, limit=2),
+    AdmissionRule("GET", "/bicycles/most_rented/", ANALYTICS, limit=2),
+    AdmissionRule("GET", "/analytics/rebalancing/", ANALYTICS, limit=2),
+]
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, status: int, detail: str, retry_after: float):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+@dataclass(order=True)
+class _Waiter:
+    priority: int
+    seq: int
+    rule: Optional[AdmissionRule] = field(compare=False)
+    priority_class: PriorityClass = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+
+
+def system_overloaded(read_only: bool) -> bool:
+    # Пул, що обслужить запит, вичерпаний, або всі потоки threadpool зайняті — нові запити лише стануть у чергу
+    # за ними. Запис іде через пул записувача (у SQLite-профілі це одне з'єднання), читання — через репліки
+    # чи пул читачів, тож черга записувачів не заважає читанням і навпаки
+    if all(pool_exhausted(target) for target in serving_engines(read_only)):
+        return True
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    return limiter.borrowed_tokens >= limiter.total_tokens
+
+
+class AdmissionController:
+    # Спільний ліміт одночасних запитів з пріоритетною чергою: звільнене місце отримує
+    # найпріоритетніший запит, чий клас і маршрут ще не вичерпали власних лімітів
+    def __init__(self, max_concurrency: int = ADMISSION_MAX_CONCURRENCY, max_queue: int = ADMISSION_MAX_QUEUE):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self._active = 0
+        self._active_by_class: Dict[str, int] = {}
+        self._active_by_rule: Dict[AdmissionRule, int] = {}
+        self._queue: List[_Waiter] = []
+        self._seq = itertools.count()
+        self.rejected: Dict[str, int] = {}
+
+    def _can_run(self, priority_class: PriorityClass, rule: Optional[AdmissionRule]) -> bool:
+        if self._active >= self.max_concurrency:
+            return False
+        if priority_class.limit is not None and self._active_by_class.get(priority_class.name, 0) >= priority_class.limit:
+            return False
+        if rule is not None and rule.limit is not None and self._active_by_rule.get(rule, 0) >= rule.limit:
+            return False
+        return True
+
+    def _take(self, priority_class: PriorityClass, rule: Optional[AdmissionRule]) -> None:
+        self._active += 1
+        self._active_by_class[priority_class.name] = self._active_by_class.get(priority_class.name, 0) + 1
+        if rule is not None:
+            self._active_by_rule[rule] = self._active_by_rule.get(rule, 0) + 1
+
+    def _reject(self, priority_class: PriorityClass, detail: str, retry_after: float) -> AdmissionRejected:
+        self.rejected[priority_class.name] = self.rejected.get(priority_class.name, 0) + 1
+        return AdmissionRejected(503, detail, retry_after)
+
+    async def acquire(self, priority_class: PriorityClass, rule: Optional[AdmissionRule], read_only: bool) -> None:
+        ahead = any(w.priority <= priority_class.priority for w in self._queue)
+        if not ahead and self._can_run(priority_class, rule):
+            self._take(priority_class, rule)
+            return
+        if priority_class.shed_on_overload and system_overloaded(read_only):
+            raise self._reject(priority_class, "Сервіс перевантажений, спробуйте пізніше", priority_class.queue_timeout)
+        if len(self._queue) >= self.max_queue:
+            raise self._reject(priority_class, "Черга запитів переповнена, спробуйте пізніше", priority_class.queue_timeout)
+
+        waiter = _Waiter(priority_class.priority, next(self._seq), rule, priority_class, asyncio.get_running_loop().create_future())
+        bisect.insort(self._queue, waiter)
+        try:
+            done, _ = await asyncio.wait({waiter.future}, timeout=priority_class.queue_timeout)
+        except asyncio.CancelledError:
+            self._abandon(waiter)
+            raise
+        if not done:
+            self._abandon(waiter)
+            raise self._reject(priority_class, "Час очікування в черзі вичерпано, спробуйте пізніше", priority_class.queue_timeout)
+
+    def _abandon(self, waiter: _Waiter) -> None:
+        if waiter.future.done():
+            # Місце вже видано, але запит скасовано — повертаємо його наступному в черзі
+            self.release(waiter.priority_class, waiter.rule)
+            return
+        waiter.future.cancel()
+        self._queue.remove(waiter)
+
+    def release(self, priority_class: PriorityClass, rule: Optional[AdmissionRule]) -> None:
+        self._active -= 1
+        self._active_by_class[priority_class.name] -= 1
+        if rule is not None:
+            self._active_by_rule[rule] -= 1
+        self._wake()
+
+    def _wake(self) -> None:
+        index = 0
+        while index < len(self._queue) and self._active < self.max_concurrency:
+            waiter = self._queue[index]
+            if waiter.future.done():
+                del self._queue[index]
+            elif self._can_run(waiter.priority_class, waiter.rule):
+                del self._queue[index]
+                self._take(waiter.priority_class, waiter.rule)
+                waiter.future.set_result(None)
+            else:
+                index += 1
+
+    def stats(self) -> dict:
+        return {
+            "active": self._active,
+            "max_concurrency": self.max_concurrency,
+            "active_by_class": dict(self._active_by_class),
+            "queued": len(self._queue),
+            "rejected": dict(self.rejected),
+            "overloaded": {"read": system_overloaded(read_only=True), "write": system_overloaded(read_only=False)},
+        }
+
+
+class TokenBuckets:
+    # Бакети клієнтів у LRU-словнику, щоб пам'ять не росла з кількістю адрес
+    def __init__(self, rate: float = ADMISSION_CLIENT_RATE, burst: float = ADMISSION_CLIENT_BURST, max_clients: int = ADMISSION_MAX_CLIENTS):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self.rejected = 0
+
+    def take(self, client: str) -> None:
+        if self.rate <= 0:
+            return
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.get(client, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+        if tokens < 1:
+            self._buckets[client] = (tokens, now)
+            self._buckets.move_to_end(client)
+            self.rejected += 1
+            raise AdmissionRejected(429, "Забагато запитів, спробуйте пізніше", (1 - tokens) / self.rate)
+        self._buckets[client] = (tokens - 1, now)
+        self._buckets.move_to_end(client)
+        while len(self._buckets) > self.max_clients:
+            self._buckets.popitem(last=False)
+
+
+admission_controller = AdmissionController()
+client_buckets = TokenBuckets()
+
+
+def admission_stats() -> dict:
+    return {**admission_controller.stats(), "rate_limited": client_buckets.rejected}
+
+
+def _match_rule(method: str, path: str) -> Optional[AdmissionRule]:
+    normalized = path.rstrip("/") + "/"
+    for rule in ADMISSION_RULES:
+        if rule.method == method and rule.path == normalized:
+            return rule
+    return None
+
+
+async def _send_rejection(send: Send, rejected: AdmissionRejected) -> None:
+    body = json.dumps({"detail": rejected.detail}, ensure_ascii=False).encode()
+    await send({
+        "type": "http.response.start",
+        "status": rejected.status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(1, math.ceil(rejected.retry_after))).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class AdmissionMiddleware:
+    # Відсікає зайві запити на вході, поки вони не зайняли потік threadpool і з'єднання з БД:
+    # спершу токен-бакет клієнта (429), потім пріоритетна черга з дедлайном очікування (503)
+    def __init__(
+        self,
+        app: ASGIApp,
+        controller: AdmissionController = admission_controller,
+        buckets: TokenBuckets = client_buckets,
+    ):
+        self.app = app
+        self.controller = controller
+        self.buckets = buckets
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"].startswith(ADMISSION_EXEMPT_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+
+        rule = _match_rule(scope["method"], scope["path"])
+        priority_class = rule.priority_class if rule is not None else DEFAULT
+        client = scope["client"][0] if scope.get("client") else "unknown"
+        read_only = is_read_only_request(scope["method"], Headers(scope=scope).get(READ_CONSISTENCY_HEADER))
+        try:
+            self.buckets.take(client)
+            await self.controller.acquire(priority_class, rule, read_only)
+        except AdmissionRejected as rejected:
+            await _send_rejection(send, rejected)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(priority_class, rule)
@@ -0,0 +1,208 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from middleware.negotiation import JSON_MEDIA_TYPE, MSGPACK_MEDIA_TYPES, prefers_msgpack
+
+
+IDEMPOTENCY_HEADER = "idempotency-key"
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", "86400"))
+IDEMPOTENCY_MAX_KEYS = int(os.getenv("IDEMPOTENCY_MAX_KEYS", "10000"))
+IDEMPOTENCY_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+# Детерміновані відмови валідації: той самий запит отримає ту саму відповідь. 409 (конфлікт стану)
+# і 429 (перевантаження) минущі — їх не зберігаємо, щоб повтор з тим самим ключем міг пройти пізніше
+IDEMPOTENCY_CACHEABLE_ERRORS = {400, 404, 422}
+
+StoreKey = Tuple[str, str, str]
+
+
+@dataclass
+class StoredResponse:
+    fingerprint: str
+    # Формат тіла, узгоджений за Accept першого запиту (JSON чи MessagePack)
+    representation: str
+    status: int
+    headers: List[Tuple[bytes, bytes]]
+    body: bytes
+    expires_at: float
+
+
+@dataclass
+class _InFlight:
+    fingerprint: str
+    representation: str
+    done: asyncio.Event = field(default_factory=asyncio.Event)
+
+
+class IdempotencyStore:
+    # Обмежений LRU-кеш відповідей з TTL. Працює в циклі подій воркера, тож блокування не потрібні
+    def __init__(self, ttl: float = IDEMPOTENCY_TTL, max_keys: int = IDEMPOTENCY_MAX_KEYS):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self._responses: "OrderedDict[StoreKey, StoredResponse]" = OrderedDict()
+        self._in_flight: Dict[StoreKey, _InFlight] = {}
+
+    def get(self, key: StoreKey) -> Optional[StoredResponse]:
+        stored = self._responses.get(key)
+        if stored is None:
+            return None
+        if stored.expires_at <= time.monotonic():
+            del self._responses[key]
+            return None
+        self._responses.move_to_end(key)
+        return stored
+
+    def put(self, key: StoreKey, fingerprint: str, representation: str, status: int, headers: List[Tuple[bytes, bytes]], body: bytes) -> None:
+        self._responses[key] = StoredResponse(fingerprint, representation, status, headers, body, time.monotonic() + self.ttl)
+        self._responses.move_to_end(key)
+        while len(self._responses) > self.max_keys:
+            self._responses.popitem(last=False)
+
+    def in_flight(self, key: StoreKey) -> Optional[_InFlight]:
+        return self._in_flight.get(key)
+
+    def begin(self, key: StoreKey, fingerprint: str, representation: str) -> _InFlight:
+        entry = _InFlight(fingerprint, representation)
+        self._in_flight[key] = entry
+        return entry
+
+    def finish(self, key: StoreKey) -> None:
+        entry = self._in_flight.pop(key, None)
+        if entry is not None:
+            entry.done.set()
+
+
+idempotency_store = IdempotencyStore()
+
+_BODY_MISMATCH = "Idempotency-Key вже використано з іншим тілом запиту"
+_REPRESENTATION_MISMATCH = "Idempotency-Key вже використано із запитом іншого формату відповіді (Accept)"
+
+
+def _representation(scope: Scope) -> str:
+    # Тіло відповіді серіалізується всередині застосунку за Accept, тож повтор отримає збережені байти лише
+    # в тому ж форматі. Стиснення (Accept-Encoding) зовнішній CompressionMiddleware застосовує до кожної
+    # віддачі окремо, тож у збіг не входить
+    return MSGPACK_MEDIA_TYPES[0] if prefers_msgpack(Headers(scope=scope).get("accept", "")) else JSON_MEDIA_TYPE
+
+
+def _mismatch(entry, fingerprint: str, representation: str) -> Optional[str]:
+    if entry.fingerprint != fingerprint:
+        return _BODY_MISMATCH
+    if entry.representation != representation:
+        return _REPRESENTATION_MISMATCH
+    return None
+
+
+def _is_cacheable(status: int) -> bool:
+    return 200 <= status < 300 or status in IDEMPOTENCY_CACHEABLE_ERRORS
+
+
+async def _send_json(send: Send, status: int, detail: str) -> None:
+    body = json.dumps({"detail": detail}, ensure_ascii=False).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class IdempotencyMiddleware:
+    # Запити на запис з заголовком Idempotency-Key: перша успішна відповідь (2xx) чи відмова валідації
+    # (400/404/422) зберігається і віддається повторним запитам без виклику сервісів; одночасні дублікати чекають на перший.
+    # Повтор з іншим тілом чи іншим форматом відповіді отримує 422, а не чужу відповідь і не другий запис
+    def __init__(self, app: ASGIApp, store: IdempotencyStore = idempotency_store):
+        self.app = app
+        self.store = store
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] not in IDEMPOTENCY_METHODS:
+            await self.app(scope, receive, send)
+            return
+        idempotency_key = Headers(scope=scope).get(IDEMPOTENCY_HEADER)
+        if not idempotency_key:
+            await self.app(scope, receive, send)
+            return
+
+        body, receive = await self._buffer_body(receive)
+        fingerprint = hashlib.sha256(body).hexdigest()
+        representation = _representation(scope)
+        key = (scope["method"], scope["path"], idempotency_key)
+
+        while True:
+            stored = self.store.get(key)
+            if stored is not None:
+                mismatch = _mismatch(stored, fingerprint, representation)
+                if mismatch is not None:
+                    await _send_json(send, 422, mismatch)
+                    return
+                await self._replay(stored, send)
+                return
+            entry = self.store.in_flight(key)
+            if entry is None:
+                break
+            mismatch = _mismatch(entry, fingerprint, representation)
+            if mismatch is not None:
+                await _send_json(send, 422, mismatch)
+                return
+            # Якщо відповідь першого запиту не збережено (5xx, 409, 429), виконуємо запит самі
+            await entry.done.wait()
+
+        self.store.begin(key, fingerprint, representation)
+        try:
+            await self._execute(scope, receive, send, key, fingerprint, representation)
+        finally:
+            self.store.finish(key)
+
+    async def _buffer_body(self, receive: Receive) -> Tuple[bytes, Receive]:
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] != "http.request":
+                break
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+        body = b"".join(chunks)
+        replayed = False
+
+        async def buffered_receive() -> Message:
+            nonlocal replayed
+            if not replayed:
+                replayed = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        return body, buffered_receive
+
+    async def _execute(self, scope: Scope, receive: Receive, send: Send, key: StoreKey, fingerprint: str, representation: str) -> None:
+        start: Optional[Message] = None
+        chunks: List[bytes] = []
+
+        async def capturing_send(message: Message) -> None:
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+                if not message.get("more_body", False) and start is not None and _is_cacheable(start["status"]):
+                    self.store.put(key, fingerprint, representation, start["status"], list(start.get("headers", [])), b"".join(chunks))
+            await send(message)
+
+        await self.app(scope, receive, capturing_send)
+
+    async def _replay(self, stored: StoredResponse, send: Send) -> None:
+        await send({
+            "type": "http.response.start",
+            "status": stored.status,
+            "headers": stored.headers + [(b"idempotent-replayed", b"true")],
+        })
+        await send({"type": "http.response.body", "body": stored.body})
@@ -0,0 +1,107 @@
+from contextvars import ContextVar
+from typing import Any, Callable, Optional
+
+from fastapi.datastructures import Default, DefaultPlaceholder
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+from starlette.background import BackgroundTask
+from starlette.requests import Request
+
+from core.slow_queries import request_route
+from core.tracing import TRACING, traced_endpoint, start_span, add_phase_spans
+
+try:
+    import msgpack
+except ImportError:  # MessagePack необов'язковий — без нього завжди віддаємо JSON
+    msgpack = None
+
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+
+_accept_header: ContextVar[str] = ContextVar("accept_header", default="")
+
+
+def _quality(accept: str, media_types) -> tuple:
+    # (q, позиція першої згадки) найкращого збігу з media_types у заголовку Accept
+    best = (0.0, len(accept))
+    for position, part in enumerate(accept.split(",")):
+        media_type, *params = [p.strip() for p in part.split(";")]
+        if media_type.lower() not in media_types:
+            continue
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if q > best[0]:
+            best = (q, position)
+    return best
+
+
+def prefers_msgpack(accept: str) -> bool:
+    if msgpack is None or "msgpack" not in accept:
+        return False
+    msgpack_q, msgpack_position = _quality(accept, MSGPACK_MEDIA_TYPES)
+    json_q, json_position = _quality(accept, (JSON_MEDIA_TYPE, "application/*", "*/*"))
+    if msgpack_q == 0:
+        return False
+    return msgpack_q > json_q or (msgpack_q == json_q and msgpack_position < json_position)
+
+
+class NegotiatedResponse(JSONResponse):
+    # Отримує вже серіалізовані FastAPI дані DTO (dict/list) і кодує їх у формат з Accept
+    # напряму, без проміжного JSON-рядка
+    def __init__(
+        self,
+        content: Any,
+        status_code: int = 200,
+        headers: Optional[dict] = None,
+        media_type: Optional[str] = None,
+        background: Optional[BackgroundTask] = None,
+    ):
+        if media_type is None and prefers_msgpack(_accept_header.get()):
+            media_type = MSGPACK_MEDIA_TYPES[0]
+        super().__init__(content, status_code=status_code, headers=headers, media_type=media_type, background=background)
+        self.headers["Vary"] = "Accept"
+
+    def render(self, content: Any) -> bytes:
+        if self.media_type in MSGPACK_MEDIA_TYPES:
+            return msgpack.packb(content, use_bin_type=True)
+        return super().render(content)
+
+
+class NegotiatingRoute(APIRoute):
+    # Маршрути без явного response_class відповідають NegotiatedResponse
+    def __init__(self, path: str, endpoint: Callable[..., Any], *, response_class=Default(NegotiatedResponse), **kwargs):
+        if isinstance(response_class, DefaultPlaceholder):
+            response_class = Default(NegotiatedResponse)
+        if TRACING:
+            endpoint = traced_endpoint(endpoint)
+        super().__init__(path, endpoint, response_class=response_class, **kwargs)
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def negotiating_handler(request: Request):
+            token = _accept_header.set(request.headers.get("accept", ""))
+            route_token = request_route.set(f"{request.method} {self.path}")
+            try:
+                return await handler(request)
+            finally:
+                request_route.reset(route_token)
+                _accept_header.reset(token)
+
+        if not TRACING:
+            return negotiating_handler
+
+        async def traced_handler(request: Request):
+            with start_span(f"route {self.path}", {"app.layer": "route", "http.route": self.path}) as span:
+                response = await negotiating_handler(request)
+            if span is not None:
+                add_phase_spans(span)
+            return response
+
+        return traced_handler
@@ -0,0 +1,46 @@
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from core.tracing import start_trace, activate, deactivate, finish_trace
+
+
+class TracingMiddleware:
+    # Кореневий спан HTTP-запиту. Стоїть зовні решти middleware, тож охоплює й очікування в черзі допуску,
+    # й стиснення. Нетрасований запит (поза вибіркою) проходить без жодної роботи, крім рішення про вибірку
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        root = start_trace(
+            scope["method"],
+            traceparent=Headers(scope=scope).get("traceparent"),
+            attributes={"http.request.method": scope["method"], "url.path": scope["path"]},
+        )
+        if root is None:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_status(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                root.attributes["http.response.status_code"] = message["status"]
+                if message["status"] >= 500:
+                    root.status = 2
+            await send(message)
+
+        token = activate(root)
+        try:
+            await self.app(scope, receive, send_with_status)
+        except BaseException as e:
+            root.record_exception(e)
+            raise
+        finally:
+            deactivate(token)
+            # Шаблон маршруту стає відомим лише після маршрутизації
+            route = scope.get("route")
+            if route is not None and hasattr(route, "path"):
+                root.name = f"{scope['method']} {route.path}"
+                root.attributes["http.route"] = route.path
+            finish_trace(root)
@@ -3,7 +3,12 @@ from models.discount import Discount
 from models.location import Location
 from models.rental import Rental
 from models.user import User
-from models.bicycle import Bicycle
+from models.bicycle import Bicycle, BicycleStatus
+from models.bicycle_hold import BicycleHold
+from models.location_status_count import LocationStatusCount
+from models.outbox import OutboxEvent, OutboxCheckpoint
+from models.rental_archive import RentalArchivePartition, RentalArchiveBicycle
+from models.backfill import BackfillCheckpoint
 
 
-__all__ = ["Bicycle", "Discount", "Location", "Rental", "User", "Base"]
+__all__ = ["Bicycle", "BicycleStatus", "BicycleHold", "LocationStatusCount", "Discount", "Location", "Rental", "User", "OutboxEvent", "OutboxCheckpoint", "RentalArchivePartition", "RentalArchiveBicycle", "BackfillCheckpoint", "Base"]
@@ -0,0 +1,30 @@
+from sqlalchemy import Integer, String, DateTime
+from sqlalchemy.orm import Mapped, mapped_column
+from datetime import datetime, timezone
+
+from db.database import Base
+
+
+# Стани backfill-у: "pending" — запланований міграцією, "running" — виконується або перерваний
+# (наступний запуск продовжить з last_key), "done" — усі рядки оброблено
+BACKFILL_PENDING = "pending"
+BACKFILL_RUNNING = "running"
+BACKFILL_DONE = "done"
+
+
+class BackfillCheckpoint(Base):
+    # Контрольна точка backfill-у: ключ останнього обробленого рядка і лічильники.
+    # Зсувається в тій самій транзакції, що й зміна порції, тож після збою жодна порція не губиться
+    __tablename__ = "backfill_checkpoints"
+
+    name: Mapped[str] = mapped_column(String, primary_key=True)
+    status: Mapped[str] = mapped_column(String, default=BACKFILL_PENDING, nullable=False)
+    last_key: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    rows_scanned: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    rows_changed: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    started_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+
+    def __repr__(self):
+        return f"<BackfillCheckpoint(name='{self.name}', status='{self.status}', last_key={self.last_key})>"
@@ -1,7 +1,45 @@
-from sqlalchemy import Integer, String, Float, ForeignKey
+import enum
+
+from sqlalchemy import Integer, String, Float, ForeignKey, SmallInteger
+from sqlalchemy.types import TypeDecorator
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 from db.database import Base
 
+
+class BicycleStatus(str, enum.Enum):
+    AVAILABLE = "доступний"
+    RENTED = "в прокаті"
+    REPAIR = "на ремонті"
+
+
+# Коди в БД стабільні: нові статуси лише дописуються, наявні коди не змінюються
+BICYCLE_STATUS_CODES = {
+    BicycleStatus.AVAILABLE: 1,
+    BicycleStatus.RENTED: 2,
+    BicycleStatus.REPAIR: 3,
+}
+_STATUSES_BY_CODE = {code: status for status, code in BICYCLE_STATUS_CODES.items()}
+
+
+class BicycleStatusType(TypeDecorator):
+    # У БД статус — SMALLINT; назовні, як і раніше, українські значення
+    impl = SmallInteger
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return BICYCLE_STATUS_CODES[BicycleStatus(value)]
+
+    def process_literal_param(self, value, dialect):
+        return str(self.process_bind_param(value, dialect))
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return _STATUSES_BY_CODE[value]
+
+
 class Bicycle(Base):
     __tablename__ = "bicycles"
 
@@ -10,7 +48,7 @@ class Bicycle(Base):
     model: Mapped[str] = mapped_column(String, nullable=False)
     type: Mapped[str] = mapped_column(String, nullable=False)
     price_per_hour: Mapped[float] = mapped_column(Float, nullable=False)
-    status: Mapped[str] = mapped_column(String, default="доступний", nullable=False)
+    status: Mapped[BicycleStatus] = mapped_column(BicycleStatusType, default=BicycleStatus.AVAILABLE, nullable=False)
 
     current_location_id: Mapped[int] = mapped_column(Integer, ForeignKey("locations.id"), nullable=True)
 
@@ -19,4 +57,4 @@ class Bicycle(Base):
     rentals: Mapped[list["Rental"]] = relationship("Rental", back_populates="bicycle")
 
     def __repr__(self):
-        return f"<Bicycle(id={self.id}, brand='{self.brand}', model='{self.model}')>"
\ No newline at end of file
+        return f"<Bicycle(id={self.id}, brand='{self.brand}', model='{self.model}')>"
@@ -0,0 +1,22 @@
+from sqlalchemy import Integer, DateTime, ForeignKey
+from sqlalchemy.orm import Mapped, mapped_column
+from datetime import datetime, timezone
+
+from db.database import Base
+
+
+class BicycleHold(Base):
+    # Коротке резервування доступного велосипеда до створення прокату. Рядок із минулим expires_at
+    # вже нічого не блокує: його перезаписує наступне резервування або видаляє очищення під час старту.
+    # user_id без зовнішнього ключа — у шардованому режимі користувачі живуть в основній БД
+    __tablename__ = "bicycle_holds"
+
+    bicycle_id: Mapped[int] = mapped_column(Integer, ForeignKey("bicycles.id", ondelete="CASCADE"), primary_key=True)
+    user_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    # Локація на момент резервування: пошук поблизу віднімає зарезервовані велосипеди від доступних
+    location_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, index=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+
+    def __repr__(self):
+        return f"<BicycleHold(bicycle_id={self.bicycle_id}, user_id={self.user_id}, expires_at={self.expires_at})>"
@@ -1,4 +1,4 @@
-from sqlalchemy import Integer, String, Float, DateTime, Boolean
+from sqlalchemy import Integer, String, Float, DateTime, Boolean, Index, false
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 from datetime import datetime, timezone
 
@@ -13,8 +13,26 @@ class Discount(Base):
     valid_from: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
     valid_to: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True, nullable=False)
+    # Знижка з майбутнім valid_from: стане активною, коли фоновий sweeper дійде до неї
+    is_scheduled: Mapped[bool] = mapped_column(Boolean, default=False, server_default=false(), nullable=False)
 
     rentals: Mapped[list["Rental"]] = relationship("Rental", back_populates="discount")
 
     def __repr__(self):
-        return f"<Discount(id={self.id}, name='{self.name}', percentage={self.percentage_amount})>"
\ No newline at end of file
+        return f"<Discount(id={self.id}, name='{self.name}', percentage={self.percentage_amount})>"
+
+
+# Часткові індекси: пошук активних знижок і sweeper торкаються лише живих рядків, а не всієї історії акцій
+Index(
+    "ix_discounts_active_valid_to",
+    Discount.valid_to,
+    Discount.valid_from,
+    postgresql_where=Discount.is_active == True,
+    sqlite_where=Discount.is_active == True,
+)
+Index(
+    "ix_discounts_scheduled_valid_from",
+    Discount.valid_from,
+    postgresql_where=Discount.is_scheduled == True,
+    sqlite_where=Discount.is_scheduled == True,
+)
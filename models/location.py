@@ -1,4 +1,4 @@
-from sqlalchemy import Integer, String
+from sqlalchemy import Integer, String, Float
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 
 from db.database import Base
@@ -9,6 +9,10 @@ class Location(Base):
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     name: Mapped[str] = mapped_column(String, unique=True, index=True, nullable=False)
     address: Mapped[str] = mapped_column(String, nullable=True)
+    # Місто/регіон — ключ шардування: за ним локація (а з нею її велосипеди й прокати) потрапляє в шард
+    city: Mapped[str | None] = mapped_column(String, nullable=True, index=True)
+    latitude: Mapped[float | None] = mapped_column(Float, nullable=True)
+    longitude: Mapped[float | None] = mapped_column(Float, nullable=True)
 
     # Зв'язок з велосипедами: одна локація може мати багато велосипедів
     bicycles: Mapped[list["Bicycle"]] = relationship("Bicycle", back_populates="current_location")
@@ -0,0 +1,85 @@
+from sqlalchemy import Integer, ForeignKey, DDL, event
+from sqlalchemy.orm import Mapped, mapped_column
+
+from db.database import Base
+from models.bicycle import Bicycle, BicycleStatus, BicycleStatusType
+
+
+class LocationStatusCount(Base):
+    # Кількість велосипедів кожного статусу на локації. Підтримується тригерами на bicycles,
+    # тож лічильники оновлюються в тій самій транзакції, що й будь-який запис велосипеда
+    __tablename__ = "location_status_counts"
+
+    location_id: Mapped[int] = mapped_column(Integer, ForeignKey("locations.id", ondelete="CASCADE"), primary_key=True)
+    status: Mapped[BicycleStatus] = mapped_column(BicycleStatusType, primary_key=True)
+    count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+    def __repr__(self):
+        return f"<LocationStatusCount(location_id={self.location_id}, status='{self.status}', count={self.count})>"
+
+
+# Тригери посилаються на обидві таблиці, тож створюються після bicycles
+LocationStatusCount.__table__.add_is_dependent_on(Bicycle.__table__)
+
+SQLITE_STATUS_COUNT_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS bicycles_status_counts_insert AFTER INSERT ON bicycles
+    WHEN NEW.current_location_id IS NOT NULL
+    BEGIN
+        INSERT INTO location_status_counts (location_id, status, count) VALUES (NEW.current_location_id, NEW.status, 1)
+        ON CONFLICT (location_id, status) DO UPDATE SET count = count + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS bicycles_status_counts_delete AFTER DELETE ON bicycles
+    WHEN OLD.current_location_id IS NOT NULL
+    BEGIN
+        UPDATE location_status_counts SET count = count - 1
+        WHERE location_id = OLD.current_location_id AND status = OLD.status;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS bicycles_status_counts_update AFTER UPDATE OF status, current_location_id ON bicycles
+    WHEN OLD.status IS NOT NEW.status OR OLD.current_location_id IS NOT NEW.current_location_id
+    BEGIN
+        UPDATE location_status_counts SET count = count - 1
+        WHERE location_id = OLD.current_location_id AND status = OLD.status;
+        INSERT INTO location_status_counts (location_id, status, count)
+        SELECT NEW.current_location_id, NEW.status, 1 WHERE NEW.current_location_id IS NOT NULL
+        ON CONFLICT (location_id, status) DO UPDATE SET count = count + 1;
+    END
+    """,
+]
+
+POSTGRES_STATUS_COUNT_TRIGGERS = [
+    """
+    CREATE OR REPLACE FUNCTION bicycles_status_counts() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.current_location_id IS NOT NULL THEN
+            UPDATE location_status_counts SET count = count - 1
+            WHERE location_id = OLD.current_location_id AND status = OLD.status;
+        END IF;
+        IF TG_OP IN ('UPDATE', 'INSERT') AND NEW.current_location_id IS NOT NULL THEN
+            INSERT INTO location_status_counts (location_id, status, count) VALUES (NEW.current_location_id, NEW.status, 1)
+            ON CONFLICT (location_id, status) DO UPDATE SET count = location_status_counts.count + 1;
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER bicycles_status_counts_insert_delete AFTER INSERT OR DELETE ON bicycles
+    FOR EACH ROW EXECUTE FUNCTION bicycles_status_counts()
+    """,
+    """
+    CREATE TRIGGER bicycles_status_counts_update AFTER UPDATE OF status, current_location_id ON bicycles
+    FOR EACH ROW
+    WHEN (OLD.status IS DISTINCT FROM NEW.status OR OLD.current_location_id IS DISTINCT FROM NEW.current_location_id)
+    EXECUTE FUNCTION bicycles_status_counts()
+    """,
+]
+
+for _statement in SQLITE_STATUS_COUNT_TRIGGERS:
+    event.listen(LocationStatusCount.__table__, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
+for _statement in POSTGRES_STATUS_COUNT_TRIGGERS:
+    event.listen(LocationStatusCount.__table__, "after_create", DDL(_statement).execute_if(dialect="postgresql"))
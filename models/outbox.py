@@ -0,0 +1,29 @@
+from sqlalchemy import Integer, String, DateTime, JSON
+from sqlalchemy.orm import Mapped, mapped_column
+from datetime import datetime, timezone
+
+from db.database import Base
+
+class OutboxEvent(Base):
+    __tablename__ = "outbox_events"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    entity: Mapped[str] = mapped_column(String, nullable=False)
+    entity_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    operation: Mapped[str] = mapped_column(String, nullable=False)
+    changed_fields: Mapped[dict | None] = mapped_column(JSON, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+
+    def __repr__(self):
+        return f"<OutboxEvent(id={self.id}, entity='{self.entity}', entity_id={self.entity_id}, operation='{self.operation}')>"
+
+
+class OutboxCheckpoint(Base):
+    __tablename__ = "outbox_checkpoints"
+
+    consumer: Mapped[str] = mapped_column(String, primary_key=True)
+    last_event_id: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+
+    def __repr__(self):
+        return f"<OutboxCheckpoint(consumer='{self.consumer}', last_event_id={self.last_event_id})>"
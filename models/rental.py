@@ -11,7 +11,7 @@ class Rental(Base):
     bicycle_id: Mapped[int] = mapped_column(Integer, ForeignKey("bicycles.id"), nullable=False)
     rental_start_time: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
     rental_end_time: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
-    actual_return_time: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    actual_return_time: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True, index=True)
     total_price: Mapped[float] = mapped_column(Float, nullable=False)
     discount_id: Mapped[int | None] = mapped_column(Integer, ForeignKey("discounts.id"), nullable=True)
 
@@ -0,0 +1,73 @@
+from sqlalchemy import Integer, String, DateTime, Float, MetaData, Table, Column, Index
+from sqlalchemy.orm import Mapped, mapped_column
+from datetime import datetime, timezone
+from typing import Dict
+
+from db.database import Base
+
+
+# Архівні таблиці створюються на льоту, тож живуть в окремих метаданих, а не в Base.metadata
+archive_metadata = MetaData()
+ARCHIVE_TABLE_PREFIX = "rentals_archive_"
+
+_archive_tables: Dict[str, Table] = {}
+
+
+class RentalArchivePartition(Base):
+    # Реєстр місячних архівних таблиць: за діапазонами часу та ID запити обирають лише потрібні
+    __tablename__ = "rental_archive_partitions"
+
+    table_name: Mapped[str] = mapped_column(String, primary_key=True)
+    month_start: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, index=True)
+    month_end: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    min_rental_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    max_rental_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    row_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc), nullable=False)
+
+    def __repr__(self):
+        return f"<RentalArchivePartition(table_name='{self.table_name}', rows={self.row_count})>"
+
+
+class RentalArchiveBicycle(Base):
+    # У яких архівних таблицях є прокати велосипеда — історія велосипеда не перебирає всі місяці
+    __tablename__ = "rental_archive_bicycles"
+
+    bicycle_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    table_name: Mapped[str] = mapped_column(String, primary_key=True)
+
+
+def month_bounds(moment: datetime) -> tuple[datetime, datetime]:
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    moment = moment.astimezone(timezone.utc)
+    start = datetime(moment.year, moment.month, 1, tzinfo=timezone.utc)
+    end = datetime(moment.year + moment.month // 12, moment.month % 12 + 1, 1, tzinfo=timezone.utc)
+    return start, end
+
+
+def archive_table_name(month_start: datetime) -> str:
+    return f"{ARCHIVE_TABLE_PREFIX}{month_start.year:04d}_{month_start.month:02d}"
+
+
+def archive_table(table_name: str) -> Table:
+    # Ті самі колонки, що й у rentals, але без зовнішніх ключів: архів лише читається
+    table = _archive_tables.get(table_name)
+    if table is None:
+        table = Table(
+            table_name,
+            archive_metadata,
+            Column("id", Integer, primary_key=True),
+            Column("user_id", Integer, nullable=False),
+            Column("bicycle_id", Integer, nullable=False),
+            Column("rental_start_time", DateTime(timezone=True), nullable=False),
+            Column("rental_end_time", DateTime(timezone=True), nullable=False),
+            Column("actual_return_time", DateTime(timezone=True), nullable=True),
+            Column("total_price", Float, nullable=False),
+            Column("discount_id", Integer, nullable=True),
+            Index(f"ix_{table_name}_bicycle_id", "bicycle_id"),
+            Index(f"ix_{table_name}_user_id", "user_id"),
+            Index(f"ix_{table_name}_rental_start_time", "rental_start_time"),
+        )
+        _archive_tables[table_name] = table
+    return table
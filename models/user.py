@@ -1,4 +1,4 @@
-from sqlalchemy import Integer, String
+from sqlalchemy import Integer, String, DDL, event
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 from db.database import Base
 
@@ -16,4 +16,55 @@ class User(Base):
     rentals: Mapped[list["Rental"]] = relationship("Rental", back_populates="user")
 
     def __repr__(self):
-        return f"<User(id={self.id}, first_name='{self.first_name}', last_name='{self.last_name}')>"
\ No newline at end of file
+        return f"<User(id={self.id}, first_name='{self.first_name}', last_name='{self.last_name}')>"
+
+
+# Пошуковий індекс користувачів. SQLite: FTS5-таблиця з триграмним токенізатором поверх users
+# (external content), тригери оновлюють її в тій самій транзакції, що й запис користувача.
+# PostgreSQL: GIN-індекс pg_trgm по виразу з тих самих полів — окремої синхронізації не потребує
+USER_SEARCH_TABLE = "users_search"
+
+SQLITE_USER_SEARCH_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS users_search USING fts5(
+        first_name, last_name, phone, email,
+        content='users', content_rowid='id', tokenize='trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS users_search_insert AFTER INSERT ON users
+    BEGIN
+        INSERT INTO users_search (rowid, first_name, last_name, phone, email)
+        VALUES (NEW.id, NEW.first_name, NEW.last_name, NEW.phone, NEW.email);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS users_search_delete AFTER DELETE ON users
+    BEGIN
+        INSERT INTO users_search (users_search, rowid, first_name, last_name, phone, email)
+        VALUES ('delete', OLD.id, OLD.first_name, OLD.last_name, OLD.phone, OLD.email);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS users_search_update AFTER UPDATE OF first_name, last_name, phone, email ON users
+    BEGIN
+        INSERT INTO users_search (users_search, rowid, first_name, last_name, phone, email)
+        VALUES ('delete', OLD.id, OLD.first_name, OLD.last_name, OLD.phone, OLD.email);
+        INSERT INTO users_search (rowid, first_name, last_name, phone, email)
+        VALUES (NEW.id, NEW.first_name, NEW.last_name, NEW.phone, NEW.email);
+    END
+    """,
+]
+
+# Вираз індексу має збігатися з виразом у запиті пошуку (crud/user.py), інакше індекс не використовується
+POSTGRES_USER_SEARCH_DOCUMENT = "(first_name || ' ' || last_name || ' ' || phone || ' ' || coalesce(email, ''))"
+
+POSTGRES_USER_SEARCH_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    f"CREATE INDEX IF NOT EXISTS ix_users_search_trgm ON users USING gin ({POSTGRES_USER_SEARCH_DOCUMENT} gin_trgm_ops)",
+]
+
+for _statement in SQLITE_USER_SEARCH_DDL:
+    event.listen(User.__table__, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
+for _statement in POSTGRES_USER_SEARCH_DDL:
+    event.listen(User.__table__, "after_create", DDL(_statement).execute_if(dialect="postgresql"))
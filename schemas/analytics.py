@@ -0,0 +1,25 @@
+from pydantic import BaseModel, Field
+from datetime import datetime
+from typing import List, Optional
+
+
+class LocationForecast(BaseModel):
+    location_id: int = Field(..., description="ID локації")
+    expected_pickups: float = Field(..., description="Очікувана кількість видач за горизонт прогнозу")
+    available: int = Field(..., description="Доступні велосипеди зараз")
+    target: int = Field(..., description="Бажана кількість доступних велосипедів з урахуванням запасу")
+
+
+class BicycleTransfer(BaseModel):
+    from_location_id: int = Field(..., description="Звідки забрати велосипеди")
+    to_location_id: int = Field(..., description="Куди привезти велосипеди")
+    bicycles: int = Field(..., description="Скільки велосипедів перевезти")
+    distance_m: Optional[float] = Field(None, description="Відстань між локаціями в метрах, якщо відомі координати")
+
+
+class RebalancingPlan(BaseModel):
+    generated_at: datetime = Field(..., description="Час розрахунку")
+    horizon_hours: int = Field(..., description="Горизонт прогнозу в годинах")
+    forecasts: List[LocationForecast] = Field(..., description="Прогноз і цілі за локаціями")
+    transfers: List[BicycleTransfer] = Field(..., description="Запропоновані перевезення")
+    computed_ms: float = Field(..., description="Тривалість розрахунку в мілісекундах")
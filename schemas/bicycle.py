@@ -1,5 +1,8 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from datetime import datetime
+from typing import Optional, List
+
+from models.bicycle import BicycleStatus
 
 class BicycleBase(BaseModel):
     brand: str = Field(..., description="Марка велосипеда")
@@ -7,7 +10,7 @@ class BicycleBase(BaseModel):
     type: str = Field(..., description="Тип велосипеда")
     price_per_hour: float = Field(..., gt=0, description="Ціна за годину прокату")
     current_location_id: Optional[int] = Field(None, description="ID поточної локації велосипеда")
-    status: str = Field("доступний", description="Статус велосипеда (доступний, в прокаті, на ремонті)")
+    status: BicycleStatus = Field(BicycleStatus.AVAILABLE, description="Статус велосипеда (доступний, в прокаті, на ремонті)")
 
 
 class BicycleCreate(BicycleBase):
@@ -19,10 +22,40 @@ class BicycleUpdate(BaseModel):
     type: Optional[str] = Field(None, description="Тип велосипеда")
     price_per_hour: Optional[float] = Field(None, gt=0, description="Ціна за годину прокату")
     current_location_id: Optional[int] = Field(None, description="ID поточної локації велосипеда")
-    status: Optional[str] = Field(None, description="Статус велосипеда")
+    status: Optional[BicycleStatus] = Field(None, description="Статус велосипеда")
 
 class Bicycle(BicycleBase):
     id: int = Field(..., description="Унікальний ідентифікатор велосипеда")
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+
+class BicycleMove(BaseModel):
+    from_location_id: int = Field(..., description="Звідки переміщуються велосипеди")
+    to_location_id: int = Field(..., description="Куди переміщуються велосипеди")
+    status: Optional[BicycleStatus] = Field(None, description="Переміщувати лише велосипеди з цим статусом (за замовчуванням — усі, крім тих, що в прокаті)")
+
+
+class BicycleRepairRequest(BaseModel):
+    ids: List[int] = Field(..., min_length=1, max_length=1000, description="ID велосипедів, що відправляються на ремонт")
+
+
+class BicycleBulkResult(BaseModel):
+    count: int = Field(..., description="Скільки велосипедів змінено")
+    ids: List[int] = Field(..., description="ID змінених велосипедів")
+    skipped_ids: List[int] = Field(default_factory=list, description="ID, які пропущено: велосипеда немає або перехід статусу заборонений")
+
+
+class BicycleHoldCreate(BaseModel):
+    user_id: int = Field(..., description="Користувач, для якого резервується велосипед")
+    ttl_seconds: Optional[int] = Field(None, ge=1, description="Тривалість резервування в секундах (за замовчуванням — HOLD_TTL)")
+
+
+class BicycleHold(BaseModel):
+    bicycle_id: int = Field(..., description="ID зарезервованого велосипеда")
+    user_id: int = Field(..., description="Користувач, для якого діє резервування")
+    expires_at: datetime = Field(..., description="Коли резервування спливає")
+
+    class Config:
+        from_attributes = True
@@ -21,6 +21,7 @@ class DiscountUpdate(BaseModel):
 
 class Discount(DiscountBase):
     id: int = Field(..., description="Унікальний ідентифікатор знижки")
+    is_scheduled: bool = Field(False, description="Знижку створено активною з майбутнім valid_from: вона стане активною з початком дії")
 
     class Config:
         from_attributes = True
\ No newline at end of file
@@ -1,9 +1,14 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Optional, Dict, List
+
+from models.bicycle import BicycleStatus
 
 class LocationBase(BaseModel):
     name: str = Field(..., description="Назва локації прокату")
     address: Optional[str] = Field(None, description="Адреса локації")
+    city: Optional[str] = Field(None, description="Місто або регіон локації (визначає шард даних)")
+    latitude: Optional[float] = Field(None, ge=-90, le=90, description="Широта локації")
+    longitude: Optional[float] = Field(None, ge=-180, le=180, description="Довгота локації")
 
 class LocationCreate(LocationBase):
     pass
@@ -11,9 +16,27 @@ class LocationCreate(LocationBase):
 class LocationUpdate(BaseModel):
     name: Optional[str] = Field(None, description="Назва локації прокату")
     address: Optional[str] = Field(None, description="Адреса локації")
+    city: Optional[str] = Field(None, description="Місто або регіон локації (визначає шард даних)")
+    latitude: Optional[float] = Field(None, ge=-90, le=90, description="Широта локації")
+    longitude: Optional[float] = Field(None, ge=-180, le=180, description="Довгота локації")
 
 class Location(LocationBase):
     id: int = Field(..., description="Унікальний ідентифікатор локації")
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+
+class NearbyLocation(Location):
+    distance_m: float = Field(..., description="Відстань до точки пошуку в метрах")
+    available_bicycles: int = Field(..., description="Кількість доступних велосипедів на локації")
+
+
+class LocationStatusCounts(BaseModel):
+    location_id: int = Field(..., description="ID локації")
+    counts: Dict[BicycleStatus, int] = Field(..., description="Кількість велосипедів за статусами")
+
+
+class FleetStatusCounts(BaseModel):
+    counts: Dict[BicycleStatus, int] = Field(..., description="Кількість велосипедів за статусами по всьому парку")
+    locations: List[LocationStatusCounts] = Field(..., description="Розподіл за локаціями")
@@ -23,6 +23,10 @@ class RentalUpdate(BaseModel):
     total_price: Optional[float] = None
     discount_id: Optional[int] = None
 
+class RentalReturn(BaseModel):
+    # Локація, куди повернуто велосипед; час повернення і вартість рахує сервер
+    location_id: int
+
 class Rental(RentalBase):
     id: int
 
@@ -0,0 +1,44 @@
+import os
+import tempfile
+
+# Налаштування читаються під час імпорту модулів застосунку, тож задаються до них
+_directory = tempfile.mkdtemp(prefix="bicycle-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_directory, 'test.db')}"
+os.environ.setdefault("TRACING", "0")
+os.environ.setdefault("SLOW_QUERY_LOG", "0")
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from db.database import Base, SessionLocal, engine
+import models  # noqa: F401 — реєструє всі моделі в Base.metadata
+
+_DATA_STATEMENTS = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        Base.metadata.drop_all(engine)
+
+
+@pytest.fixture
+def statements():
+    # SQL-запити до БД, виконані в межах тесту; BEGIN, PRAGMA та інші службові команди не рахуються
+    executed = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(_DATA_STATEMENTS):
+            executed.append(statement)
+
+    event.listen(Engine, "before_cursor_execute", record)
+    try:
+        yield executed
+    finally:
+        event.remove(Engine, "before_cursor_execute", record)
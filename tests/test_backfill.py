@@ -0,0 +1,30 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import insert, select
+
+from core.backfill import get_backfill
+from models.bicycle import Bicycle
+from models.location import Location
+from models.rental import Rental
+from models.user import User
+
+
+# Backfill лише заповнює відсутню ціну: вже пораховані ціни не переписуються поточною ціною велосипеда
+
+START = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def test_rentals_total_price_fills_only_missing_prices(db):
+    db.execute(insert(Location), [{"name": "Центр"}])
+    db.execute(insert(User), [{"first_name": "Іван", "last_name": "Петренко", "phone": "0501234567"}])
+    db.execute(insert(Bicycle), [{"brand": "Trek", "model": "FX", "type": "міський", "price_per_hour": 60.0, "current_location_id": 1}])
+    returned = START + timedelta(minutes=90)
+    db.execute(insert(Rental), [
+        {"user_id": 1, "bicycle_id": 1, "rental_start_time": START, "rental_end_time": START + timedelta(hours=1), "actual_return_time": returned, "total_price": price}
+        for price in (0.0, 45.0, 0.0)
+    ])
+    db.execute(Rental.__table__.update().where(Rental.id == 3).values(actual_return_time=None))
+
+    assert get_backfill("rentals_total_price").apply(db, 0, 3) == 1
+    assert db.execute(select(Rental.id, Rental.total_price).order_by(Rental.id)).all() == [(1, 90.0), (2, 45.0), (3, 0.0)]
+    assert get_backfill("rentals_total_price").apply(db, 0, 3) == 0
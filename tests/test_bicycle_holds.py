@@ -0,0 +1,63 @@
+import pytest
+from fastapi import HTTPException
+
+from core.bicycle import BicycleService
+from core.holds import hold_registry
+from crud.bicycle import BicycleRepository
+from crud.bicycle_hold import BicycleHoldRepository
+from crud.location import LocationRepository
+from crud.user import UserRepository
+from models.bicycle import BicycleStatus
+from schemas.bicycle import BicycleCreate, BicycleHoldCreate
+from schemas.location import LocationCreate
+from schemas.user import UserCreate
+
+
+@pytest.fixture
+def bicycle_service(db):
+    hold_registry.rebuild([])
+    yield BicycleService(BicycleRepository(db), LocationRepository(db), BicycleHoldRepository(db), UserRepository(db))
+    hold_registry.rebuild([])
+
+
+@pytest.fixture
+def bicycle_id(db):
+    location_id = LocationRepository(db).create_location(location=LocationCreate(name="Центр")).id
+    return BicycleRepository(db).create_bicycle(bicycle=BicycleCreate(
+        brand="Trek", model="FX", type="міський", price_per_hour=50, current_location_id=location_id,
+    )).id
+
+
+@pytest.fixture
+def user_ids(db):
+    repository = UserRepository(db)
+    return [
+        repository.create_user(user=UserCreate(email=f"u{i}@example.com", phone=f"05000000{i}", first_name="Іван", last_name="Петренко")).id
+        for i in range(2)
+    ]
+
+
+def test_hold_for_unknown_user_is_rejected(bicycle_service, bicycle_id):
+    with pytest.raises(HTTPException) as error:
+        bicycle_service.hold(bicycle_id, BicycleHoldCreate(user_id=987654, ttl_seconds=600))
+    assert (error.value.status_code, error.value.detail) == (404, "Користувача не знайдено")
+    assert bicycle_service.hold_repository.get_hold(bicycle_id=bicycle_id) is None
+
+
+def test_hold_hides_bicycle_from_other_users(bicycle_service, bicycle_id, user_ids):
+    hold = bicycle_service.hold(bicycle_id, BicycleHoldCreate(user_id=user_ids[0]))
+    assert hold.user_id == user_ids[0]
+    with pytest.raises(HTTPException) as error:
+        bicycle_service.hold(bicycle_id, BicycleHoldCreate(user_id=user_ids[1]))
+    assert error.value.status_code == 409
+
+
+def test_hold_from_another_worker_is_hidden_after_reload(db, bicycle_service, bicycle_id, user_ids, monkeypatch):
+    # Резервування, зроблене іншим воркером, є лише в БД; після TTL реєстр перечитує його
+    hold = bicycle_service.hold(bicycle_id, BicycleHoldCreate(user_id=user_ids[0]))
+    hold_registry.rebuild([])
+    assert [b.id for b in bicycle_service.get_bicycles_by_status(BicycleStatus.AVAILABLE)] == [bicycle_id]
+
+    monkeypatch.setattr(hold_registry, "ttl", 0)
+    assert bicycle_service.get_bicycles_by_status(BicycleStatus.AVAILABLE) == []
+    assert hold_registry.get(bicycle_id).user_id == hold.user_id
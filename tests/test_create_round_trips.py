@@ -0,0 +1,123 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+
+from core.bicycle import BicycleService
+from core.discount import DiscountService
+from core.user import UserService
+from crud.bicycle import BicycleRepository
+from crud.bicycle_hold import BicycleHoldRepository
+from crud.discount import DiscountRepository
+from crud.location import LocationRepository
+from crud.rental import RentalRepository
+from crud.user import UserRepository
+from schemas.bicycle import BicycleCreate, BicycleUpdate
+from schemas.discount import DiscountCreate
+from schemas.location import LocationCreate
+from schemas.user import UserCreate
+
+
+# Запис покладається на унікальні й зовнішні ключі: один INSERT/UPDATE сутності і INSERT події outbox,
+# без попередніх SELECT-ів на існування чи унікальність
+
+def _verbs(statements):
+    return [statement.lstrip().split(None, 1)[0].upper() for statement in statements]
+
+
+def _assert_single_write(statements, verb, table):
+    assert _verbs(statements) == [verb, "INSERT"]
+    assert table in statements[0]
+    assert "outbox_events" in statements[1]
+
+
+@pytest.fixture
+def user_service(db):
+    return UserService(UserRepository(db), RentalRepository(db))
+
+
+@pytest.fixture
+def discount_service(db):
+    return DiscountService(DiscountRepository(db))
+
+
+@pytest.fixture
+def bicycle_service(db):
+    return BicycleService(BicycleRepository(db), LocationRepository(db), BicycleHoldRepository(db), UserRepository(db))
+
+
+@pytest.fixture
+def location_id(db):
+    return LocationRepository(db).create_location(location=LocationCreate(name="Центр")).id
+
+
+def _user(email="a@example.com", phone="0501234567"):
+    return UserCreate(email=email, phone=phone, first_name="Іван", last_name="Петренко")
+
+
+def _discount(name="Весна"):
+    now = datetime.now(timezone.utc)
+    return DiscountCreate(name=name, percentage_amount=10, valid_from=now - timedelta(days=1), valid_to=now + timedelta(days=1))
+
+
+def _bicycle(location_id):
+    return BicycleCreate(brand="Trek", model="FX", type="міський", price_per_hour=50, current_location_id=location_id)
+
+
+def test_user_create_is_one_insert(user_service, statements):
+    user_service.create(_user())
+    _assert_single_write(statements, "INSERT", "users")
+
+
+def test_user_duplicates_keep_messages(user_service, statements):
+    user_service.create(_user())
+    statements.clear()
+    with pytest.raises(HTTPException) as error:
+        user_service.create(_user(phone="0670000000"))
+    assert (error.value.status_code, error.value.detail) == (400, "Користувач з таким email вже існує")
+    with pytest.raises(HTTPException) as error:
+        user_service.create(_user(email="b@example.com"))
+    assert (error.value.status_code, error.value.detail) == (400, "Користувач з таким номером телефону вже існує")
+    assert "SELECT" not in _verbs(statements)
+
+
+def test_discount_create_is_one_insert(discount_service, statements):
+    discount_service.create(_discount())
+    _assert_single_write(statements, "INSERT", "discounts")
+
+
+def test_discount_duplicate_name_keeps_message(discount_service, statements):
+    discount_service.create(_discount())
+    statements.clear()
+    with pytest.raises(HTTPException) as error:
+        discount_service.create(_discount())
+    assert (error.value.status_code, error.value.detail) == (400, "Знижка з іменем 'Весна' вже існує.")
+    assert "SELECT" not in _verbs(statements)
+
+
+def test_bicycle_create_is_one_insert(bicycle_service, location_id, statements):
+    bicycle_service.create(_bicycle(location_id))
+    _assert_single_write(statements, "INSERT", "bicycles")
+
+
+def test_bicycle_create_missing_location_keeps_message(bicycle_service, statements):
+    with pytest.raises(HTTPException) as error:
+        bicycle_service.create(_bicycle(location_id=999))
+    assert (error.value.status_code, error.value.detail) == (404, "Локацію не знайдено")
+    assert "SELECT" not in _verbs(statements)
+
+
+def test_bicycle_update_is_one_update(bicycle_service, location_id, statements):
+    bicycle = bicycle_service.create(_bicycle(location_id))
+    statements.clear()
+    bicycle_service.update(bicycle.id, BicycleUpdate(price_per_hour=60))
+    _assert_single_write(statements, "UPDATE", "bicycles")
+
+
+def test_bicycle_update_missing_location_keeps_message(bicycle_service, location_id, statements):
+    bicycle = bicycle_service.create(_bicycle(location_id))
+    statements.clear()
+    with pytest.raises(HTTPException) as error:
+        bicycle_service.update(bicycle.id, BicycleUpdate(current_location_id=999))
+    assert (error.value.status_code, error.value.detail) == (404, "Локацію не знайдено для оновлення")
+    assert "SELECT" not in _verbs(statements)
@@ -0,0 +1,54 @@
+import asyncio
+
+import pytest
+
+from middleware.idempotency import IdempotencyMiddleware, IdempotencyStore
+
+
+# Зберігаються лише успішні відповіді та детерміновані відмови валідації; конфлікт і перевантаження
+# минущі, тож повтор з тим самим ключем знову доходить до застосунку
+
+def _request(middleware, key="k-1"):
+    scope = {
+        "type": "http", "method": "POST", "path": "/rentals/", "query_string": b"",
+        "headers": [(b"idempotency-key", key.encode()), (b"content-type", b"application/json")],
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"{}", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(middleware(scope, receive, send))
+    return messages[0]["status"], dict(messages[0]["headers"])
+
+
+def _middleware(statuses):
+    calls = []
+
+    async def app(scope, receive, send):
+        status = statuses[len(calls)]
+        calls.append(status)
+        await send({"type": "http.response.start", "status": status, "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+    return IdempotencyMiddleware(app, IdempotencyStore(ttl=60, max_keys=10)), calls
+
+
+@pytest.mark.parametrize("status", [201, 400, 404, 422])
+def test_deterministic_responses_are_replayed(status):
+    middleware, calls = _middleware([status, 500])
+    _request(middleware)
+    replayed_status, headers = _request(middleware)
+    assert (replayed_status, headers.get(b"idempotent-replayed")) == (status, b"true")
+    assert calls == [status]
+
+
+@pytest.mark.parametrize("status", [409, 429, 503])
+def test_transient_failures_are_retried(status):
+    middleware, calls = _middleware([status, 201])
+    _request(middleware)
+    assert _request(middleware)[0] == 201
+    assert calls == [status, 201]
@@ -0,0 +1,107 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+
+from core.rental import RentalService
+from crud.bicycle import BicycleRepository
+from crud.discount import DiscountRepository
+from crud.location import LocationRepository
+from crud.rental import RentalRepository
+from crud.user import UserRepository
+from models.bicycle import BicycleStatus
+from schemas.bicycle import BicycleCreate
+from schemas.location import LocationCreate
+from schemas.rental import RentalCreate, RentalUpdate
+from schemas.user import UserCreate
+
+
+# Активний прокат тримає свій велосипед "в прокаті": видалення прокату чи перехід на інший велосипед
+# звільняє старий у тій самій транзакції, а лічильники статусів на локації йдуть слідом
+
+@pytest.fixture
+def rental_service(db):
+    return RentalService(RentalRepository(db), UserRepository(db), BicycleRepository(db), DiscountRepository(db))
+
+
+@pytest.fixture
+def location_id(db):
+    return LocationRepository(db).create_location(location=LocationCreate(name="Центр")).id
+
+
+@pytest.fixture
+def bicycle_ids(db, location_id):
+    repository = BicycleRepository(db)
+    return [
+        repository.create_bicycle(bicycle=BicycleCreate(brand="Trek", model=str(i), type="міський", price_per_hour=50, current_location_id=location_id)).id
+        for i in range(2)
+    ]
+
+
+@pytest.fixture
+def user_id(db):
+    return UserRepository(db).create_user(user=UserCreate(email="a@example.com", phone="0501234567", first_name="Іван", last_name="Петренко")).id
+
+
+def _rent(rental_service, user_id, bicycle_id):
+    start = datetime.now(timezone.utc)
+    return rental_service.create(RentalCreate(
+        user_id=user_id, bicycle_id=bicycle_id, rental_start_time=start, rental_end_time=start + timedelta(hours=1), total_price=50,
+    ))
+
+
+def _status(db, bicycle_id):
+    return BicycleRepository(db).get_bicycle(bicycle_id=bicycle_id).status
+
+
+def _counts(db, location_id):
+    return dict(LocationRepository(db).get_status_counts(location_id=location_id))
+
+
+def test_delete_active_rental_frees_bicycle(db, rental_service, user_id, bicycle_ids, location_id):
+    rental = _rent(rental_service, user_id, bicycle_ids[0])
+    assert _status(db, bicycle_ids[0]) == BicycleStatus.RENTED
+
+    rental_service.delete(rental.id)
+
+    assert _status(db, bicycle_ids[0]) == BicycleStatus.AVAILABLE
+    assert _counts(db, location_id).get(BicycleStatus.RENTED, 0) == 0
+    _rent(rental_service, user_id, bicycle_ids[0])
+
+
+def test_delete_returned_rental_keeps_bicycle_status(db, rental_service, user_id, bicycle_ids):
+    rental = _rent(rental_service, user_id, bicycle_ids[0])
+    rental_service.update(rental.id, RentalUpdate(actual_return_time=datetime.now(timezone.utc)))
+    _rent(rental_service, user_id, bicycle_ids[1])
+    # Велосипед повернутого прокату вже могли видати знову — видалення історії його не звільняє
+    rental_service.update(rental.id, RentalUpdate(bicycle_id=bicycle_ids[1]))
+
+    rental_service.delete(rental.id)
+
+    assert _status(db, bicycle_ids[1]) == BicycleStatus.RENTED
+
+
+def test_changing_bicycle_moves_rented_status(db, rental_service, user_id, bicycle_ids, location_id):
+    rental = _rent(rental_service, user_id, bicycle_ids[0])
+
+    updated = rental_service.update(rental.id, RentalUpdate(bicycle_id=bicycle_ids[1]))
+
+    assert updated.bicycle_id == bicycle_ids[1]
+    assert _status(db, bicycle_ids[0]) == BicycleStatus.AVAILABLE
+    assert _status(db, bicycle_ids[1]) == BicycleStatus.RENTED
+    assert _counts(db, location_id)[BicycleStatus.RENTED] == 1
+
+
+def test_changing_to_unavailable_bicycle_is_rejected(db, rental_service, user_id, bicycle_ids):
+    first = _rent(rental_service, user_id, bicycle_ids[0])
+    _rent(rental_service, user_id, bicycle_ids[1])
+
+    with pytest.raises(HTTPException) as error:
+        rental_service.update(first.id, RentalUpdate(bicycle_id=bicycle_ids[1]))
+    assert error.value.status_code == 400
+    with pytest.raises(HTTPException) as error:
+        rental_service.update(first.id, RentalUpdate(bicycle_id=999))
+    assert (error.value.status_code, error.value.detail) == (404, "Велосипед не знайдено для оновлення")
+
+    assert rental_service.get_by_id(first.id).bicycle_id == bicycle_ids[0]
+    assert _status(db, bicycle_ids[0]) == BicycleStatus.RENTED
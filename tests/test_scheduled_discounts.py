@@ -0,0 +1,74 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+
+from core.discount import DiscountService
+from core.rental import RentalService
+from crud.bicycle import BicycleRepository
+from crud.discount import DiscountRepository
+from crud.location import LocationRepository
+from crud.rental import RentalRepository
+from crud.user import UserRepository
+from schemas.bicycle import BicycleCreate
+from schemas.discount import DiscountCreate
+from schemas.location import LocationCreate
+from schemas.rental import RentalCreate, RentalUpdate
+from schemas.user import UserCreate
+
+
+# Знижка, створена активною з майбутнім valid_from, до проходу sweeper зберігається як запланована
+# і вже діє для прокатів, що починаються в її вікні
+
+NOW = datetime.now(timezone.utc)
+
+
+@pytest.fixture
+def rental_service(db):
+    return RentalService(RentalRepository(db), UserRepository(db), BicycleRepository(db), DiscountRepository(db))
+
+
+@pytest.fixture
+def scheduled_discount(db):
+    return DiscountService(DiscountRepository(db)).create(DiscountCreate(
+        name="Літо", percentage_amount=20, valid_from=NOW + timedelta(days=1), valid_to=NOW + timedelta(days=10),
+    ))
+
+
+@pytest.fixture
+def rental_data(db):
+    location_id = LocationRepository(db).create_location(location=LocationCreate(name="Центр")).id
+    bicycle_id = BicycleRepository(db).create_bicycle(bicycle=BicycleCreate(
+        brand="Trek", model="FX", type="міський", price_per_hour=50, current_location_id=location_id,
+    )).id
+    user_id = UserRepository(db).create_user(user=UserCreate(
+        email="a@example.com", phone="0501234567", first_name="Іван", last_name="Петренко",
+    )).id
+    return {"user_id": user_id, "bicycle_id": bicycle_id, "total_price": 50}
+
+
+def _window(days: int) -> dict:
+    start = NOW + timedelta(days=days)
+    return {"rental_start_time": start, "rental_end_time": start + timedelta(hours=1)}
+
+
+def test_scheduled_flag_is_returned(scheduled_discount):
+    assert scheduled_discount.is_scheduled is True
+    assert scheduled_discount.is_active is False
+
+
+def test_rental_in_window_accepts_scheduled_discount(rental_service, scheduled_discount, rental_data):
+    rental = rental_service.create(RentalCreate(**rental_data, **_window(2), discount_id=scheduled_discount.id))
+    assert rental.discount_id == scheduled_discount.id
+
+
+def test_rental_before_window_rejects_scheduled_discount(rental_service, scheduled_discount, rental_data):
+    with pytest.raises(HTTPException) as error:
+        rental_service.create(RentalCreate(**rental_data, **_window(0), discount_id=scheduled_discount.id))
+    assert (error.value.status_code, error.value.detail) == (400, "Недійсна або неактивна знижка")
+
+
+def test_rental_update_accepts_scheduled_discount(rental_service, scheduled_discount, rental_data):
+    rental = rental_service.create(RentalCreate(**rental_data, **_window(2)))
+    updated = rental_service.update(rental.id, RentalUpdate(discount_id=scheduled_discount.id))
+    assert updated.discount_id == scheduled_discount.id